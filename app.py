@@ -1,121 +1,44 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-import requests
-import aiohttp
-import asyncio
 
+# The data layer (pandas, pyarrow, requests) is imported on first use after
+# login, so the login page renders without waiting for it
 
-# Define asynchronous function to fetch data
-async def fetch_data(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.json()
+# Seconds between checks for the history while a staged load is running
+HISTORY_POLL = 1
 
 
-# Define a function to initialize session state with async calls
-async def initialize_data():
-    # Fetch patients and appointments concurrently
-    patients_url = st.secrets["n8n"]["patients_url"]
-    appointments_url = st.secrets["n8n"]["appointments_url"]
-
-    patients_data, appointments_data = await asyncio.gather(
-        fetch_data(patients_url),
-        fetch_data(appointments_url),
-    )
-
-    # Initialize patients data
-    if "patients" not in st.session_state:
-        if patients_data:
-            # Ensure data types
-            # Convert list of dictionaries to DataFrame
-            patients_df = pd.DataFrame(patients_data)
-            # Ensure correct data types
-            patients_df["Patient ID"] = patients_df["Patient ID"].astype(str)
-            patients_df["Name"] = patients_df["Name"].astype(str)
-            patients_df["Phone"] = patients_df["Phone"].astype(str)
-            patients_df["Email"] = patients_df["Email"].astype(str)
-            patients_df["Referral Source"] = patients_df["Referral Source"].astype(str)
-            st.session_state.patients = patients_df
-        else:
-            st.session_state.patients = pd.DataFrame(
-                columns=[
-                    "row_number",
-                    "Patient ID",
-                    "Name",
-                    "Phone",
-                    "Email",
-                    "Referral Source",
-                ]
-            )
-        print("Patients data initialized:", st.session_state.patients)
-
-    # Initialize appointments data
-    if "appointments" not in st.session_state:
-        if appointments_data:
-            # Convert list of dictionaries to DataFrame
-            appointments_df = pd.DataFrame(appointments_data)
-            # Ensure correct data types
-            appointments_df["Date"] = pd.to_datetime(
-                appointments_df["Date"], format="%Y-%m-%d"
-            ).dt.date
-            appointments_df["Time"] = pd.to_datetime(
-                appointments_df["Time"], format="%H:%M:%S"
-            ).dt.time
-            appointments_df["Payment Status"] = pd.to_numeric(
-                appointments_df["Payment Status"], errors="coerce"
-            ).fillna(0.0)
-
-            # Handle Attended column robustly
-            def convert_to_bool(value):
-                if isinstance(value, bool):
-                    return value
-                if str(value).lower() in ["true", "1", "yes"]:
-                    return True
-                if str(value).lower() in ["false", "0", "no", "null", ""]:
-                    return False
-                return False  # Default to False for unexpected values
-
-            appointments_df["Attended"] = appointments_df["Attended"].apply(
-                convert_to_bool
-            )
-            appointments_df["First Appointment"] = appointments_df[
-                "First Appointment"
-            ].apply(convert_to_bool)
-            appointments_df["Canceled"] = appointments_df["Canceled"].apply(
-                convert_to_bool
-            )
-
-            appointments_df["Insurance"] = appointments_df["Insurance"].astype(str)
-            appointments_df["row_number"] = appointments_df["row_number"].astype(int)
-            st.session_state.appointments = appointments_df
-        else:
-            st.session_state.appointments = pd.DataFrame(
-                columns=[
-                    "row_number",
-                    "Appointment ID",
-                    "Patient ID",
-                    "Date",
-                    "Time",
-                    "Payment Status",
-                    "Attended",
-                    "First Appointment",
-                    "Insurance",
-                    "Canceled",
-                ]
-            )
-        print("Appointments data initialized:", st.session_state.appointments)
-
-
-# Function to run initialization only once
+# Load the shared tables if needed and bind them to this session
 def run_initialization():
-    if "data_initialized" not in st.session_state:
-        # Set the flag to prevent re-running
-        st.session_state.data_initialized = False
-        # Run the async initialization
-        asyncio.run(initialize_data())
-        # Mark initialization as complete
-        st.session_state.data_initialized = True
+    from core.cache import get_store, sync_session
+    from core.metrics import get_metrics
+    from core.refresh import loaders
+    from core.repository import get_repository
+
+    store = get_store()
+    repository = get_repository()
+    # Downloads only when the process-wide copy is missing or past its TTL;
+    # a first load serves today's schedule while the history streams in
+    loader, delta_loader = loaders(repository)
+    with get_metrics().section("app/initialization"):
+        store.ensure_loaded(loader, delta_loader, day_loader=repository.load_day)
+    sync_session(store)
+
+
+# Rerun this session when the background refresher publishes new data
+def watch_refresh():
+    from core.cache import get_store
+    from core.refresh import get_refresher
+
+    interval = get_refresher().interval
+    if get_store().partial:
+        interval = HISTORY_POLL
+
+    @st.fragment(run_every=interval or None)
+    def watch():
+        if st.session_state.get("data_version") != get_store().version:
+            st.rerun()
+
+    watch()
 
 
 if "role" not in st.session_state:
@@ -150,6 +73,7 @@ role = st.session_state.role
 
 logout_page = st.Page(logout, title="Log out", icon=":material/logout:")
 settings = st.Page("settings.py", title="Settings", icon=":material/settings:")
+performance = st.Page("performance.py", title="Performance", icon=":material/speed:")
 
 
 # Define pages
@@ -181,36 +105,69 @@ kpis = st.Page(
     default=(role == "Doctor"),
 )
 
+cohorts = st.Page(
+    "medico/cohorts.py",
+    title="Coortes",
+    icon="👥",
+)
+
 # Create a list of pages for navigation
 account_pages = [logout_page, settings]
+if role == "Admin":
+    account_pages.append(performance)
 secretary_pages = [patient_registration, appointment_registration, appointments]
-doctor_pages = [kpis]
+doctor_pages = [kpis, cohorts]
 
 # Título do aplicativo
 st.title("Gestão de Consultas Médicas")
 
-# Run initialization only once
-run_initialization()
-
 page_dict = {}
 if st.session_state.role in ["Secretary", "Doctor", "Admin"]:
+    # Attach this session to the shared tables
+    run_initialization()
+    watch_refresh()
     page_dict["Cadastro"] = secretary_pages
 if st.session_state.role in ["Doctor", "Admin"]:
     page_dict["Médico"] = doctor_pages
 
 
-if len(page_dict) > 0:
-    pg = st.navigation({"Account": account_pages} | page_dict)
-else:
-    pg = st.navigation([st.Page(login)])
+if len(page_dict) == 0:
+    st.navigation([st.Page(login)]).run()
+    st.stop()
+
+# Logged in from here on
+from core.cache import get_store
+from core.client import WebhookClient
+from core.metrics import get_metrics
+from core.repository import get_repository
+from core.schema import memory_report
 
+pg = st.navigation({"Account": account_pages} | page_dict)
 
-# Run the selected page
-pg.run()
+# Run the selected page, timing its script run when metrics are on
+with get_metrics().timer("page", pg.title):
+    pg.run()
 
 # Optional: Debug tables
 if st.checkbox("Exibir tabelas de dados (debug)"):
+    if st.button("Recarregar dados"):
+        # Drop the shared copy; the rerun downloads it again for everybody
+        get_store().invalidate()
+        st.rerun()
     st.subheader("Tabela de Pacientes")
     st.write(st.session_state.patients)
     st.subheader("Tabela de Consultas")
     st.write(st.session_state.appointments)
+    st.subheader("Uso de Memória")
+    report = memory_report(
+        {
+            "patients": st.session_state.patients,
+            "appointments": st.session_state.appointments,
+        }
+    )
+    st.write(report.groupby("Table")["Bytes"].sum().div(1024**2).round(2))
+    st.dataframe(report)
+    client = getattr(get_repository(), "client", None)
+    if isinstance(client, WebhookClient):
+        st.subheader("Latência dos Webhooks")
+        st.dataframe(client.latency_report())
@@ -0,0 +1,215 @@
+"""A local stand-in for the n8n webhooks, serving synthetic tables.
+
+Run it on its own to point the app at generated data:
+
+    python -m benchmarks.fake_n8n --appointments 1000000
+
+and paste the printed `[n8n]` block into `.streamlit/secrets.toml`. The
+feeds honour the `offset`/`limit` paging, `since_row_number` delta and
+`date` / `patient_ids` day filter parameters, and whole-table responses
+carry an ETag; the write webhooks
+answer with the stored row, like the real workflows do.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from benchmarks.synthetic import generate_tables, records
+
+DEFAULT_PORT = 8765
+
+# Secrets key -> path served for it
+ENDPOINTS = {
+    "patients_url": "/patients",
+    "appointments_url": "/appointments",
+    "post_patient_url": "/post_patient",
+    "post_appointment_url": "/post_appointment",
+    "post_attended_url": "/post_attended",
+    "post_canceled_url": "/post_canceled",
+    "post_payment_url": "/post_payment",
+    "post_batch_url": "/post_batch",
+}
+
+
+def urls(port=DEFAULT_PORT, host="127.0.0.1"):
+    """The `[n8n]` secrets for a fake server on `host:port`."""
+    return {key: f"http://{host}:{port}{path}" for key, path in ENDPOINTS.items()}
+
+
+class Feed:
+    """A generated table plus the rows registered while the server runs."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.added = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame) + len(self.added)
+
+    def rows(self, since=None, offset=0, limit=None):
+        start = 0
+        if since is not None:
+            start = int(np.searchsorted(self.frame["row_number"], since, "right"))
+        first = start + offset
+        stop = len(self.frame) if limit is None else first + limit
+        page = records(self.frame, first, stop)
+        if limit is None or len(page) < limit:
+            # Registered rows follow the generated ones
+            with self._lock:
+                added = [row for row in self.added if row["row_number"] > (since or 0)]
+            skip = max(0, first - len(self.frame))
+            page += added[skip : None if limit is None else skip + limit - len(page)]
+        return page
+
+    def matching(self, column, values):
+        """Rows whose `column` is one of `values`, registered ones included."""
+        page = records(self.frame[self.frame[column].astype(str).isin(values)])
+        with self._lock:
+            page += [row for row in self.added if str(row[column]) in values]
+        return page
+
+    def add(self, row):
+        with self._lock:
+            row["row_number"] = len(self) + 2
+            self.added.append(row)
+        return row
+
+
+class FakeN8n(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, patients, appointments, port=DEFAULT_PORT, latency=0.0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.patients = Feed(patients)
+        self.appointments = Feed(appointments)
+        # Seconds added to every response, to mimic the round trip to n8n
+        self.latency = latency
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, etag=None):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = json.dumps(body, default=str).encode()
+        self.send_response(200)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/patients":
+            feed = self.server.patients
+        else:
+            feed = self.server.appointments
+        # First stage of a staged load: one day and the patients it references
+        if "date" in query:
+            return self._send(feed.matching("Date", {query["date"]}))
+        if "patient_ids" in query:
+            return self._send(
+                feed.matching("Patient ID", set(query["patient_ids"].split(",")))
+            )
+        since = query.get("since_row_number")
+        limit = query.get("limit")
+        # Whole-table responses carry an ETag; rows are only ever added
+        etag = None if query else f'"{len(feed)}"'
+        self._send(
+            feed.rows(
+                int(since) if since is not None else None,
+                int(query.get("offset", 0)),
+                int(limit) if limit is not None else None,
+            ),
+            etag,
+        )
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        try:
+            data = json.loads(body)
+        except ValueError:
+            # The registration webhooks receive form fields
+            data = {key: values[0] for key, values in parse_qs(body).items()}
+        path = urlparse(self.path).path
+        if path == "/post_patient":
+            self._send(self._patient(data))
+        elif path == "/post_appointment":
+            self._send(self._appointment(data))
+        else:
+            # Status, payment and batch webhooks echo what they stored
+            self._send(data)
+
+    def _patient(self, data):
+        patients = self.server.patients
+        return patients.add(
+            {
+                "Patient ID": str(len(patients) + 1),
+                "Name": data.get("patient_name"),
+                "Phone": data.get("patient_phone"),
+                "Email": data.get("patient_email"),
+                "Referral Source": data.get("referral_source"),
+            }
+        )
+
+    def _appointment(self, data):
+        return self.server.appointments.add(
+            {
+                "Appointment ID": data.get("appointment_id"),
+                "Patient ID": data.get("patient_id"),
+                "Date": data.get("date"),
+                "Time": data.get("time"),
+                "Payment Status": data.get("payment_status", 0),
+                "Attended": data.get("attended", "FALSE"),
+                "First Appointment": data.get("first_appointment", "FALSE"),
+                "Insurance": data.get("insurance"),
+                "Canceled": data.get("canceled", "FALSE"),
+            }
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=100_000)
+    parser.add_argument("--patients", type=int, help="default: appointments / 8")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    patients, appointments = generate_tables(
+        args.appointments, args.patients, args.seed
+    )
+    server = FakeN8n(patients, appointments, args.port, args.latency)
+    print("[n8n]")
+    for key, url in urls(args.port).items():
+        print(f'{key} = "{url}"')
+    print(f"# {len(patients)} patients, {len(appointments)} appointments", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
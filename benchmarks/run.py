@@ -0,0 +1,316 @@
+"""Benchmarks for loading, the KPIs, the daily view and registrations.
+
+    python -m benchmarks.run --rows 1000000 --output baseline.json
+    python -m benchmarks.run --rows 1000000 --baseline baseline.json
+
+Every case is timed `--repeat` times, then run once more under
+`tracemalloc` for its peak memory (numpy and pandas buffers are traced;
+Arrow's own allocator is not). The fake n8n server runs in a separate
+process, so its memory and CPU are not counted. With `--baseline`, cases
+whose median time or peak memory grew by more than `--tolerance` are
+listed and the exit status is 1.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import pandas as pd
+
+from benchmarks.fake_n8n import urls
+from benchmarks.synthetic import generate_tables, records
+from core.cache import DataStore
+from core.client import WebhookClient
+from core.kpis import calculate_ltv, calculate_period_kpis, calculate_retention_rate
+from core.repository import N8nRepository, Repository
+from core.rollups import MonthlyRollup
+from core.search import PatientSearch
+from core.schema import APPOINTMENTS, PATIENTS, as_time, normalize_records
+from core.table import AppendableTable
+
+PORT = 8766
+
+# Records normalized at a time by the normalization cases
+PAGE_SIZE = 50_000
+
+# Typeahead queries of the search case: name prefixes, a misspelling, a
+# phone number and an email
+SEARCHES = ["ana", "ana di", "Joao Silv", "mraia", "11900000042", "paciente42"]
+
+
+class Timed:
+    """Returned by a case that times only part of its work itself."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+def normalize(frame, schema, compact):
+    # Records are built outside the timer, one page at a time, so only the
+    # conversion and the append are measured, as in a paged load
+    def run():
+        seconds = 0.0
+        table = None
+        for start in range(0, len(frame), PAGE_SIZE):
+            page = records(frame, start, start + PAGE_SIZE)
+            began = time.perf_counter()
+            rows = normalize_records(page, schema, compact)
+            if table is None:
+                table = AppendableTable(rows)
+            else:
+                table.append(rows)
+            seconds += time.perf_counter() - began
+        return Timed(seconds)
+
+    return run
+
+
+def today_view(repository, today):
+    # Same work as select_today in secretary/appointments.py
+    rows = repository.appointments_between(today, today)
+    return rows.assign(Time=as_time(rows["Time"])).sort_values(by="Time")
+
+
+def registrations(repository, patients):
+    """Callables registering one patient and one appointment per call."""
+    counter = iter(range(10**9))
+
+    def patient():
+        number = next(counter)
+        repository.call(
+            "post_patient_url",
+            {
+                "patient_name": f"Paciente Benchmark {number}",
+                "patient_phone": "11900000000",
+                "patient_email": f"benchmark{number}@example.com",
+                "referral_source": "Google",
+            },
+        )
+
+    def appointment():
+        number = next(counter)
+        repository.call(
+            "post_appointment_url",
+            {
+                "appointment_id": 10**9 + number,
+                "patient_id": str(number % patients + 1),
+                "date": date.today(),
+                "time": "08:00:00",
+                "first_appointment": False,
+                "insurance": "Private",
+                "payment_status": 0.0,
+                "attended": False,
+                "canceled": False,
+            },
+        )
+
+    return patient, appointment
+
+
+def sqlite_repository(path, store, patients, appointments, compact):
+    from core.sqlite_repository import SqliteRepository
+    from core.sync import MODIFIED_COLUMN
+
+    repository = SqliteRepository(store, path, compact=compact)
+    stamp = "2000-01-01 00:00:00.000000"
+    with repository.connection:
+        for table, frame in (("patients", patients), ("appointments", appointments)):
+            frame = frame.assign(**{MODIFIED_COLUMN: stamp})
+            for column in ("Attended", "First Appointment", "Canceled"):
+                if column in frame:
+                    frame[column] = frame[column].eq("TRUE").astype(int)
+            columns = ", ".join(f'"{column}"' for column in frame.columns)
+            marks = ", ".join("?" for _ in frame.columns)
+            for start in range(0, len(frame), PAGE_SIZE):
+                repository.connection.executemany(
+                    f"INSERT INTO {table} ({columns}) VALUES ({marks})",
+                    frame.iloc[start : start + PAGE_SIZE]
+                    .astype(object)
+                    .itertuples(index=False),
+                )
+    return repository
+
+
+def start_server(args):
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fake_n8n",
+            "--appointments",
+            str(args.rows),
+            "--port",
+            str(PORT),
+            "--latency",
+            str(args.latency),
+            "--seed",
+            str(args.seed),
+        ]
+        + (["--patients", str(args.patients)] if args.patients else []),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # The server prints its secrets, then a summary line once it is listening
+    for line in server.stdout:
+        if line.startswith("#"):
+            break
+    return server
+
+
+def cases(args):
+    """Yield `(name, callable, repeat)` for every case, setting up as it goes."""
+    patients, appointments = generate_tables(args.rows, args.patients, args.seed)
+    compact = args.compact
+
+    yield "normalize/patients", normalize(patients, PATIENTS, compact), args.repeat
+    yield "normalize/appointments", normalize(
+        appointments, APPOINTMENTS, compact
+    ), args.repeat
+
+    client = WebhookClient(urls(PORT))
+    options = {"page_size": args.page_size} if args.page_size else {}
+    store = DataStore(ttl=None)
+    n8n = N8nRepository(store, client, options, compact)
+    yield "load/n8n", n8n.load, args.repeat
+
+    store.ensure_loaded(n8n.load)
+    df = store.appointments
+    with_features = pd.concat([df, store.features("appointments")], axis=1)
+    for period in ("annual", "monthly"):
+        yield f"kpis/period-{period}", lambda period=period: calculate_period_kpis(
+            with_features, period
+        ), args.repeat
+    yield "kpis/ltv", lambda: calculate_ltv(df), args.repeat
+    yield "kpis/retention", lambda: calculate_retention_rate(df), args.repeat
+    yield "kpis/rollup-build", lambda: MonthlyRollup.build(df), args.repeat
+    yield "kpis/rollup-monthly", lambda: store.period_kpis("monthly"), args.repeat
+
+    today = date.today()
+    day_n8n = N8nRepository(store, client, {**options, "day_filter": True}, compact)
+    yield "load/n8n-day", lambda: day_n8n.load_day(today), args.repeat
+
+    in_memory = Repository(store, compact)
+    yield "today/filter", lambda: today_view(in_memory, today), args.repeat
+    yield "search/build", lambda: PatientSearch.build(store.patients), args.repeat
+    yield "search/query", lambda: [
+        store.search_patients(query) for query in SEARCHES
+    ], args.repeat
+
+    patient, appointment = registrations(n8n, len(patients))
+    yield "write/n8n-patient", patient, args.writes
+    yield "write/n8n-appointment", appointment, args.writes
+
+    if not args.sqlite:
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite = sqlite_repository(
+            f"{directory}/clinic.db", store, patients, appointments, compact
+        )
+        yield "load/sqlite", sqlite.load, args.repeat
+        yield "load/sqlite-day", lambda: sqlite.load_day(today), args.repeat
+        yield "kpis/sqlite-monthly", lambda: sqlite.period_kpis("monthly"), args.repeat
+        yield "kpis/sqlite-ltv", sqlite.lifetime_value, args.repeat
+        yield "today/sqlite", lambda: today_view(sqlite, today), args.repeat
+        patient, appointment = registrations(sqlite, len(patients))
+        yield "write/sqlite-patient", patient, args.writes
+        yield "write/sqlite-appointment", appointment, args.writes
+
+
+def measure(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - began
+        samples.append(result.seconds if isinstance(result, Timed) else elapsed)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_ms": round(min(samples) * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "peak_mb": round(peak / 1024**2, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Cases slower or bigger than `baseline` by more than `tolerance`."""
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ("median_ms", "peak_mb"):
+            if before[metric] and now[metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {before[metric]} -> {now[metric]}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--rows", type=int, default=100_000, help="appointments")
+    parser.add_argument("--patients", type=int, help="default: rows / 8")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--writes", type=int, default=50, help="calls per write case")
+    parser.add_argument("--page-size", type=int, help="load the feeds in pages")
+    parser.add_argument("--compact", action="store_true", help="compact dtypes")
+    parser.add_argument("--sqlite", action="store_true", help="also bench SQLite")
+    parser.add_argument("--latency", type=float, default=0.0, help="server delay")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="run the cases starting with this prefix")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with a previous --output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    server = start_server(args)
+    results = {}
+    try:
+        for name, run, repeat in cases(args):
+            if args.only and not name.startswith(args.only):
+                continue
+            results[name] = measure(run, repeat)
+            print(f"{name:28} {results[name]}", flush=True)
+    finally:
+        server.terminate()
+
+    print()
+    print(pd.DataFrame.from_dict(results, orient="index").to_string())
+    if args.output:
+        meta = {
+            "rows": args.rows,
+            "patients": args.patients,
+            "compact": args.compact,
+            "page_size": args.page_size,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+        }
+        with open(args.output, "w") as file:
+            json.dump({"meta": meta, "results": results}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        print()
+        print("\n".join(regressions) or "No regressions")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Synthetic patients and appointments tables, shaped like the n8n feeds.
+
+Values are the raw text the webhooks send (dates as YYYY-MM-DD, flags as
+"TRUE"/"FALSE", payments as numbers), so they go through the same
+normalization as production data. Everything is generated column by column
+with numpy; string columns are kept as categoricals so 10M rows fit in
+memory, and `records` turns a slice into webhook records on demand.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Share of appointments per plan
+INSURANCE_MIX = {
+    "Unimed": 0.34,
+    "Bradesco Saúde": 0.15,
+    "Amil": 0.12,
+    "Private": 0.33,
+    "Other": 0.06,
+}
+
+REFERRAL_MIX = {
+    "Social Media": 0.25,
+    "Website": 0.15,
+    "Google": 0.30,
+    "Referral": 0.22,
+    "Other": 0.08,
+}
+
+CANCEL_RATE = 0.08
+# Share of the appointments that were not canceled and were attended
+ATTENDANCE_RATE = 0.82
+
+# Ticket range in reais: private visits, and what the plans pay per visit
+PRIVATE_TICKET = (250, 450)
+INSURANCE_TICKET = (90, 180)
+
+# Consultation slots: every 30 minutes, 08:00 to 17:30
+SLOTS = [f"{hour:02d}:{minute:02d}:00" for hour in range(8, 18) for minute in (0, 30)]
+
+# How the sheet behind n8n writes booleans
+FLAGS = ["FALSE", "TRUE"]
+
+# Appointments per patient, on average
+VISITS_PER_PATIENT = 8
+
+FIRST_NAMES = [
+    "Ana",
+    "Bruno",
+    "Camila",
+    "Daniel",
+    "Eduarda",
+    "Felipe",
+    "Gabriela",
+    "Henrique",
+    "Isabela",
+    "João",
+    "Larissa",
+    "Lucas",
+    "Mariana",
+    "Pedro",
+    "Rafaela",
+    "Thiago",
+    "Vitória",
+    "José",
+    "Júlia",
+    "André",
+]
+LAST_NAMES = [
+    "Silva",
+    "Santos",
+    "Oliveira",
+    "Souza",
+    "Rodrigues",
+    "Ferreira",
+    "Alves",
+    "Pereira",
+    "Lima",
+    "Gomes",
+    "Costa",
+    "Ribeiro",
+    "Martins",
+    "Carvalho",
+    "Araújo",
+    "Melo",
+    "Barbosa",
+    "Conceição",
+    "Rocha",
+    "Dias",
+]
+
+
+def _choice(rng, mix, size):
+    values = list(mix)
+    codes = rng.choice(len(values), size=size, p=list(mix.values()))
+    return pd.Categorical.from_codes(codes, categories=values)
+
+
+def _text(values):
+    # Categorical of distinct strings, so only the uniques are Python objects
+    codes, uniques = pd.factorize(values)
+    return pd.Categorical.from_codes(codes, categories=uniques.astype(str))
+
+
+def generate_patients(count, seed=0):
+    """Return `count` patients with sequential IDs "1".."count"."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, count + 1)
+    first = rng.choice(FIRST_NAMES, size=count)
+    last = rng.choice(LAST_NAMES, size=count)
+    # Suffixing the ID keeps the names distinct, as they are in practice
+    names = np.char.add(np.char.add(np.char.add(first, " "), last), " ")
+    names = np.char.add(names, ids.astype(str))
+    return pd.DataFrame(
+        {
+            "row_number": ids + 1,
+            "Patient ID": _text(ids.astype(str)),
+            "Name": _text(names),
+            "Phone": _text(np.char.add("119", np.char.zfill(ids.astype(str), 8))),
+            "Email": _text(
+                np.char.add(np.char.add("paciente", ids.astype(str)), "@example.com")
+            ),
+            "Referral Source": _choice(rng, REFERRAL_MIX, count),
+        }
+    )
+
+
+def generate_appointments(
+    count, patients=None, years=5, today=None, future_days=30, seed=0
+):
+    """Return `count` appointments between `years` ago and `future_days` ahead.
+
+    `patients` is the number of patients (default `count / 8`); a few
+    patients account for most visits, as in a real practice. Future
+    appointments are neither attended nor paid yet, and First Appointment
+    marks each patient's earliest visit.
+    """
+    rng = np.random.default_rng(seed + 1)
+    today = today or date.today()
+    patients = patients or max(1, count // VISITS_PER_PATIENT)
+    start = today - timedelta(days=365 * years)
+    days = (today - start).days + future_days + 1
+
+    # Heavy-tailed visits per patient: weights drawn from a gamma distribution
+    weights = rng.gamma(0.8, size=patients)
+    patient = rng.choice(patients, size=count, p=weights / weights.sum()) + 1
+    offset = rng.integers(0, days, size=count)
+    slot = rng.integers(0, len(SLOTS), size=count)
+    order = np.lexsort((slot, offset))
+    patient, offset, slot = patient[order], offset[order], slot[order]
+
+    insurance = _choice(rng, INSURANCE_MIX, count)
+    past = offset <= (today - start).days
+    canceled = rng.random(count) < CANCEL_RATE
+    attended = past & ~canceled & (rng.random(count) < ATTENDANCE_RATE)
+    private = np.asarray(insurance == "Private")
+    low = np.where(private, PRIVATE_TICKET[0], INSURANCE_TICKET[0])
+    high = np.where(private, PRIVATE_TICKET[1], INSURANCE_TICKET[1])
+    payment = np.where(attended, rng.integers(low, high + 1), 0)
+    # Rows are in date order, so each patient's first row is the earliest
+    first = np.zeros(count, dtype=bool)
+    first[np.unique(patient, return_index=True)[1]] = True
+
+    dates = pd.date_range(start, periods=days).strftime("%Y-%m-%d")
+    categorical = pd.Categorical.from_codes
+    return pd.DataFrame(
+        {
+            "row_number": np.arange(2, count + 2),
+            "Appointment ID": np.arange(1, count + 1),
+            "Patient ID": _text(patient.astype(str)),
+            "Date": categorical(offset, categories=dates),
+            "Time": categorical(slot, categories=SLOTS),
+            "Payment Status": payment,
+            "Attended": categorical(attended.astype(int), categories=FLAGS),
+            "First Appointment": categorical(first.astype(int), categories=FLAGS),
+            "Insurance": insurance,
+            "Canceled": categorical(canceled.astype(int), categories=FLAGS),
+        }
+    )
+
+
+def generate_tables(appointments, patients=None, seed=0):
+    """Return matching `(patients, appointments)` tables."""
+    patients = patients or max(1, appointments // VISITS_PER_PATIENT)
+    return (
+        generate_patients(patients, seed),
+        generate_appointments(appointments, patients, seed=seed),
+    )
+
+
+def records(df, start=0, stop=None):
+    """Rows `start:stop` of a generated table as a list of webhook records."""
+    return df.iloc[start:stop].astype(object).to_dict("records")
@@ -0,0 +1,746 @@
+import os
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from core.cohorts import CohortIndex
+from core.date_index import DateIndex
+from core.features import FEATURES
+from core.index import DataIndex
+from core.kpis import calculate_range_kpis
+from core.rollups import MonthlyRollup
+from core.schedule import (
+    BOOKED_SECONDS,
+    HOLDS_FILE,
+    ID_FILE,
+    IdAllocator,
+    ScheduleIndex,
+    SlotHolds,
+    day_numbers,
+    minutes,
+)
+from core.search import DEFAULT_LIMIT, PatientSearch
+from core.shared import SharedTables, default_directory
+from core.snapshot import Snapshot
+from core.sync import merge_delta, watermark
+from core.table import AppendableTable
+
+# Seconds a loaded copy of the tables is served before it is downloaded again
+DEFAULT_TTL = 300
+
+TABLES = ("patients", "appointments")
+
+# Column identifying a row of each table across loads
+KEYS = {"patients": "Patient ID", "appointments": "Appointment ID"}
+
+# Default location of the warm-start snapshot, when enabled
+SNAPSHOT_DIR = ".cache/snapshot"
+
+# Default directory of the files the server processes of a host coordinate
+# through (see `core.schedule`) when they do not share the tables
+LOCK_DIR = ".cache/locks"
+
+# Seconds a follower process waits for the first published version before
+# loading the tables itself
+LEADER_TIMEOUT = 120
+
+# Seconds between two publishes of the leader's tables
+PUBLISH_GAP = 1
+
+# Indexes of the tables, by attribute. Each is built from `(patients,
+# appointments)` on first use and kept up to date on writes from then on, so
+# a process only pays for the indexes its pages read.
+INDEXES = {
+    "index": DataIndex.build,
+    "rollup": lambda patients, appointments: MonthlyRollup.build(appointments),
+    "dates": lambda patients, appointments: DateIndex.build(appointments),
+    "cohorts": CohortIndex.build,
+    "schedule": lambda patients, appointments: ScheduleIndex.build(appointments),
+    "search": lambda patients, appointments: PatientSearch.build(patients),
+}
+
+
+class DataStore:
+    """Process-wide copy of the patients and appointments tables.
+
+    Every browser session reads the same DataFrames instead of downloading and
+    holding its own copy. `version` is bumped on every load or write so
+    sessions can tell when their references are out of date. Tables are kept
+    in `AppendableTable`s, so writes never copy the whole table.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, disk=None, shared=None, locks=None):
+        self.ttl = ttl
+        # Optional `Snapshot` used for warm starts
+        self.disk = disk
+        # Optional `SharedTables` shared with the other server processes, and
+        # the published version this process has attached
+        self.shared = shared
+        self.attached = None
+        self.version = 0
+        self.loaded_at = None
+        # True while only the first stage of a staged load is installed, and
+        # the writes made meanwhile, replayed on the history once it lands
+        self.partial = False
+        self.journal = None
+        # True while a reload downloads outside the lock
+        self.reloading = False
+        self.tables = {}
+        # Highest row_number / modified-at seen per table, for delta syncs
+        self.watermarks = {}
+        # The `INDEXES` built so far, by attribute
+        self._indexes = {}
+        # Appointment IDs and slot holds, kept in files of the shared
+        # directory (or of `locks`) so every process on the host sees the
+        # same ones; without either they are local to this process
+        locks = shared.directory if shared is not None else locks
+        if locks is not None:
+            os.makedirs(locks, exist_ok=True)
+        self.ids = IdAllocator(os.path.join(locks, ID_FILE) if locks else None)
+        self.holds = SlotHolds(os.path.join(locks, HOLDS_FILE) if locks else None)
+        # Callables returning the `(table, key, values)` of local edits the
+        # backend has not confirmed yet (see `core.writeback`); reapplied on
+        # top of the rows every load and delta merge installs
+        self.overlays = []
+        # (version, key) -> result of `cached` computations
+        self._memo = {}
+        self._lock = threading.RLock()
+        # A publish is running, and another one is due after it
+        self._publishing = False
+        self._republish = False
+
+    @property
+    def patients(self):
+        table = self.tables.get("patients")
+        return table.frame if table is not None else None
+
+    @property
+    def appointments(self):
+        table = self.tables.get("appointments")
+        return table.frame if table is not None else None
+
+    def _index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = INDEXES[name](self.patients, self.appointments)
+                    self._indexes[name] = index
+        return index
+
+    @property
+    def index(self):
+        return self._index("index")
+
+    @property
+    def rollup(self):
+        return self._index("rollup")
+
+    @property
+    def dates(self):
+        return self._index("dates")
+
+    @property
+    def cohorts(self):
+        return self._index("cohorts")
+
+    @property
+    def schedule(self):
+        return self._index("schedule")
+
+    @property
+    def search(self):
+        return self._index("search")
+
+    def is_stale(self):
+        if self.loaded_at is None:
+            return True
+        if self.ttl is None:
+            return False
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    def ensure_loaded(self, loader, delta_loader=None, force=False, day_loader=None):
+        """Call `loader` if the tables were never loaded or have expired.
+
+        `loader` returns a `(patients, appointments)` tuple of DataFrames or
+        `AppendableTable`s. When the tables are already loaded and
+        `delta_loader` is given, it is called with `watermarks` instead and
+        its `(patients, appointments)` rows are merged into the current
+        tables in place. On the first load of the process, a saved snapshot
+        (see `core.snapshot`) is restored and only the delta since it is
+        fetched; without `delta_loader` the snapshot is served as it is until
+        the next refresh or the TTL reloads it. Reloads pass
+        `changed_only=True` to `loader`, which may return None for a table
+        that has not changed.
+        Only one session runs the load. On the first load concurrent sessions
+        wait for the lock and reuse the result; a reload downloads and builds
+        the new tables without the lock, so sessions keep reading the current
+        ones until they are swapped in. `force` reloads even if the tables
+        are fresh.
+        With `shared` tables, only the leading process loads (and publishes
+        what it loaded and every write after it); the others attach the
+        version it published last. A follower that finds nothing published
+        yet stages its load and takes the history from the leader's first
+        version.
+
+        With `day_loader`, a first load that has no snapshot to restore is
+        staged: `day_loader(today)` returns today's appointments and the
+        patients they reference, which are installed at once (`partial`),
+        and the whole history is downloaded by `loader` in a background
+        thread and installed when it lands.
+        """
+        if self.partial or self.reloading:
+            # The history (or a reload) is still downloading; the current
+            # tables are served meanwhile
+            return
+        if (
+            self.shared is not None
+            and not self.shared.leads()
+            # A staged load serves today's tables while the leader loads
+            and self._follow(wait=day_loader is None)
+        ):
+            return
+        if not force and not self.is_stale():
+            return
+        with self._lock:
+            if self.partial or self.reloading or not force and not self.is_stale():
+                return
+            if not self.tables:
+                # Nothing to serve yet, so sessions wait for the first load
+                self._load(loader, delta_loader, day_loader)
+                return
+            self.reloading = True
+            self.journal = []
+        try:
+            self._reload(loader, delta_loader)
+        finally:
+            with self._lock:
+                self.reloading = False
+                self.journal = None
+
+    def _load(self, loader, delta_loader, day_loader):
+        # First load of the process, under the lock
+        warm = False
+        if self.disk is not None:
+            restored = self.disk.load()
+            if restored is not None:
+                frames, watermarks = restored
+                self._install(frames["patients"], frames["appointments"])
+                self.watermarks = watermarks
+                warm = True
+        if warm and delta_loader is None:
+            self.loaded_at = time.monotonic()
+            self.version += 1
+            self.publish()
+            return
+        if warm:
+            self._merge(delta_loader(self.watermarks), warm=True)
+            return
+        if day_loader is not None:
+            staged = day_loader(date.today())
+            if staged is not None:
+                self._install(*staged)
+                self.partial = True
+                self.journal = []
+                self.version += 1
+                threading.Thread(
+                    target=self._load_history, args=(loader,), daemon=True
+                ).start()
+                return
+        self._install(*loader(changed_only=False))
+        self.watermarks = {table: watermark(getattr(self, table)) for table in TABLES}
+        self._loaded()
+
+    def _reload(self, loader, delta_loader):
+        # Downloads and builds without the lock, so sessions keep reading and
+        # writing the current tables; their writes are journaled meanwhile
+        # and replayed on what the reload installs, like in `_load_history`
+        if delta_loader is not None and self.loaded_at is not None:
+            deltas = delta_loader(dict(self.watermarks))
+            with self._lock:
+                journal, self.journal = self.journal, None
+                if self._merge(deltas):
+                    self._replay(journal)
+            return
+        # After `invalidate` everything is downloaded again
+        loaded = loader(changed_only=self.loaded_at is not None)
+        if all(table is None for table in loaded):
+            # Nothing changed upstream: keep the tables and the version
+            with self._lock:
+                self.loaded_at = time.monotonic()
+            return
+        with self._lock:
+            # A copy of an unchanged table, so no write lands in it while the
+            # indexes are built from it
+            loaded = [
+                self.tables[table].frame.copy() if rows is None else rows
+                for table, rows in zip(TABLES, loaded)
+            ]
+            # Indexes in use are rebuilt now; the others on first use
+            indexes = list(self._indexes)
+        built = _build(*loaded, indexes)
+        with self._lock:
+            journal, self.journal = self.journal, None
+            self._swap(built)
+            self.watermarks = {
+                table: watermark(getattr(self, table)) for table in TABLES
+            }
+            self._replay(journal)
+            self._loaded()
+
+    def _merge(self, deltas, warm=False):
+        """Merge delta rows into the tables; True if any row changed."""
+        changed = False
+        for table, delta in zip(TABLES, deltas):
+            if delta is None or delta.empty:
+                continue
+            replaced, written = merge_delta(self.tables[table], delta)
+            self.watermarks[table] = watermark(delta, self.watermarks.get(table))
+            if written.empty:
+                # Every row was already stored as sent
+                continue
+            self._unindex(table, replaced)
+            self._reindex(table, written)
+            changed = True
+        if changed:
+            self._reapply()
+        self._settle()
+        self.loaded_at = time.monotonic()
+        if changed or warm:
+            self.version += 1
+            self.publish()
+        if changed:
+            self.save_snapshot()
+        return changed
+
+    def _loaded(self):
+        # Bookkeeping after whole tables were installed
+        self.loaded_at = time.monotonic()
+        self.version += 1
+        self.save_snapshot()
+        self.publish()
+
+    def _load_history(self, loader):
+        # Second stage of a staged load. The download (or a follower's wait for
+        # the leader's first version) runs without the lock, so sessions keep
+        # reading and writing today's tables meanwhile
+        loaded = watermarks = name = None
+        if self.shared is not None and not self.shared.leads():
+            name = self.shared.wait(LEADER_TIMEOUT)
+            restored = self.shared.attach(name) if name is not None else None
+            if restored is not None:
+                frames, watermarks = restored
+                loaded = frames["patients"], frames["appointments"]
+        if loaded is None:
+            # No leader published in time: download the history here
+            name = None
+            try:
+                loaded = loader()
+            except Exception as error:
+                # Left stale: the next session loads everything itself
+                print("History not loaded:", error)
+        if loaded is not None:
+            with self._lock:
+                indexes = list(self._indexes)
+            built = _build(*loaded, indexes)
+        with self._lock:
+            journal, self.journal = self.journal, None
+            if loaded is not None:
+                self._swap(built)
+                self.watermarks = watermarks or {
+                    table: watermark(getattr(self, table)) for table in TABLES
+                }
+                self.attached = name
+                self._replay(journal)
+                self.loaded_at = time.monotonic()
+                self.version += 1
+            self.partial = False
+        if loaded is None or name is not None:
+            return
+        self.save_snapshot()
+        self.publish()
+
+    def _replay(self, journal):
+        # Writes made to today's tables while the history downloaded: the
+        # download may have started before they reached the backend
+        for table, item, values in journal:
+            key = KEYS[table]
+            if values is None:
+                rows = item[~item[key].isin(self.tables[table].frame[key])]
+                if not rows.empty:
+                    self._reindex(table, self.tables[table].append(rows))
+                continue
+            label = self.locate(table, item)
+            if label is not None:
+                self.update(table, label, values)
+        self._settle()
+
+    def _follow(self, wait=True):
+        """Attach the leader's current version; False if there is none.
+
+        With `wait`, a process that has attached nothing yet waits for the
+        leader's first version rather than downloading a second copy.
+        """
+        name = self.shared.current()
+        if name is None and self.attached is None and wait:
+            name = self.shared.wait(LEADER_TIMEOUT)
+        if name is None:
+            return False
+        if name == self.attached:
+            return True
+        with self._lock:
+            if name == self.attached:
+                return True
+            restored = self.shared.attach(name)
+            if restored is None:
+                return False
+            frames, watermarks = restored
+            self._install(frames["patients"], frames["appointments"])
+            self.watermarks = watermarks
+            self.attached = name
+            self.loaded_at = time.monotonic()
+            self.version += 1
+            return True
+
+    def _install(self, patients, appointments):
+        self._swap(_build(patients, appointments))
+
+    def _swap(self, built):
+        # Replace the tables and indexes with those of `_build`
+        self.tables, self._indexes = built
+        if self.appointments is not None:
+            self.ids.observe(self.appointments["Appointment ID"])
+        self._reapply()
+
+    def _reapply(self):
+        # Loaded rows may predate edits still queued for (or in flight to) the
+        # backend; the local edit wins until the backend answers
+        for overlay in self.overlays:
+            for table, key, values in overlay():
+                label = self.locate(table, key)
+                if label is None:
+                    continue
+                frame = self.tables[table].frame
+                if not all(
+                    _same(frame.at[label, column], value)
+                    for column, value in values.items()
+                ):
+                    self.update(table, label, values)
+
+    def save_snapshot(self):
+        """Write the tables to the on-disk snapshot in a background thread."""
+        if self.disk is None:
+            return
+        threading.Thread(target=self._save_snapshot, daemon=True).start()
+
+    def _save_snapshot(self):
+        # Under the lock so no write lands halfway through the copy
+        with self._lock:
+            frames = {table: getattr(self, table) for table in TABLES}
+            try:
+                self.disk.save(frames, self.watermarks)
+            except (OSError, pa.ArrowException) as error:
+                # A snapshot is only an optimization; the app works without it
+                print("Snapshot not saved:", error)
+
+    def publish(self):
+        """Publish the tables to the other processes in a background thread.
+
+        At most one publish runs per `PUBLISH_GAP` seconds: calls made
+        meanwhile are folded into a single publish after the gap.
+        """
+        if self.shared is None:
+            return
+        with self._lock:
+            if self._publishing:
+                self._republish = True
+                return
+            self._publishing = True
+        threading.Thread(target=self._publish, daemon=True).start()
+
+    def _publish(self):
+        while True:
+            with self._lock:
+                self._republish = False
+                if self.shared.leads():
+                    frames = {table: getattr(self, table) for table in TABLES}
+                    try:
+                        self.shared.publish(frames, self.watermarks)
+                    except (OSError, pa.ArrowException) as error:
+                        # Followers keep the version they have and retry on
+                        # the next one
+                        print("Tables not published:", error)
+            # Sessions read between publishes; writes meanwhile share the next
+            time.sleep(PUBLISH_GAP)
+            with self._lock:
+                if not self._republish:
+                    self._publishing = False
+                    return
+
+    def snapshot(self):
+        """Return `(version, patients, appointments)` as one consistent read."""
+        with self._lock:
+            return self.version, self.patients, self.appointments
+
+    def append(self, table, rows):
+        """Append the `rows` DataFrame to `table` and publish a new version."""
+        with self._lock:
+            self._reindex(table, self.tables[table].append(rows))
+            self._settle()
+            self.version += 1
+            if self.journal is not None:
+                self.journal.append((table, rows, None))
+            self.publish()
+
+    def update(self, table, label, values, expected=None):
+        """Set `values` (column -> value) on row `label` of `table`.
+
+        Returns the previous values. When `expected` (column -> value) is
+        given, the row is only written if it still holds those values;
+        otherwise nothing changes and None is returned.
+        """
+        with self._lock:
+            df = self.tables[table].frame
+            if expected is not None and not all(
+                _same(df.at[label, column], value) for column, value in expected.items()
+            ):
+                return None
+            old = {column: df.at[label, column] for column in values}
+            self.tables[table].set(label, values)
+            df = self.tables[table].frame
+            if self.journal is not None:
+                self.journal.append((table, df.at[label, KEYS[table]], values))
+            if table == "appointments":
+                day = df.at[label, "Date"]
+                rollup, dates, cohorts, schedule = self._built(
+                    "rollup", "dates", "cohorts", "schedule"
+                )
+                if rollup is not None:
+                    rollup.update(day, df.at[label, "Insurance"], old, values)
+                if dates is not None:
+                    dates.update(day, old, values)
+                if cohorts is not None:
+                    cohorts.update(df.at[label, "Patient ID"], day, old, values)
+                if schedule is not None:
+                    schedule.update(label, day, df.at[label, "Time"], values)
+                self._settle()
+            self.version += 1
+            self.publish()
+            return old
+
+    def locate(self, table, key):
+        """Row label of Patient ID / Appointment ID `key` in `table`, or None."""
+        with self._lock:
+            if table == "patients":
+                return self.index.patient_rows.get(key)
+            return self.index.appointment_rows.get(key)
+
+    def cached(self, key, compute, version=None):
+        """Return `compute()` memoized on `(version, key)`.
+
+        `version` defaults to the current data version; pass the version of
+        the frames `compute` reads when they may be older. Results of other
+        versions are dropped, so the memo only ever holds the latest data.
+        """
+        version = self.version if version is None else version
+        entry = self._memo.get((version, key))
+        if entry is not None:
+            return entry
+        result = compute()
+        with self._lock:
+            if version == self.version:
+                self._memo = {
+                    memo_key: value
+                    for memo_key, value in self._memo.items()
+                    if memo_key[0] == version
+                }
+                self._memo[(version, key)] = result
+        return result
+
+    def features(self, table):
+        """Derived columns of `table` (see `core.features`), built on first use.
+
+        Memoized on the data version like `cached`, so each version is derived
+        once however many sessions read it; readers use these instead of
+        adding columns to the shared frame, which must stay unchanged.
+        """
+        with self._lock:
+            version, frame = self.version, self.tables[table].frame
+        return self.cached(("features", table), lambda: FEATURES[table](frame), version)
+
+    def period_kpis(self, period):
+        """Period-level KPIs from the monthly rollup (O(months))."""
+        with self._lock:
+            return self.rollup.period_kpis(period)
+
+    def range_kpis(self, start, stop):
+        """Period KPIs of the appointments dated `start` to `stop` (O(log n))."""
+        with self._lock:
+            totals = self.dates.totals(start, stop)
+        return calculate_range_kpis(totals, start, stop)
+
+    def appointments_between(self, start, stop):
+        """Appointments dated `start` to `stop` (inclusive), in date order."""
+        with self._lock:
+            labels = self.dates.labels(start, stop)
+            return self.appointments.loc[labels]
+
+    def cohort_retention(self, by=None):
+        """Retention matrix of the patient cohorts (see `CohortIndex`)."""
+        with self._lock:
+            return self.cohorts.retention(by)
+
+    def cohort_ltv(self, by=None):
+        """Cumulative LTV curves of the patient cohorts (see `CohortIndex`)."""
+        with self._lock:
+            return self.cohorts.ltv_curves(by)
+
+    def search_patients(self, query, limit=DEFAULT_LIMIT):
+        """Top `limit` patients matching `query` by name, phone or email."""
+        with self._lock:
+            return self.search.search(query, limit)
+
+    def free_slots(self, date, opening, closing, duration):
+        """Free `duration`-minute slots of `date` between opening and closing."""
+        held = self.holds.on(day_numbers(date))
+        with self._lock:
+            return self.schedule.free_slots(date, opening, closing, duration, held)
+
+    def hold_slot(self, date, start, duration):
+        """Reserve a free slot while it is registered; False if it is taken.
+
+        Any start time may be held, on the grid of `free_slots` or not, as
+        long as no booking or other hold overlaps it.
+        """
+        with self._lock:
+            if not self.schedule.is_free(date, start, duration):
+                return False
+        return self.holds.hold(day_numbers(date), minutes(start), duration)
+
+    def release_slot(self, date, start, booked=False):
+        """Drop the hold of a slot; once `booked`, keep it `BOOKED_SECONDS`."""
+        self.holds.release(
+            day_numbers(date), minutes(start), BOOKED_SECONDS if booked else 0
+        )
+
+    def _built(self, *names):
+        # The indexes among `names` built so far (None for the others)
+        return [self._indexes.get(name) for name in names]
+
+    def _reindex(self, table, rows):
+        index, rollup, dates, cohorts, schedule, search = self._built(*INDEXES)
+        if table == "patients":
+            if index is not None:
+                index.add_patients(rows)
+            if cohorts is not None:
+                cohorts.add_patients(rows)
+            if search is not None:
+                search.add(rows)
+            return
+        if index is not None:
+            index.add_appointments(rows)
+        for built in (rollup, dates, cohorts, schedule):
+            if built is not None:
+                built.add(rows)
+        self.ids.observe(rows["Appointment ID"])
+
+    def _unindex(self, table, rows):
+        index, rollup, dates, cohorts, schedule, search = self._built(*INDEXES)
+        if table == "patients":
+            if index is not None:
+                index.remove_patients(rows)
+            if search is not None:
+                search.remove(rows)
+            return
+        if index is not None:
+            index.remove_appointments(rows)
+        for built in (rollup, dates, cohorts, schedule):
+            if built is not None:
+                built.remove(rows)
+
+    def _settle(self):
+        # Drop (to be rebuilt on next use) the date index once the writes it
+        # collected slow its queries down, the cohorts if a write moved a
+        # patient to another one, and the search once it needs a rebuild
+        dates, cohorts, search = self._built("dates", "cohorts", "search")
+        if dates is not None and dates.needs_rebuild():
+            del self._indexes["dates"]
+        if cohorts is not None and cohorts.stale:
+            del self._indexes["cohorts"]
+        if search is not None and search.needs_rebuild():
+            del self._indexes["search"]
+
+    def invalidate(self):
+        """Force the next `ensure_loaded` call to download the tables again."""
+        with self._lock:
+            self.loaded_at = None
+            self.attached = None
+
+
+def _build(patients, appointments, indexes=()):
+    """The tables of a load and its `indexes`, built without touching the store.
+
+    Returns `(tables, {name: index})`; the other indexes are left to be built
+    on first use.
+    """
+    # Streamed loads arrive already in an AppendableTable
+    tables = {
+        table: rows if isinstance(rows, AppendableTable) else AppendableTable(rows)
+        for table, rows in zip(TABLES, (patients, appointments))
+    }
+    frames = tables["patients"].frame, tables["appointments"].frame
+    return tables, {name: INDEXES[name](*frames) for name in indexes}
+
+
+def _same(current, value):
+    if pd.isna(current) or pd.isna(value):
+        return pd.isna(current) and pd.isna(value)
+    return current == value
+
+
+@st.cache_resource
+def get_store():
+    options = st.secrets.get("cache", {})
+    disk = None
+    if options.get("snapshot", False):
+        disk = Snapshot(
+            options.get("snapshot_dir", SNAPSHOT_DIR), options.get("compact", False)
+        )
+    shared = None
+    if options.get("shared", False):
+        shared = SharedTables(
+            options.get("shared_dir") or default_directory(),
+            options.get("compact", False),
+        )
+    return DataStore(
+        ttl=options.get("ttl", DEFAULT_TTL),
+        disk=disk,
+        shared=shared,
+        locks=options.get("lock_dir", LOCK_DIR),
+    )
+
+
+def wait_for_history():
+    """Stop the page until the history of a staged load is installed.
+
+    For pages that need more than today's appointments; the session reruns
+    when the history lands (see `watch_refresh` in app.py).
+    """
+    if get_store().partial:
+        st.info("Carregando o histórico de consultas... A página abre em instantes.")
+        st.stop()
+
+
+def sync_session(store=None):
+    """Point `st.session_state` at the store's current tables (no copies)."""
+    store = store or get_store()
+    version, patients, appointments = store.snapshot()
+    if st.session_state.get("data_version") != version:
+        st.session_state.patients = patients
+        st.session_state.appointments = appointments
+        st.session_state.data_version = version
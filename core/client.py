@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.metrics import REPORT_COLUMNS, Histogram
+
+# (connect, read) timeouts in seconds. The full-table downloads get a longer
+# read timeout than the single-row writes.
+DEFAULT_TIMEOUT = (3.05, 15)
+TIMEOUTS = {
+    "patients_url": (3.05, 60),
+    "appointments_url": (3.05, 60),
+}
+
+# Retry budget per request. POSTs are only retried when the connection
+# failed before the request was sent, so a write is never applied twice.
+RETRIES = 2
+BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = (502, 503, 504)
+
+# Keep-alive connections kept open per host
+POOL_SIZE = 20
+
+
+class WebhookClient:
+    """Shared HTTP client for the n8n webhooks.
+
+    One `requests.Session` with a pooled keep-alive adapter serves every page
+    and session, so a click reuses an open TLS connection instead of opening
+    a new one. Endpoints are named by their key in `st.secrets["n8n"]`, which
+    also selects their timeout. Latency is recorded per endpoint.
+    """
+
+    def __init__(
+        self,
+        urls,
+        timeouts=None,
+        retries=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        pool_size=POOL_SIZE,
+    ):
+        self.urls = dict(urls)
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUSES,
+                # Read and status retries only for idempotent requests
+                allowed_methods=frozenset({"GET"}),
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # endpoint -> (params, ETag, Last-Modified, body hash) of its last GET
+        self.validators = {}
+        # endpoint -> Histogram of request latencies
+        self.latency = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint, params=None, conditional=False):
+        """GET `endpoint` and return the decoded JSON body.
+
+        With `conditional`, returns None when the body has not changed since
+        the last GET of the same URL: the server is asked with If-None-Match
+        / If-Modified-Since when it sent validators, and otherwise the body
+        is compared by hash, which still skips decoding and normalizing it.
+        """
+        query = tuple(sorted((params or {}).items()))
+        previous = self.validators.get(endpoint)
+        if previous is not None and previous[0] != query:
+            previous = None
+        headers = {}
+        if conditional and previous is not None:
+            _, etag, modified, _ = previous
+            if etag:
+                headers["If-None-Match"] = etag
+            if modified:
+                headers["If-Modified-Since"] = modified
+        response = self.request("GET", endpoint, params=params, headers=headers)
+        if conditional and response.status_code == 304:
+            return None
+        response.raise_for_status()
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        self.validators[endpoint] = (
+            query,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            digest,
+        )
+        if conditional and previous is not None and previous[3] == digest:
+            return None
+        return response.json()
+
+    def post(self, endpoint, **kwargs):
+        """POST to `endpoint` (`data=` or `json=`) and return the response."""
+        return self.request("POST", endpoint, **kwargs)
+
+    def request(self, method, endpoint, **kwargs):
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, DEFAULT_TIMEOUT))
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, self.urls[endpoint], **kwargs)
+            failed = not response.ok
+            return response
+        finally:
+            self._record(endpoint, time.perf_counter() - start, failed)
+
+    def _record(self, endpoint, seconds, failed):
+        with self._lock:
+            histogram = self.latency.get(endpoint)
+            if histogram is None:
+                histogram = self.latency[endpoint] = Histogram()
+            histogram.add(seconds, failed)
+
+    def histograms(self):
+        """A copy of the latency histograms, keyed by ("http", endpoint)."""
+        with self._lock:
+            return {
+                ("http", endpoint): histogram.copy()
+                for endpoint, histogram in self.latency.items()
+            }
+
+    def latency_report(self):
+        """Calls, errors and mean/percentile/max latency (ms) per endpoint."""
+        with self._lock:
+            rows = [
+                {"Endpoint": endpoint, **histogram.summary()}
+                for endpoint, histogram in self.latency.items()
+            ]
+        return pd.DataFrame(rows, columns=["Endpoint", *REPORT_COLUMNS[2:]])
+
+
+@st.cache_resource
+def get_client():
+    options = st.secrets.get("http", {})
+    timeouts = {
+        endpoint: tuple(timeout)
+        for endpoint, timeout in options.get("timeouts", {}).items()
+    }
+    return WebhookClient(
+        st.secrets["n8n"],
+        timeouts=timeouts,
+        retries=options.get("retries", RETRIES),
+        backoff_factor=options.get("backoff_factor", BACKOFF_FACTOR),
+        pool_size=options.get("pool_size", POOL_SIZE),
+    )
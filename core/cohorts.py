@@ -0,0 +1,321 @@
+import numpy as np
+import pandas as pd
+
+# Visit keys pack a patient code and a month code into one int64
+MONTH_BITS = 20
+
+# Patient-level segments a cohort can be split by
+SEGMENTS = ["Insurance", "Referral Source"]
+
+# Label of patients whose referral source is unknown
+UNKNOWN_REFERRAL = "Other"
+
+
+def month_codes(dates):
+    """Months since year 0 (`year * 12 + month - 1`) of a datetime Series."""
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+
+
+def month_label(code):
+    return f"{code // 12:04d}-{code % 12 + 1:02d}"
+
+
+def _horizon(today):
+    today = pd.Timestamp.today() if today is None else pd.Timestamp(today)
+    return today.year * 12 + today.month - 1
+
+
+def _payment(value):
+    return 0.0 if pd.isna(value) else float(value)
+
+
+class CohortIndex:
+    """Patients grouped by the month of their first appointment.
+
+    A patient's cohort is the month of the appointment flagged
+    `First Appointment` (or of their earliest appointment when none is
+    flagged), and the cohort is split by the Insurance of that appointment
+    and the patient's Referral Source. For every (cohort, insurance,
+    referral, months since the first appointment) the index keeps the
+    number of patients with an appointment that month and the payments
+    received, so retention matrices and LTV curves are read from O(cohorts x
+    months) cells.
+
+    Batches are added with one sort and a few grouped passes; rows dated
+    before the patient's cohort are not counted. Distinct patient-months
+    live in a sorted array of packed keys with their appointment counts, so
+    a new batch only touches the keys it brings. A batch that would move an
+    existing patient to another cohort (a backdated first appointment, a
+    changed referral source) or removes an appointment of a patient's
+    cohort month marks the index `stale` and the store builds a new one.
+    """
+
+    def __init__(self):
+        # Patient ID -> [code, cohort, insurance, referral, flagged]
+        self.members = {}
+        # Patient ID -> Referral Source, from the patients table
+        self.referrals = {}
+        # Sorted packed (patient code, month) keys and their appointment counts
+        self.visits = np.empty(0, dtype="int64")
+        self.counts = np.empty(0, dtype="int64")
+        # (cohort, insurance, referral, offset) -> [patients, payment]
+        self.cells = {}
+        # (cohort, insurance, referral) -> patients
+        self.sizes = {}
+        self.stale = False
+
+    @classmethod
+    def from_totals(cls, cells, sizes):
+        """An index holding only the cells and cohort sizes, for reading.
+
+        `cells` has cohort, insurance, referral, offset, patients and
+        payment columns and `sizes` cohort, insurance, referral and patients,
+        as computed by a SQL backend.
+        """
+        index = cls()
+        segment = ["cohort", "insurance", "referral"]
+        index.cells = {
+            key: [patients, payment]
+            for key, patients, payment in zip(
+                cells[[*segment, "offset"]].itertuples(index=False, name=None),
+                cells["patients"].tolist(),
+                cells["payment"].tolist(),
+            )
+        }
+        index.sizes = dict(
+            zip(
+                sizes[segment].itertuples(index=False, name=None),
+                sizes["patients"].tolist(),
+            )
+        )
+        return index
+
+    @classmethod
+    def build(cls, patients, appointments):
+        index = cls()
+        if patients is not None and not patients.empty:
+            index.add_patients(patients)
+        if appointments is not None and not appointments.empty:
+            index.add(appointments)
+        return index
+
+    def add_patients(self, rows):
+        for patient_id, referral in zip(
+            rows["Patient ID"].tolist(), rows["Referral Source"].tolist()
+        ):
+            # Text columns hold missing values as "nan" (see `core.schema`)
+            if pd.isna(referral) or str(referral) == "nan":
+                referral = UNKNOWN_REFERRAL
+            referral = str(referral)
+            member = self.members.get(patient_id)
+            if member is not None and member[3] != referral:
+                self.stale = True
+            self.referrals[patient_id] = referral
+
+    def _frame(self, rows):
+        # One row per dated appointment, sorted so each patient's candidate
+        # first appointment (flagged first, then earliest) comes first
+        frame = pd.DataFrame(
+            {
+                "patient": rows["Patient ID"].to_numpy(),
+                "month": month_codes(rows["Date"]),
+                "unflagged": ~rows["First Appointment"].fillna(False).to_numpy(bool),
+                "insurance": rows["Insurance"].astype(str).to_numpy(),
+                "payment": rows["Payment Status"].fillna(0.0).to_numpy(float),
+            }
+        )
+        frame = frame[rows["Date"].notna().to_numpy()]
+        return frame.sort_values(["patient", "unflagged", "month"], kind="stable")
+
+    def _join(self, candidates):
+        """Register the patients first seen in a batch; False if one moves."""
+        for patient_id, month, unflagged, insurance in zip(
+            candidates["patient"].tolist(),
+            candidates["month"].tolist(),
+            candidates["unflagged"].tolist(),
+            candidates["insurance"].tolist(),
+        ):
+            member = self.members.get(patient_id)
+            if member is None:
+                referral = self.referrals.get(patient_id, UNKNOWN_REFERRAL)
+                self.members[patient_id] = [
+                    len(self.members),
+                    month,
+                    insurance,
+                    referral,
+                    not unflagged,
+                ]
+                segment = (month, insurance, referral)
+                self.sizes[segment] = self.sizes.get(segment, 0) + 1
+                continue
+            # Later flagged appointments and earlier unflagged ones leave a
+            # flagged patient where they are
+            cohort, flagged = member[1], member[4]
+            if flagged and not unflagged and month < cohort:
+                return False
+            if not flagged and (month < cohort or not unflagged and month != cohort):
+                return False
+        return True
+
+    def _rows(self, frame):
+        # Cohort columns of each row, and the rows the cohorts count
+        members = pd.DataFrame.from_dict(
+            {patient: self.members[patient] for patient in frame["patient"].unique()},
+            orient="index",
+            columns=["code", "cohort", "cohort_insurance", "referral", "flagged"],
+        ).reindex(frame["patient"].to_numpy())
+        frame = frame.assign(
+            code=members["code"].to_numpy(),
+            cohort=members["cohort"].to_numpy(),
+            cohort_insurance=members["cohort_insurance"].to_numpy(),
+            referral=members["referral"].to_numpy(),
+        )
+        frame["offset"] = frame["month"] - frame["cohort"]
+        return frame[frame["offset"] >= 0]
+
+    def _keys(self, frame):
+        codes = frame["code"].to_numpy().astype("int64")
+        keys = (codes << MONTH_BITS) | frame["month"].to_numpy().astype("int64")
+        return np.unique(keys, return_index=True, return_counts=True)
+
+    def _count(self, frame, positions, sign):
+        # Patients entering (or leaving) a cell and the payments of the batch
+        cells = frame.groupby(
+            ["cohort", "cohort_insurance", "referral", "offset"], sort=False
+        )["payment"].sum()
+        for key, payment in zip(cells.index.tolist(), cells.tolist()):
+            cell = self.cells.setdefault(key, [0, 0.0])
+            cell[1] += sign * payment
+        patients = (
+            frame.iloc[positions]
+            .groupby(["cohort", "cohort_insurance", "referral", "offset"], sort=False)
+            .size()
+        )
+        for key, count in zip(patients.index.tolist(), patients.tolist()):
+            self.cells.setdefault(key, [0, 0.0])[0] += sign * count
+
+    def add(self, rows):
+        """Count the appointments in `rows` (new or rewritten rows)."""
+        if self.stale or rows.empty:
+            return
+        frame = self._frame(rows)
+        if not self._join(frame.drop_duplicates("patient")):
+            self.stale = True
+            return
+        frame = self._rows(frame)
+        keys, first, counts = self._keys(frame)
+        slots = np.searchsorted(self.visits, keys)
+        known = slots < len(self.visits)
+        known[known] = self.visits[slots[known]] == keys[known]
+        # Keys whose appointments were all removed are kept with a zero count
+        entering = ~known
+        entering[known] = self.counts[slots[known]] == 0
+        self.counts[slots[known]] += counts[known]
+        self.visits = np.insert(self.visits, slots[~known], keys[~known])
+        self.counts = np.insert(self.counts, slots[~known], counts[~known])
+        self._count(frame, first[entering], 1)
+
+    def remove(self, rows):
+        """Stop counting the appointments in `rows`, as they were.
+
+        Removing an appointment of a patient's cohort month may be removing
+        the one that placed them there, so it marks the index `stale`.
+        """
+        if self.stale or rows.empty:
+            return
+        frame = self._frame(rows)
+        for patient_id, month in zip(
+            frame["patient"].tolist(), frame["month"].tolist()
+        ):
+            member = self.members.get(patient_id)
+            if member is None or member[1] == month:
+                self.stale = True
+                return
+        frame = self._rows(frame)
+        keys, first, counts = self._keys(frame)
+        slots = np.searchsorted(self.visits, keys)
+        if (slots >= len(self.visits)).any() or (self.visits[slots] != keys).any():
+            self.stale = True
+            return
+        self.counts[slots] -= counts
+        self._count(frame, first[self.counts[slots] == 0], -1)
+
+    def update(self, patient_id, date, old, new):
+        """Apply a Payment Status edit of an appointment of `patient_id`."""
+        member = self.members.get(patient_id)
+        if self.stale or member is None or pd.isna(date) or "Payment Status" not in new:
+            return
+        offset = month_codes(pd.Series([date]))[0] - member[1]
+        if offset < 0:
+            return
+        cell = self.cells.setdefault((*member[1:4], offset), [0, 0.0])
+        cell[1] += _payment(new["Payment Status"]) - _payment(old["Payment Status"])
+
+    def frame(self):
+        """Return the cells, one row per cohort segment and offset."""
+        index = pd.MultiIndex.from_tuples(
+            list(self.cells), names=["Cohort", *SEGMENTS, "Offset"]
+        )
+        return pd.DataFrame(
+            list(self.cells.values()), index=index, columns=["patients", "payment"]
+        )
+
+    def _curves(self, value, by, horizon, cumulative):
+        # Sum `value` per (row, cohort) and offset, then pool the cohorts of
+        # each row over the months they have been observed for
+        keys = ["Cohort"] if by is None else [by, "Cohort"]
+        totals = (
+            self.frame()[value]
+            .groupby(level=[*keys, "Offset"])
+            .sum()
+            .unstack("Offset", fill_value=0)
+        )
+        totals = totals.reindex(columns=range(totals.columns.max() + 1), fill_value=0)
+        if cumulative:
+            totals = totals.cumsum(axis=1)
+        sizes = (
+            pd.Series(
+                list(self.sizes.values()),
+                index=pd.MultiIndex.from_tuples(
+                    list(self.sizes), names=["Cohort", *SEGMENTS]
+                ),
+            )
+            .groupby(level=keys)
+            .sum()
+            .reindex(totals.index, fill_value=0)
+        )
+        cohorts = totals.index.get_level_values("Cohort").to_numpy()
+        observed = cohorts[:, None] + totals.columns.to_numpy()[None, :] <= horizon
+        numerators = totals.where(observed)
+        denominators = pd.DataFrame(
+            observed * sizes.to_numpy()[:, None],
+            index=totals.index,
+            columns=totals.columns,
+        )
+        if by is not None:
+            numerators = numerators.groupby(level=by).sum(min_count=1)
+            denominators = denominators.groupby(level=by).sum()
+        else:
+            numerators.index = numerators.index.map(month_label)
+            denominators.index = numerators.index
+        result = numerators / denominators.where(denominators > 0)
+        result.columns.name = "Meses"
+        return result
+
+    def retention(self, by=None, today=None):
+        """Retention matrix in percent: cohort (or `by` segment) x months.
+
+        Cell k is the share of the cohort's patients with an appointment k
+        months after their first one; months after `today` are left empty.
+        With `by` ("Insurance" or "Referral Source") the cohorts of each
+        segment are pooled over the months each has been observed for.
+        """
+        if not self.cells:
+            return pd.DataFrame()
+        return (self._curves("patients", by, _horizon(today), False) * 100).round(2)
+
+    def ltv_curves(self, by=None, today=None):
+        """Cumulative payments per patient, by cohort (or `by` segment) x months."""
+        if not self.cells:
+            return pd.DataFrame()
+        return self._curves("payment", by, _horizon(today), True).round(2)
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+# Writes collected on top of the sorted arrays before the store rebuilds them
+MAX_PENDING = 4096
+
+# Per-row values summed by `totals`, in storage order
+FIELDS = ["count", "attended", "insured", "payment"]
+
+DAY = pd.Timedelta(days=1)
+
+
+def _flag(value):
+    return 0 if pd.isna(value) else int(bool(value))
+
+
+def _payment(value):
+    return 0.0 if pd.isna(value) else float(value)
+
+
+def _day(value):
+    """Nanoseconds of midnight of `value` (a date, Timestamp or string)."""
+    return pd.Timestamp(value).normalize().value
+
+
+class DateIndex:
+    """Appointments sorted by Date, with prefix sums of the KPI counters.
+
+    `totals(start, stop)` and `labels(start, stop)` find the range with two
+    binary searches, so any date range costs O(log n) instead of a scan of
+    the Date column. Writes are not merged into the sorted arrays: they are
+    kept as a short list of pending contributions (plus added and removed
+    row labels) that queries apply on top, until `needs_rebuild` tells the
+    store to build a fresh index.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype="int64")
+        self.rows = np.empty(0, dtype="int64")
+        # prefix[field][i] is the sum of the first i rows in date order
+        self.prefix = {field: np.zeros(1) for field in FIELDS}
+        # (day, count, attended, insured, payment) applied on top of prefix
+        self.pending = []
+        # Labels appended since the build -> day, and labels removed from it
+        self.added = {}
+        self.removed = set()
+
+    @classmethod
+    def build(cls, appointments):
+        index = cls()
+        if appointments is None or appointments.empty:
+            return index
+        days = appointments["Date"].to_numpy("datetime64[ns]").view("int64")
+        valid = np.flatnonzero(days != np.iinfo("int64").min)
+        order = valid[np.argsort(days[valid], kind="stable")]
+        index.keys = days[order]
+        index.rows = appointments.index.to_numpy()[order]
+        values = {
+            "count": np.ones(len(order)),
+            "attended": appointments["Attended"].fillna(False).to_numpy(dtype=float),
+            # Any plan other than "Private" is billed to an insurer
+            "insured": (appointments["Insurance"] != "Private").to_numpy(dtype=float),
+            "payment": appointments["Payment Status"].fillna(0.0).to_numpy(float),
+        }
+        for field in FIELDS:
+            column = values[field] if field == "count" else values[field][order]
+            index.prefix[field] = np.concatenate([[0.0], np.cumsum(column)])
+        return index
+
+    def needs_rebuild(self):
+        return len(self.pending) > MAX_PENDING
+
+    def _bounds(self, start, stop):
+        # Dates are midnight timestamps, so [start, stop] ends before stop + 1
+        lo = np.searchsorted(self.keys, _day(start), side="left")
+        hi = np.searchsorted(self.keys, _day(stop) + DAY.value, side="left")
+        return lo, hi
+
+    def totals(self, start, stop):
+        """`FIELDS` summed over the appointments dated `start` to `stop`."""
+        lo, hi = self._bounds(start, stop)
+        totals = {
+            field: float(self.prefix[field][hi] - self.prefix[field][lo])
+            for field in FIELDS
+        }
+        first, last = _day(start), _day(stop)
+        for day, *values in self.pending:
+            if first <= day <= last:
+                for field, value in zip(FIELDS, values):
+                    totals[field] += value
+        return totals
+
+    def labels(self, start, stop):
+        """Row labels of the appointments dated `start` to `stop`, by date."""
+        lo, hi = self._bounds(start, stop)
+        rows, days = self.rows[lo:hi], self.keys[lo:hi]
+        if self.removed:
+            kept = ~np.isin(rows, list(self.removed))
+            rows, days = rows[kept], days[kept]
+        first, last = _day(start), _day(stop)
+        added = sorted(
+            (day, label) for label, day in self.added.items() if first <= day <= last
+        )
+        if added:
+            # Each added row goes after the built rows of its day
+            positions = np.searchsorted(days, [day for day, _ in added], side="right")
+            rows = np.insert(rows, positions, [label for _, label in added])
+        return rows
+
+    def _contributions(self, rows, sign):
+        days = rows["Date"].to_numpy("datetime64[ns]").view("int64")
+        for label, day, attended, insurance, payment in zip(
+            rows.index.tolist(),
+            days.tolist(),
+            rows["Attended"].tolist(),
+            rows["Insurance"].tolist(),
+            rows["Payment Status"].tolist(),
+        ):
+            if day == np.iinfo("int64").min:
+                continue
+            self.pending.append(
+                (
+                    day,
+                    sign,
+                    sign * _flag(attended),
+                    sign * int(insurance != "Private"),
+                    sign * _payment(payment),
+                )
+            )
+            yield label, day
+
+    def add(self, rows):
+        """Count the appointments in `rows` (new or rewritten rows)."""
+        for label, day in self._contributions(rows, 1):
+            self.added[label] = day
+
+    def remove(self, rows):
+        """Stop counting the appointments in `rows`, as they were."""
+        for label, _ in self._contributions(rows, -1):
+            if self.added.pop(label, None) is None:
+                self.removed.add(label)
+
+    def update(self, date, old, new):
+        """Apply an Attended/Payment Status edit of an appointment on `date`."""
+        if pd.isna(date):
+            return
+        attended = payment = 0
+        if "Attended" in new:
+            attended = _flag(new["Attended"]) - _flag(old["Attended"])
+        if "Payment Status" in new:
+            payment = _payment(new["Payment Status"]) - _payment(old["Payment Status"])
+        if attended or payment:
+            self.pending.append((_day(date), 0, attended, 0, payment))
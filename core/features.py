@@ -0,0 +1,23 @@
+import pandas as pd
+
+
+def appointment_features(appointments):
+    """Derived appointment columns used by the KPI computations.
+
+    Returns a new DataFrame aligned with `appointments` (same index) holding
+    Year, Month and Is Insurance; the appointments table is never modified.
+    """
+    dates = appointments["Date"].dt
+    return pd.DataFrame(
+        {
+            "Year": dates.year,
+            "Month": dates.month,
+            # Any plan other than "Private" is billed to an insurer
+            "Is Insurance": (appointments["Insurance"] != "Private").to_numpy(),
+        },
+        index=appointments.index,
+    )
+
+
+# Table -> function deriving its feature columns
+FEATURES = {"appointments": appointment_features}
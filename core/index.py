@@ -0,0 +1,50 @@
+class DataIndex:
+    """Hash lookups over the shared tables, kept in step with every write.
+
+    - `patient_rows`: Patient ID -> row label in the patients table
+    - `appointment_rows`: Appointment ID -> row label in the appointments table
+    - `appointment_counts`: Patient ID -> number of appointments
+    """
+
+    def __init__(self):
+        self.patient_rows = {}
+        self.appointment_rows = {}
+        self.appointment_counts = {}
+
+    @classmethod
+    def build(cls, patients, appointments):
+        index = cls()
+        if patients is not None and not patients.empty:
+            index.add_patients(patients)
+        if appointments is not None and not appointments.empty:
+            index.add_appointments(appointments)
+        return index
+
+    def add_patients(self, rows):
+        self.patient_rows.update(zip(rows["Patient ID"].tolist(), rows.index.tolist()))
+
+    def remove_patients(self, rows):
+        for patient_id in rows["Patient ID"].tolist():
+            self.patient_rows.pop(patient_id, None)
+
+    def add_appointments(self, rows):
+        self.appointment_rows.update(
+            zip(rows["Appointment ID"].tolist(), rows.index.tolist())
+        )
+        # One grouped count per batch, then a dict merge per patient
+        counts = rows["Patient ID"].value_counts(sort=False)
+        for patient_id, count in zip(counts.index.tolist(), counts.tolist()):
+            self.appointment_counts[patient_id] = (
+                self.appointment_counts.get(patient_id, 0) + count
+            )
+
+    def remove_appointments(self, rows):
+        for appointment_id, patient_id in zip(
+            rows["Appointment ID"].tolist(), rows["Patient ID"].tolist()
+        ):
+            self.appointment_rows.pop(appointment_id, None)
+            if patient_id in self.appointment_counts:
+                self.appointment_counts[patient_id] -= 1
+
+    def appointment_count(self, patient_id):
+        return self.appointment_counts.get(patient_id, 0)
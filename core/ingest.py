@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from core.schema import normalize_records
+from core.table import AppendableTable
+
+# Rows requested per page and pages downloaded at the same time
+PAGE_SIZE = 5000
+CONCURRENCY = 4
+
+
+def fetch_pages(
+    client,
+    endpoint,
+    page_size=PAGE_SIZE,
+    concurrency=CONCURRENCY,
+    params=None,
+    digest=None,
+):
+    """Yield the pages of `endpoint` in order, as lists of records.
+
+    Pages are requested with `offset`/`limit` query parameters. The first
+    page is requested on its own: unless it holds exactly `page_size`
+    records, the feed ends there (a longer one means the webhook ignores
+    paging and sent everything, so asking `concurrency` times would download
+    the whole table that many times). After that, at most `concurrency`
+    pages are requested at a time; the next one is only requested once the
+    oldest has been handed out, so no more than `concurrency` raw pages are
+    held in memory. A page that is not exactly `page_size` long ends the
+    feed, and so does a second page identical to the first (a table of
+    exactly `page_size` rows from a webhook that ignores paging).
+
+    When given a hashlib object as `digest`, the raw body of every page handed
+    out is fed to it in page order.
+    """
+    params = dict(params or {})
+
+    def get(page):
+        response = client.request(
+            "GET",
+            endpoint,
+            params={**params, "offset": page * page_size, "limit": page_size},
+        )
+        response.raise_for_status()
+        return response
+
+    def read(response):
+        if digest is not None:
+            digest.update(response.content)
+        return response.json()
+
+    first = get(0)
+    records = read(first)
+    if records:
+        yield records
+    if not records or len(records) != page_size:
+        return
+    with ThreadPoolExecutor(concurrency) as pool:
+        window = [pool.submit(get, page) for page in range(1, concurrency + 1)]
+        page = concurrency + 1
+        while window:
+            response = window.pop(0).result()
+            # A second page identical to the first: paging is ignored after all
+            if first is not None and response.content == first.content:
+                response = None
+            first = None
+            records = read(response) if response is not None else None
+            if not records or len(records) != page_size:
+                for future in window:
+                    future.cancel()
+                if records:
+                    yield records
+                return
+            window.append(pool.submit(get, page))
+            page += 1
+            yield records
+
+
+def load_table(pages, schema, compact=False):
+    """Normalize each page as it arrives and append it to a new table.
+
+    Only one page of raw records is converted at a time, and the columnar
+    result goes straight into an `AppendableTable`, so the full JSON body and
+    the full list of dicts never exist at once. The store only gets the
+    table once the last page is in; what makes the first screen usable early
+    is the staged load (`Repository.load_day`), not the paging.
+    """
+    table = AppendableTable(normalize_records([], schema, compact))
+    for records in pages:
+        table.append(normalize_records(records, schema, compact))
+    return table
@@ -0,0 +1,98 @@
+import pandas as pd
+
+# Output column for each period-level KPI, in display order
+KPI_COLUMNS = [
+    "Ticket Médio",
+    "Taxa de Conversão",
+    "Percentual de Convênios",
+    "Taxa de Faltas",
+]
+
+PERIOD_KEYS = {"annual": ["Year"], "monthly": ["Year", "Month"]}
+
+
+def calculate_period_kpis(df, period="annual"):
+    """Calculate every period-level KPI in a single grouped pass.
+
+    Returns one row per period (Year, or Year and Month) with the average
+    ticket, conversion rate, insurance percentage and no-show rate.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=KPI_COLUMNS)
+    keys = PERIOD_KEYS[period]
+    means = (
+        pd.DataFrame(
+            {
+                **{key: df[key] for key in keys},
+                "Payment Status": df["Payment Status"].astype(float),
+                "Attended": df["Attended"].astype(float),
+                "Is Insurance": df["Is Insurance"].astype(float),
+            }
+        )
+        .groupby(keys)
+        .mean()
+    )
+    return pd.DataFrame(
+        {
+            "Ticket Médio": means["Payment Status"].round(2),
+            "Taxa de Conversão": (means["Attended"] * 100).round(2),
+            "Percentual de Convênios": (means["Is Insurance"] * 100).round(2),
+            # No-show is the complement of conversion; no second groupby
+            "Taxa de Faltas": ((1 - means["Attended"]) * 100).round(2),
+        }
+    )
+
+
+def kpis_from_totals(totals):
+    """Period KPIs from per-period totals.
+
+    `totals` is indexed by period and has `count`, `attended`, `insured`
+    (appointments not billed as "Private") and `payment` columns, as
+    produced by the monthly rollup or a SQL GROUP BY. The result matches
+    `calculate_period_kpis`.
+    """
+    totals = totals[totals["count"] > 0]
+    conversion = totals["attended"] / totals["count"]
+    return pd.DataFrame(
+        {
+            "Ticket Médio": (totals["payment"] / totals["count"]).round(2),
+            "Taxa de Conversão": (conversion * 100).round(2),
+            "Percentual de Convênios": (
+                totals["insured"] / totals["count"] * 100
+            ).round(2),
+            "Taxa de Faltas": ((1 - conversion) * 100).round(2),
+        }
+    )
+
+
+def calculate_range_kpis(totals, start, stop):
+    """Period KPIs of one date range, from its summed `totals`.
+
+    `totals` maps `count`, `attended`, `insured` and `payment` to their sums
+    over the appointments dated `start` to `stop`; the single result row is
+    labelled with the range, and an empty range gives an empty frame.
+    """
+    if not totals["count"]:
+        return pd.DataFrame(columns=KPI_COLUMNS)
+    label = f"{start:%d/%m/%Y} – {stop:%d/%m/%Y}"
+    return kpis_from_totals(pd.DataFrame([totals], index=[label]))
+
+
+def calculate_ltv(df):
+    """Calculate the Lifetime Value (average total payment per patient)."""
+    if df.empty:
+        return 0
+    total_per_patient = df.groupby("Patient ID")["Payment Status"].sum()
+    return total_per_patient.mean().round(2)
+
+
+def calculate_retention_rate(df):
+    """Calculate the retention rate (percentage of patients with more than one appointment)."""
+    if df.empty:
+        return 0
+    appointments_per_patient = df.groupby("Patient ID").size()
+    retained_patients = (appointments_per_patient > 1).sum()
+    total_patients = len(appointments_per_patient)
+    return (
+        (retained_patients / total_patients * 100).round(2) if total_patients > 0 else 0
+    )
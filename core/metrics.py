@@ -0,0 +1,171 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+import pandas as pd
+import streamlit as st
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket holds
+# everything slower
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+REPORT_COLUMNS = [
+    "Kind",
+    "Name",
+    "Calls",
+    "Errors",
+    "Mean (ms)",
+    "p50 (ms)",
+    "p95 (ms)",
+    "Max (ms)",
+]
+
+# Returned by `Metrics.timer` while disabled, so a timed block costs one call
+_DISABLED = nullcontext()
+
+
+class Histogram:
+    """Call count, errors, total and max time, and counts per latency bucket."""
+
+    __slots__ = ("counts", "calls", "errors", "total", "slowest")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    def add(self, seconds, failed=False):
+        self.counts[bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+        self.calls += 1
+        self.errors += int(failed)
+        self.total += seconds
+        self.slowest = max(self.slowest, seconds)
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.counts = list(self.counts)
+        histogram.calls, histogram.errors = self.calls, self.errors
+        histogram.total, histogram.slowest = self.total, self.slowest
+        return histogram
+
+    def quantile(self, q):
+        """Upper bound (ms) of the bucket holding the `q` quantile."""
+        if not self.calls:
+            return 0.0
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= q * self.calls:
+                return float(min(bound, self.slowest * 1000))
+        return self.slowest * 1000
+
+    def summary(self):
+        return {
+            "Calls": self.calls,
+            "Errors": self.errors,
+            "Mean (ms)": round(self.total / self.calls * 1000, 1) if self.calls else 0,
+            "p50 (ms)": round(self.quantile(0.5), 1),
+            "p95 (ms)": round(self.quantile(0.95), 1),
+            "Max (ms)": round(self.slowest * 1000, 1),
+        }
+
+    def buckets(self):
+        """Calls per bucket, labelled by the bucket's upper bound."""
+        labels = [f"≤{bound} ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]} ms"]
+        return dict(zip(labels, self.counts))
+
+
+class _Timer:
+    __slots__ = ("metrics", "kind", "name", "start")
+
+    def __init__(self, metrics, kind, name):
+        self.metrics = metrics
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        # Also recorded when st.rerun()/st.stop() end the block early
+        self.metrics.record(self.kind, self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Process-wide timings of page runs and page sections.
+
+    Pages wrap the work they want measured in `timer(kind, name)`; every
+    (kind, name) pair keeps a `Histogram`, so memory stays constant however
+    long the process runs. While `enabled` is False the timers are a shared
+    no-op context manager and nothing is recorded.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.since = time.time()
+        # (kind, name) -> Histogram
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def timer(self, kind, name):
+        if not self.enabled:
+            return _DISABLED
+        return _Timer(self, kind, name)
+
+    def section(self, name):
+        """Time a block of a page."""
+        return self.timer("section", name)
+
+    def record(self, kind, name, seconds, failed=False):
+        with self._lock:
+            histogram = self.series.get((kind, name))
+            if histogram is None:
+                histogram = self.series[(kind, name)] = Histogram()
+            histogram.add(seconds, failed)
+
+    def histograms(self):
+        """A copy of every histogram, keyed by (kind, name)."""
+        with self._lock:
+            return {key: histogram.copy() for key, histogram in self.series.items()}
+
+    def reset(self):
+        with self._lock:
+            self.series = {}
+            self.since = time.time()
+
+    def report(self, extra=None):
+        """One row per (kind, name); `extra` adds {(kind, name): Histogram}."""
+        series = {**self.histograms(), **(extra or {})}
+        rows = [
+            {"Kind": kind, "Name": name, **histogram.summary()}
+            for (kind, name), histogram in sorted(series.items())
+        ]
+        return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+    def export(self, extra=None):
+        """Everything recorded, as a JSON-serializable dict."""
+        series = {**self.histograms(), **(extra or {})}
+        return {
+            "since": self.since,
+            "exported_at": time.time(),
+            "enabled": self.enabled,
+            "series": [
+                {
+                    "kind": kind,
+                    "name": name,
+                    **histogram.summary(),
+                    "buckets": histogram.buckets(),
+                }
+                for (kind, name), histogram in sorted(series.items())
+            ],
+        }
+
+
+@st.cache_resource
+def get_metrics():
+    return Metrics(st.secrets.get("metrics", {}).get("enabled", False))
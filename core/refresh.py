@@ -0,0 +1,75 @@
+import threading
+
+import streamlit as st
+
+from core.cache import get_store
+from core.repository import get_repository
+
+# Seconds between polls. Backends without delta syncs or conditional GETs
+# download every table on each poll, so the default matches the store's TTL
+DEFAULT_INTERVAL = 300
+# Longest interval the Settings slider offers
+MAX_INTERVAL = 1800
+
+
+def loaders(repository):
+    """The `(loader, delta_loader)` pair `DataStore.ensure_loaded` expects."""
+    # Only for backends that filter by watermark: a feed that ignores it
+    # would send the whole table as the "delta" on every refresh
+    delta_loader = repository.load_delta if repository.supports_delta else None
+    return repository.load, delta_loader
+
+
+class Refresher:
+    """One thread per process that keeps the shared tables up to date.
+
+    Every `interval` seconds it reloads the store through the repository:
+    a delta fetch on backends that support it, otherwise conditional GETs
+    that skip tables the server reports (or hashes) as unchanged. The store
+    only bumps its version when something changed, and every session picks
+    the new version up on its next rerun, so one poll serves all of them.
+    """
+
+    def __init__(self, store, loader, delta_loader=None, interval=DEFAULT_INTERVAL):
+        self.store = store
+        self.loader = loader
+        self.delta_loader = delta_loader
+        self.interval = interval
+        self.last_error = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def set_interval(self, seconds):
+        """Change the poll interval; the next poll waits for the new value."""
+        self.interval = seconds
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            if self._wake.wait(self.interval or None):
+                # Woken by a new interval: start waiting again from now
+                self._wake.clear()
+                continue
+            if self.store.loaded_at is None:
+                # Not loaded yet, or invalidated: the next session loads it
+                continue
+            try:
+                self.store.ensure_loaded(self.loader, self.delta_loader, force=True)
+                self.last_error = None
+            except Exception as error:
+                # Keep serving the current tables; try again next interval
+                self.last_error = error
+                print("Background refresh failed:", error)
+
+
+@st.cache_resource
+def get_refresher():
+    interval = st.secrets.get("cache", {}).get("refresh_interval", DEFAULT_INTERVAL)
+    loader, delta_loader = loaders(get_repository())
+    return Refresher(get_store(), loader, delta_loader, interval).start()
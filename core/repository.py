@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+
+import requests
+import streamlit as st
+
+from core.cache import get_store
+from core.client import get_client
+from core.ingest import CONCURRENCY, fetch_pages, load_table
+from core.kpis import calculate_ltv, calculate_retention_rate
+from core.schema import APPOINTMENTS, DATE_FORMAT, PATIENTS, normalize_records
+from core.sync import delta_params
+
+# Writes, named after the n8n webhooks that first implemented them
+ACTIONS = (
+    "post_patient_url",
+    "post_appointment_url",
+    "post_attended_url",
+    "post_canceled_url",
+    "post_payment_url",
+)
+
+
+class RepositoryError(Exception):
+    """A backend could not store a write."""
+
+
+class Repository:
+    """Where the clinic's patients and appointments are stored.
+
+    Pages, the shared store and the write-behind queue only talk to this
+    interface. `load` returns the tables kept in memory, `call` performs one
+    of `ACTIONS` and returns the stored row as a dict. The query methods
+    below are answered from the shared in-memory tables; database backends
+    override them to run the query where the data lives (pushdown).
+    """
+
+    # True when `load_delta` only returns rows changed since a watermark
+    supports_delta = False
+    # True when `call_batch` sends several writes in one round trip
+    batches = False
+
+    def __init__(self, store, compact=False):
+        self.store = store
+        self.compact = compact
+
+    def load(self, changed_only=False):
+        """Return the `(patients, appointments)` tables to keep in memory.
+
+        With `changed_only`, a table known to be unchanged since the previous
+        load may be returned as None.
+        """
+        raise NotImplementedError
+
+    def load_delta(self, watermarks):
+        """Return the rows changed after `watermarks`, or None per table."""
+        raise NotImplementedError
+
+    def load_day(self, day):
+        """Return `(patients, appointments)` of the appointments dated `day`.
+
+        Only the patients those appointments reference are included. This is
+        the first stage of a staged load (see `DataStore.ensure_loaded`);
+        backends that cannot filter return None and everything is loaded at
+        once.
+        """
+        return None
+
+    def call(self, action, payload):
+        """Perform `action` with `payload`; return the stored row (or None)."""
+        raise NotImplementedError
+
+    def call_batch(self, calls):
+        """Perform `(action, payload)` calls in order; return their rows."""
+        return [self.call(action, payload) for action, payload in calls]
+
+    def period_kpis(self, period):
+        return self.store.period_kpis(period)
+
+    def range_kpis(self, start, stop):
+        """Period KPIs of the appointments dated `start` to `stop`."""
+        return self.store.range_kpis(start, stop)
+
+    def cohort_retention(self, by=None):
+        """Retention matrix by first-appointment month (or `by` segment)."""
+        return self.store.cohort_retention(by)
+
+    def cohort_ltv(self, by=None):
+        """Cumulative LTV per patient by first-appointment month (or `by`)."""
+        return self.store.cohort_ltv(by)
+
+    def lifetime_value(self):
+        return calculate_ltv(self.store.appointments)
+
+    def retention_rate(self):
+        return calculate_retention_rate(self.store.appointments)
+
+    def appointments_between(self, start, stop):
+        """Appointments dated from `start` to `stop` (inclusive)."""
+        return self.store.appointments_between(start, stop)
+
+    def appointment_count(self, patient_id):
+        return self.store.index.appointment_count(patient_id)
+
+
+class N8nRepository(Repository):
+    """The n8n webhooks: every table is downloaded and queried in memory."""
+
+    # The registration webhooks read form fields, the others a JSON body
+    FORM_ACTIONS = ("post_patient_url", "post_appointment_url")
+    BATCH_ENDPOINT = "post_batch_url"
+
+    def __init__(self, store, client, options, compact=False):
+        super().__init__(store, compact)
+        self.client = client
+        self.options = options
+        self.supports_delta = options.get("delta_sync", False)
+        self.batches = self.BATCH_ENDPOINT in client.urls
+        # endpoint -> (query, hash of the pages) of its last paged download
+        self.page_digests = {}
+
+    def load(self, changed_only=False):
+        return asyncio.run(self._fetch_tables(changed_only=changed_only))
+
+    def load_delta(self, watermarks):
+        patients, appointments = asyncio.run(
+            self._fetch_tables(
+                delta_params(watermarks["patients"]),
+                delta_params(watermarks["appointments"]),
+            )
+        )
+        # Empty deltas stay None so the store can skip them without work
+        return tuple(
+            _frame(table) if len(table) else None for table in (patients, appointments)
+        )
+
+    def load_day(self, day):
+        # Only when the webhooks honour the "date" and "patient_ids" filters
+        if not self.options.get("day_filter", False):
+            return None
+        appointments = _frame(
+            asyncio.run(
+                self._fetch_table(
+                    "appointments_url",
+                    APPOINTMENTS,
+                    {"date": day.strftime(DATE_FORMAT)},
+                )
+            )
+        )
+        ids = appointments["Patient ID"].dropna().unique().tolist()
+        if not ids:
+            return normalize_records([], PATIENTS, self.compact), appointments
+        patients = _frame(
+            asyncio.run(
+                self._fetch_table(
+                    "patients_url", PATIENTS, {"patient_ids": ",".join(map(str, ids))}
+                )
+            )
+        )
+        return patients, appointments
+
+    async def _fetch_tables(
+        self, patients_params=None, appointments_params=None, changed_only=False
+    ):
+        # Fetch patients and appointments concurrently
+        patients, appointments = await asyncio.gather(
+            self._fetch_table("patients_url", PATIENTS, patients_params, changed_only),
+            self._fetch_table(
+                "appointments_url", APPOINTMENTS, appointments_params, changed_only
+            ),
+        )
+        if patients is not None:
+            print("Patients data initialized:", len(patients), "rows")
+        if appointments is not None:
+            print("Appointments data initialized:", len(appointments), "rows")
+        return patients, appointments
+
+    # Download one table. With n8n.page_size set, the feed is read in pages that
+    # are normalized and appended as they arrive, keeping peak memory bounded.
+    # With `changed_only`, a feed that answers "not modified" (or sends the same
+    # body as last time) is skipped and returned as None. Paged feeds are
+    # compared by a hash of all their pages, so they are still downloaded and
+    # normalized, but an unchanged one is not installed again.
+    async def _fetch_table(self, endpoint, schema, params=None, changed_only=False):
+        page_size = self.options.get("page_size")
+        if not page_size:
+            data = await asyncio.to_thread(
+                self.client.get, endpoint, params, changed_only
+            )
+            if data is None:
+                return None
+            return normalize_records(data, schema, self.compact)
+        digest = hashlib.blake2b(digest_size=16)
+        pages = fetch_pages(
+            self.client,
+            endpoint,
+            page_size,
+            self.options.get("page_concurrency", CONCURRENCY),
+            params,
+            digest,
+        )
+        table = await asyncio.to_thread(load_table, pages, schema, self.compact)
+        query = tuple(sorted((params or {}).items()))
+        previous = self.page_digests.get(endpoint)
+        self.page_digests[endpoint] = (query, digest.digest())
+        if changed_only and previous == self.page_digests[endpoint]:
+            return None
+        return table
+
+    def call(self, action, payload):
+        body = "data" if action in self.FORM_ACTIONS else "json"
+        return self._post(action, **{body: payload})
+
+    def call_batch(self, calls):
+        if not self.batches or len(calls) < 2:
+            return super().call_batch(calls)
+        # Each item names the single-row webhook it replaces ("payment", ...)
+        records = self._post(
+            self.BATCH_ENDPOINT,
+            json=[{"action": _action(action), **payload} for action, payload in calls],
+        )
+        if not isinstance(records, list) or len(records) != len(calls):
+            return [None] * len(calls)
+        return records
+
+    def _post(self, endpoint, **kwargs):
+        try:
+            response = self.client.post(endpoint, **kwargs)
+            response.raise_for_status()
+        except requests.RequestException as error:
+            raise RepositoryError(str(error)) from error
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+
+def _frame(table):
+    # Streamed loads arrive as an AppendableTable
+    return getattr(table, "frame", table)
+
+
+def _action(endpoint):
+    # "post_payment_url" -> "payment"
+    return endpoint.removeprefix("post_").removesuffix("_url")
+
+
+@st.cache_resource
+def get_repository():
+    options = st.secrets.get("storage", {})
+    backend = options.get("backend", "n8n")
+    compact = st.secrets.get("cache", {}).get("compact", False)
+    store = get_store()
+    # Database backends are imported on demand; their drivers are optional
+    if backend == "sqlite":
+        from core.sqlite_repository import SqliteRepository
+
+        return SqliteRepository(
+            store,
+            options.get("path", "clinic.db"),
+            options.get("history_days"),
+            compact,
+        )
+    if backend == "supabase":
+        from core.supabase_repository import SupabaseRepository
+
+        return SupabaseRepository(
+            store,
+            options["url"],
+            options["key"],
+            options.get("history_days"),
+            compact,
+            options.get("page_size"),
+        )
+    return N8nRepository(store, get_client(), st.secrets["n8n"], compact)
@@ -0,0 +1,94 @@
+import pandas as pd
+
+from core.features import appointment_features
+from core.kpis import KPI_COLUMNS, PERIOD_KEYS, kpis_from_totals
+
+# Per-cell counters, in storage order
+FIELDS = ["count", "attended", "canceled", "payment"]
+
+
+def _flag(value):
+    return 0 if pd.isna(value) else int(bool(value))
+
+
+def _payment(value):
+    return 0.0 if pd.isna(value) else float(value)
+
+
+class MonthlyRollup:
+    """Appointment totals per (Year, Month, Insurance), kept up to date on writes.
+
+    Each cell holds `[count, attended, canceled, payment]`. Registrations add
+    a row, attendance/cancel/payment edits apply the difference between the
+    old and new values, so the KPIs are computed from O(months) cells instead
+    of the full appointments table.
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    @classmethod
+    def build(cls, appointments):
+        rollup = cls()
+        if appointments is not None and not appointments.empty:
+            rollup.add(appointments)
+        return rollup
+
+    def add(self, rows, sign=1):
+        """Add the appointments in `rows` (or subtract them with `sign=-1`)."""
+        if rows.empty:
+            return
+        features = appointment_features(rows)
+        grouped = (
+            pd.DataFrame(
+                {
+                    "Year": features["Year"].to_numpy(),
+                    "Month": features["Month"].to_numpy(),
+                    "Insurance": rows["Insurance"].astype(str).to_numpy(),
+                    "count": 1,
+                    "attended": rows["Attended"].fillna(False).to_numpy(dtype=int),
+                    "canceled": rows["Canceled"].fillna(False).to_numpy(dtype=int),
+                    "payment": rows["Payment Status"].fillna(0.0).to_numpy(dtype=float),
+                }
+            )
+            .groupby(["Year", "Month", "Insurance"], sort=False)[FIELDS]
+            .sum()
+        )
+        for key, values in zip(grouped.index.tolist(), grouped.to_numpy().tolist()):
+            cell = self.cells.setdefault(key, [0, 0, 0, 0.0])
+            for position, value in enumerate(values):
+                cell[position] += sign * value
+
+    def remove(self, rows):
+        self.add(rows, sign=-1)
+
+    def update(self, date, insurance, old, new):
+        """Apply an Attended/Canceled/Payment Status edit to one appointment."""
+        date = pd.Timestamp(date)
+        cell = self.cells.get((date.year, date.month, str(insurance)))
+        if cell is None:
+            return
+        if "Attended" in new:
+            cell[1] += _flag(new["Attended"]) - _flag(old["Attended"])
+        if "Canceled" in new:
+            cell[2] += _flag(new["Canceled"]) - _flag(old["Canceled"])
+        if "Payment Status" in new:
+            cell[3] += _payment(new["Payment Status"]) - _payment(old["Payment Status"])
+
+    def frame(self):
+        """Return the cells as a DataFrame indexed by Year, Month and Insurance."""
+        index = pd.MultiIndex.from_tuples(
+            list(self.cells), names=["Year", "Month", "Insurance"]
+        )
+        return pd.DataFrame(list(self.cells.values()), index=index, columns=FIELDS)
+
+    def period_kpis(self, period="annual"):
+        """Same output as `calculate_period_kpis`, computed from the cells."""
+        if not self.cells:
+            return pd.DataFrame(columns=KPI_COLUMNS)
+        cells = self.frame().reset_index()
+        cells["insured"] = cells["count"].where(cells["Insurance"] != "Private", 0)
+        totals = cells.groupby(PERIOD_KEYS[period])[
+            ["count", "attended", "insured", "payment"]
+        ].sum()
+        return kpis_from_totals(totals)
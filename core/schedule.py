@@ -0,0 +1,301 @@
+import fcntl
+import json
+import os
+import threading
+import time as clock
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from datetime import date as Date
+from datetime import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Length of an appointment and opening hours, unless set in
+# st.secrets["schedule"]
+SLOT_MINUTES = 30
+OPENING = "08:00"
+CLOSING = "18:00"
+
+# Files, in the store's lock directory, holding the last allocated
+# Appointment ID and the slots being registered, for every process on the host
+ID_FILE = "appointment_id"
+HOLDS_FILE = "slot_holds.json"
+
+# Seconds a slot stays held while it is registered, in case the process dies
+# before releasing it, and after it is booked, so processes that have not
+# loaded the new appointment yet still see the slot as taken
+HOLD_SECONDS = 120
+BOOKED_SECONDS = 900
+
+
+def day_numbers(dates):
+    """Days since 1970-01-01 of a datetime Series (or a single date)."""
+    if not isinstance(dates, pd.Series):
+        return int(np.datetime64(pd.Timestamp(dates).date(), "D").astype("int64"))
+    return dates.to_numpy("datetime64[D]").astype("int64")
+
+
+def minutes(times):
+    """Minutes after midnight of a Time Series (or a single time)."""
+    if not isinstance(times, pd.Series):
+        return times.hour * 60 + times.minute
+    if not pd.api.types.is_timedelta64_dtype(times):
+        times = pd.to_timedelta(times.astype("string"), errors="coerce")
+    return (times.dt.total_seconds() // 60).to_numpy()
+
+
+def schedule_options():
+    """`(opening, closing, slot minutes)` of the clinic's working day."""
+    options = st.secrets.get("schedule", {})
+    return (
+        time.fromisoformat(options.get("opening", OPENING)),
+        time.fromisoformat(options.get("closing", CLOSING)),
+        int(options.get("slot_minutes", SLOT_MINUTES)),
+    )
+
+
+class ScheduleIndex:
+    """Booked appointment start times from `since` on, sorted per day.
+
+    Each day with bookings holds a sorted list of `(minute, label)` pairs,
+    where `minute` is the start time in minutes after midnight and `label`
+    the appointment's row label. Finding a day is a dict lookup and an
+    overlap check is one binary search in that day's list. Only days from
+    `since` (today, by default) are kept, as only those are booked, so the
+    index holds the upcoming appointments rather than the whole history.
+    Canceled appointments do not take a slot.
+    """
+
+    def __init__(self, since=None):
+        # First day kept, in days since 1970-01-01
+        self.since = day_numbers(since or Date.today())
+        # day -> sorted [(minute, label)]
+        self.days = {}
+        # label -> (day, minute) of every booked appointment
+        self.booked = {}
+
+    @classmethod
+    def build(cls, appointments, since=None):
+        index = cls(since)
+        if appointments is not None and not appointments.empty:
+            index.add(appointments)
+        return index
+
+    def add(self, rows):
+        """Book the appointments in `rows` that are not canceled."""
+        days = day_numbers(rows["Date"])
+        starts = minutes(rows["Time"])
+        active = ~rows["Canceled"].fillna(False).to_numpy(bool)
+        active &= rows["Date"].notna().to_numpy() & ~np.isnan(starts)
+        active &= days >= self.since
+        for label, day, minute in zip(
+            rows.index[active].tolist(),
+            days[active].tolist(),
+            starts[active].astype(int).tolist(),
+        ):
+            self._book(label, day, minute)
+
+    def _book(self, label, day, minute):
+        if label in self.booked:
+            self._free(label)
+        if day < self.since:
+            return
+        insort(self.days.setdefault(day, []), (minute, label))
+        self.booked[label] = (day, minute)
+
+    def _free(self, label):
+        place = self.booked.pop(label, None)
+        if place is None:
+            return
+        day, minute = place
+        slots = self.days[day]
+        del slots[bisect_left(slots, (minute, label))]
+        if not slots:
+            del self.days[day]
+
+    def remove(self, rows):
+        """Free the slots of the appointments in `rows`."""
+        for label in rows.index.tolist():
+            self._free(label)
+
+    def update(self, label, date, start, new):
+        """Apply a Canceled edit to the appointment at `label`."""
+        if "Canceled" not in new:
+            return
+        if _flag(new["Canceled"]):
+            self._free(label)
+        elif not pd.isna(date) and not pd.isna(start):
+            self._book(label, day_numbers(date), minutes(_as_time(start)))
+
+    def conflicts(self, date, start, duration=SLOT_MINUTES):
+        """Labels of the appointments overlapping `duration` minutes from `start`."""
+        day, minute = day_numbers(date), minutes(start)
+        slots = self.days.get(day, [])
+        # Bookings starting less than `duration` minutes before `minute`, up
+        # to the ones starting before the end of the new appointment
+        first = bisect_left(slots, (minute - duration + 1,))
+        last = bisect_left(slots, (minute + duration,))
+        return [label for _, label in slots[first:last]]
+
+    def is_free(self, date, start, duration=SLOT_MINUTES):
+        return not self.conflicts(date, start, duration)
+
+    def free_slots(self, date, opening, closing, duration=SLOT_MINUTES, held=()):
+        """Start times of the free `duration`-minute slots between the hours.
+
+        `held` lists `(minute, duration)` of slots held on the day (see
+        `SlotHolds`), which are not free either.
+        """
+        day = day_numbers(date)
+        slots = self.days.get(day, [])
+        free = []
+        for minute in range(
+            minutes(opening), minutes(closing) - duration + 1, duration
+        ):
+            first = bisect_left(slots, (minute - duration + 1,))
+            taken = first < len(slots) and slots[first][0] < minute + duration
+            if not taken and not _overlaps(minute, duration, held):
+                free.append(time(minute // 60, minute % 60))
+        return free
+
+
+def _overlaps(minute, duration, held):
+    return any(
+        other < minute + duration and minute < other + length for other, length in held
+    )
+
+
+@contextmanager
+def _exclusive(path):
+    """Open `path` (created if missing) under an exclusive `flock`."""
+    with open(path, "a+") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        file.seek(0)
+        yield file
+
+
+def _rewrite(file, text):
+    file.seek(0)
+    file.truncate()
+    file.write(text)
+    file.flush()
+    os.fsync(file.fileno())
+
+
+class SlotHolds:
+    """Slots being registered, so two sessions cannot book the same one.
+
+    A slot is held (`hold`) before its webhook call and released when the
+    call fails, or kept for `BOOKED_SECONDS` once it is booked, until every
+    process has loaded the new appointment. Holds expire on their own, so a
+    process that dies mid-call does not keep its slot. With `path`, holds
+    live in that JSON file under an exclusive `flock` and every server
+    process on the host sees them; otherwise only this process does.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        # "day:minute" -> [duration, expires at (epoch seconds)]
+        self.held = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _holds(self):
+        # The live holds, written back (when changed) on exit
+        with self._lock:
+            if self.path is None:
+                yield self.held
+                return
+            with _exclusive(self.path) as file:
+                text = file.read()
+                try:
+                    held = json.loads(text) if text else {}
+                except ValueError:
+                    held = {}
+                yield held
+                updated = json.dumps(held, sort_keys=True)
+                if updated != text:
+                    _rewrite(file, updated)
+
+    @staticmethod
+    def _live(held, day):
+        # Drop the expired holds; `(minute, duration)` of those left on `day`
+        now = clock.time()
+        for slot in [slot for slot, (_, expires) in held.items() if expires <= now]:
+            del held[slot]
+        prefix = f"{day}:"
+        return [
+            (int(slot[len(prefix) :]), duration)
+            for slot, (duration, _) in held.items()
+            if slot.startswith(prefix)
+        ]
+
+    def on(self, day):
+        """`(minute, duration)` of the slots held on `day`."""
+        with self._holds() as held:
+            return self._live(held, day)
+
+    def hold(self, day, minute, duration=SLOT_MINUTES):
+        """Hold a slot; False if it overlaps one already held."""
+        with self._holds() as held:
+            if _overlaps(minute, duration, self._live(held, day)):
+                return False
+            held[f"{day}:{minute}"] = [duration, clock.time() + HOLD_SECONDS]
+            return True
+
+    def release(self, day, minute, keep=0):
+        """Drop a hold, or keep it `keep` more seconds (e.g. once booked)."""
+        with self._holds() as held:
+            slot = f"{day}:{minute}"
+            if slot not in held:
+                return
+            if keep:
+                held[slot][1] = clock.time() + keep
+            else:
+                del held[slot]
+
+
+def _flag(value):
+    return False if pd.isna(value) else bool(value)
+
+
+def _as_time(value):
+    if isinstance(value, pd.Timedelta):
+        return (pd.Timestamp(0) + value).time()
+    return value
+
+
+class IdAllocator:
+    """Monotonic Appointment IDs that are never handed out twice.
+
+    `next` returns one more than the highest ID allocated or seen in the
+    data (`observe`), under a lock, so concurrent sessions always get
+    distinct IDs, and deletions never make an ID come back. With `path`, the
+    last ID is also kept in that file under an exclusive `flock`, so every
+    server process on the host allocates from one sequence.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.last = 0
+        self._lock = threading.Lock()
+
+    def observe(self, ids):
+        """Make `next` skip past the IDs in `ids` (a Series)."""
+        numbers = pd.to_numeric(ids, errors="coerce")
+        if numbers.notna().any():
+            with self._lock:
+                self.last = max(self.last, int(numbers.max()))
+
+    def next(self):
+        with self._lock:
+            if self.path is None:
+                self.last += 1
+                return self.last
+            with _exclusive(self.path) as file:
+                stored = file.read().strip()
+                self.last = max(self.last, int(stored) if stored else 0) + 1
+                _rewrite(file, str(self.last))
+            return self.last
@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+
+# Column -> kind for each table. Kinds are handled by the converters below;
+# "id" columns are kept exactly as the webhook sent them outside compact mode,
+# "key" columns are text outside compact mode.
+PATIENTS = {
+    "row_number": "int",
+    "Patient ID": "key",
+    "Name": "str",
+    "Phone": "str",
+    "Email": "str",
+    "Referral Source": "category",
+}
+
+APPOINTMENTS = {
+    "row_number": "int",
+    "Appointment ID": "id",
+    "Patient ID": "key",
+    "Date": "date",
+    "Time": "time",
+    "Payment Status": "float",
+    "Attended": "bool",
+    "First Appointment": "bool",
+    "Insurance": "category",
+    "Canceled": "bool",
+}
+
+# Known values of the "category" columns; values seen in the data are added
+CATEGORIES = {
+    "Insurance": ["Unimed", "Bradesco Saúde", "Amil", "Private", "Other"],
+    "Referral Source": ["Social Media", "Website", "Google", "Referral", "Other"],
+}
+
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M:%S"
+
+# Anything not listed here (including "false", "0", "null" and "") is False
+TRUE_VALUES = ("true", "1", "yes")
+
+# Compact storage mode: categoricals, Arrow strings, integer IDs (when every
+# ID is a whole number) and timedelta64 Time (offset from midnight). Date is
+# datetime64 and booleans are numpy bools in both modes.
+COMPACT_DTYPES = {
+    "int": "int32",
+    "str": "string[pyarrow]",
+}
+
+
+def _map_uniques(series, convert, missing):
+    """Apply `convert` to the distinct values of `series` only.
+
+    `convert` receives a numpy array of the unique values and returns an
+    array of the same length; results are scattered back with a single
+    `take`, so the per-row cost is one hash lookup.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    converted = np.asarray(convert(np.asarray(uniques, dtype=object)))
+    # Append the value used for missing entries so code -1 maps onto it
+    table = np.empty(len(converted) + 1, dtype=converted.dtype)
+    table[:-1] = converted
+    table[-1] = missing
+    return pd.Series(table[codes], index=series.index, name=series.name)
+
+
+def _to_bool(series, compact=False):
+    if series.dtype != bool:
+
+        def convert(values):
+            text = pd.Series(values).astype(str).str.lower()
+            return text.isin(TRUE_VALUES).to_numpy()
+
+        series = _map_uniques(series, convert, False).astype(bool)
+    return series
+
+
+def _to_date(series, compact=False):
+    # Always datetime64 so no page has to convert the column on its own
+    if pd.api.types.is_datetime64_dtype(series):
+        return series
+
+    def convert(values):
+        values = pd.Series(values, dtype=object).astype(str)
+        parsed = pd.to_datetime(values, format=DATE_FORMAT, errors="coerce")
+        return parsed.to_numpy()
+
+    return _map_uniques(series, convert, np.datetime64("NaT", "ns"))
+
+
+def _to_time(series, compact=False):
+    if compact and pd.api.types.is_timedelta64_dtype(series):
+        return series
+
+    def convert(values):
+        parsed = pd.to_datetime(
+            pd.Series(values, dtype=object).astype(str),
+            format=TIME_FORMAT,
+            errors="coerce",
+        )
+        if compact:
+            return (parsed - parsed.dt.normalize()).to_numpy()
+        return parsed.dt.time.to_numpy()
+
+    missing = np.timedelta64("NaT", "ns") if compact else pd.NaT
+    return _map_uniques(series, convert, missing)
+
+
+def _to_str(series, compact=False):
+    if pd.api.types.infer_dtype(series, skipna=False) != "string":
+
+        def convert(values):
+            return pd.Series(values, dtype=object).astype(str).to_numpy(dtype=object)
+
+        series = _map_uniques(series, convert, "nan")
+    return series.astype(COMPACT_DTYPES["str"]) if compact else series
+
+
+def _to_category(series, compact=False):
+    if not compact:
+        return _to_str(series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    series = _to_str(series)
+    known = CATEGORIES.get(series.name, [])
+    extra = sorted(set(series.unique()) - set(known))
+    return series.astype(pd.CategoricalDtype(known + extra))
+
+
+def _to_id(series, compact=False):
+    if not compact:
+        return series
+    numbers = pd.to_numeric(series, errors="coerce")
+    if numbers.notna().all() and (numbers % 1 == 0).all():
+        fits = numbers.empty or numbers.abs().max() < np.iinfo("int32").max
+        return numbers.astype("int32" if fits else "int64")
+    return _to_str(series, compact)
+
+
+def _to_key(series, compact=False):
+    # Patient IDs repeat across the appointments, so compact mode stores them
+    # as integers like the appointment IDs
+    return _to_id(series, compact) if compact else _to_str(series)
+
+
+def _to_int(series, compact=False):
+    series = pd.to_numeric(series, errors="coerce").fillna(0)
+    return series.astype(COMPACT_DTYPES["int"] if compact else "int64")
+
+
+def _to_float(series, compact=False):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0.0).astype("float64")
+
+    def convert(values):
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+        return numbers.fillna(0.0).to_numpy(dtype="float64")
+
+    return _map_uniques(series, convert, 0.0)
+
+
+CONVERTERS = {
+    "bool": _to_bool,
+    "date": _to_date,
+    "time": _to_time,
+    "str": _to_str,
+    "category": _to_category,
+    "int": _to_int,
+    "float": _to_float,
+    "id": _to_id,
+    "key": _to_key,
+}
+
+
+def empty_frame(schema, compact=False):
+    """Return an empty DataFrame with the columns of `schema`."""
+    df = pd.DataFrame(columns=list(schema))
+    return normalize_frame(df, schema, compact) if compact else df
+
+
+def normalize_frame(df, schema, compact=False):
+    """Coerce every `schema` column present in `df`, in place, and return it."""
+    for column, kind in schema.items():
+        if column in df.columns:
+            df[column] = CONVERTERS[kind](df[column], compact)
+    return df
+
+
+def normalize_records(records, schema, compact=False):
+    """Build a normalized DataFrame from a list of webhook records."""
+    if not records:
+        return empty_frame(schema, compact)
+    return normalize_frame(pd.DataFrame(records), schema, compact)
+
+
+def normalize_record(record, schema):
+    """Normalize a single webhook record, keeping only the fields it has.
+
+    Goes through the same converters as bulk loads and returns plain Python
+    values, so the result can be written straight into a table cell.
+    """
+    frame = normalize_frame(pd.DataFrame([record]), schema)
+    return {column: frame[column].tolist()[0] for column in frame.columns}
+
+
+def conform(df, rows):
+    """Cast `rows` to the dtypes of `df` so they can be concatenated or merged.
+
+    Categorical columns of `df` gain any new categories found in `rows`;
+    that is the only case where `df` itself is modified.
+    """
+    if df is None or df.empty:
+        return rows
+    rows = rows.copy()
+    for column in rows.columns.intersection(df.columns):
+        target = df[column].dtype
+        if isinstance(target, pd.CategoricalDtype):
+            new = set(rows[column].dropna().astype(str)) - set(target.categories)
+            if new:
+                df[column] = df[column].cat.add_categories(sorted(new))
+                target = df[column].dtype
+            rows[column] = rows[column].astype(str).astype(target)
+        elif rows[column].dtype != target:
+            if pd.api.types.is_datetime64_dtype(target):
+                rows[column] = pd.to_datetime(rows[column].astype(str))
+            elif pd.api.types.is_timedelta64_dtype(target):
+                rows[column] = _to_time(rows[column], compact=True)
+            else:
+                try:
+                    rows[column] = rows[column].astype(target)
+                except (TypeError, ValueError):
+                    # Leave unexpected values alone; concat falls back to object
+                    pass
+    return rows
+
+
+def as_datetime(series):
+    """Return `series` as datetime64, parsing each distinct date only once."""
+    if pd.api.types.is_datetime64_dtype(series):
+        return series
+    return _map_uniques(
+        series,
+        lambda values: pd.to_datetime(pd.Series(values, dtype=object)).to_numpy(),
+        np.datetime64("NaT", "ns"),
+    )
+
+
+def as_time(series):
+    """Return `series` as `datetime.time` objects, whatever its storage."""
+    if pd.api.types.is_timedelta64_dtype(series):
+        return (pd.Timestamp(0) + series).dt.time
+    return series
+
+
+def memory_report(frames):
+    """Deep memory usage per column of each table in `frames`, in bytes."""
+    rows = []
+    for table, df in frames.items():
+        usage = df.memory_usage(deep=True, index=False)
+        for column, nbytes in usage.items():
+            rows.append(
+                {
+                    "Table": table,
+                    "Column": column,
+                    "Dtype": str(df[column].dtype),
+                    "Bytes": int(nbytes),
+                }
+            )
+    return pd.DataFrame(rows, columns=["Table", "Column", "Dtype", "Bytes"])
@@ -0,0 +1,290 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Matches returned by `search` unless asked otherwise
+DEFAULT_LIMIT = 10
+
+# Patients added or removed since the build before the store builds a new
+# index
+MAX_PENDING = 4096
+
+# Share of the query's trigrams a fuzzy match must contain
+MIN_SIMILARITY = 0.5
+
+# Trailing digits of a phone number also indexed on their own, so the local
+# number matches without the country and area codes
+PHONE_SUFFIXES = (8, 9)
+
+# Normalized text only holds these characters; trigrams are packed into ints
+# of base len(ALPHABET)
+ALPHABET = " 0123456789abcdefghijklmnopqrstuvwxyz"
+SYMBOLS = np.zeros(256, dtype="int64")
+SYMBOLS[np.frombuffer(ALPHABET.encode(), dtype="uint8")] = np.arange(len(ALPHABET))
+GRAMS = len(ALPHABET) ** 3
+
+# Sorts after every character of ALPHABET, so `term + END` bounds the tokens
+# starting with `term`
+END = "{"
+
+WORD = re.compile(r"[a-z0-9]+")
+NOT_DIGIT = re.compile(r"[^0-9]")
+
+
+def normalize(text):
+    """Lowercase ASCII words of `text`, accents dropped and punctuation to spaces."""
+    if not isinstance(text, str):
+        if text is None or pd.isna(text):
+            return ""
+        text = str(text)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(WORD.findall(text.lower()))
+
+
+def _normalized(values):
+    # Column-wise `normalize`, in Arrow compute kernels
+    text = pc.utf8_normalize(
+        pa.array(values, type=pa.string(), from_pandas=True), "NFKD"
+    )
+    text = pc.utf8_lower(pc.replace_substring_regex(text, r"[^\x00-\x7f]", ""))
+    text = pc.replace_substring_regex(text, r"[^a-z0-9]+", " ")
+    return pc.fill_null(pc.utf8_trim_whitespace(text), "")
+
+
+def _fields(rows):
+    """Normalized name, email local part and phone numbers of each patient."""
+    emails = _normalized(rows["Email"].astype("string").str.split("@").str[0])
+    digits = pc.fill_null(
+        pc.replace_substring_regex(
+            pa.array(
+                rows["Phone"].astype("string"), type=pa.string(), from_pandas=True
+            ),
+            r"[^0-9]",
+            "",
+        ),
+        "",
+    )
+    phones = [digits]
+    for size in PHONE_SUFFIXES:
+        phones += [" ", pc.utf8_slice_codeunits(digits, -size)]
+    return _normalized(rows["Name"]), emails, pc.binary_join_element_wise(*phones, "")
+
+
+def _text(fields):
+    return pc.binary_join_element_wise(*fields, " ")
+
+
+def _tokens(fields, codes):
+    """`(tokens, codes)` arrays of the distinct words of each patient, sorted."""
+    words = pc.utf8_split_whitespace(_text(fields))
+    table = pa.table(
+        {
+            "token": pc.list_flatten(words),
+            "code": np.asarray(codes)[pc.list_parent_indices(words).to_numpy()],
+        }
+    )
+    table = table.take(
+        pc.sort_indices(
+            table, sort_keys=[("token", "ascending"), ("code", "ascending")]
+        )
+    )
+    tokens = table["token"].to_numpy(zero_copy_only=False)
+    codes = table["code"].to_numpy()
+    distinct = np.ones(len(tokens), dtype=bool)
+    distinct[1:] = (tokens[1:] != tokens[:-1]) | (codes[1:] != codes[:-1])
+    return tokens[distinct], codes[distinct]
+
+
+def _grams(texts, codes):
+    """`(trigrams, codes)` arrays of the distinct trigrams of `texts`, sorted."""
+    # Normalized text is ASCII, so the Arrow data buffer holds one byte per
+    # character and the offsets give each text's length
+    texts = pa.array(texts, type=pa.string())
+    _, offsets, data = texts.buffers()
+    offsets = np.frombuffer(offsets, dtype="int32")[
+        texts.offset : texts.offset + len(texts) + 1
+    ]
+    symbols = SYMBOLS[np.frombuffer(data, dtype="uint8")[offsets[0] : offsets[-1]]]
+    owners = np.repeat(np.asarray(codes, dtype="int64"), np.diff(offsets))
+    base = len(ALPHABET)
+    grams = symbols[:-2] * base * base + symbols[1:-1] * base + symbols[2:]
+    inside = owners[:-2] == owners[2:]
+    keys = np.sort((grams[inside] << 32) | owners[:-2][inside])
+    # Texts shorter than a trigram leave no keys at all
+    distinct = np.ones(len(keys), dtype=bool)
+    distinct[1:] = keys[1:] != keys[:-1]
+    keys = keys[distinct]
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+class PatientSearch:
+    """Accent-insensitive typeahead over patient name, phone and email.
+
+    Every name word, email local-part word and phone number (whole, and its
+    last 8 and 9 digits) is a token in one sorted array, next to the code
+    numbering its patient. A query term matches the tokens it prefixes,
+    found with two binary searches, and every term must match. When that
+    finds fewer than `limit` patients, the trigrams of the query are looked
+    up in an inverted index (trigrams packed into ints, postings in one
+    array) so misspellings and digits from the middle of a phone number
+    still match. Matches are ranked by exact word hits, then by name.
+
+    Patients added after the build are kept in a small sorted list and dict
+    that queries read as well, and removed ones are skipped, until
+    `needs_rebuild` tells the store to build a new index.
+    """
+
+    def __init__(self):
+        # code -> (Patient ID, Name, Phone, Email)
+        self.records = []
+        self.alive = np.zeros(0, dtype=bool)
+        # Patient ID -> code of its current record
+        self.codes = {}
+        # code -> position of the patient's name in name order
+        self.ranks = np.zeros(0)
+        self.names = np.empty(0, dtype=object)
+        self.tokens = np.empty(0, dtype=object)
+        self.token_codes = np.empty(0, dtype="int64")
+        # Codes of trigram g are postings[offsets[g]:offsets[g + 1]]
+        self.postings = np.empty(0, dtype="int64")
+        self.offsets = np.zeros(GRAMS + 1, dtype="int64")
+        # Patients added since the build: (token, code) pairs and trigram ->
+        # codes
+        self.added_tokens = []
+        self.added_grams = {}
+        # code -> normalized name of the patients added since the build
+        self.added_names = {}
+        self.changes = 0
+
+    @classmethod
+    def build(cls, patients):
+        index = cls()
+        if patients is None or patients.empty:
+            return index
+        fields = _fields(patients)
+        codes = np.arange(len(patients))
+        index._register(patients)
+        names = fields[0].to_numpy(zero_copy_only=False)
+        order = pc.sort_indices(fields[0]).to_numpy()
+        index.names = names[order]
+        index.ranks = np.empty(len(patients))
+        index.ranks[order] = np.arange(len(patients))
+        index.tokens, index.token_codes = _tokens(fields, codes)
+        grams, index.postings = _grams(_text(fields), codes)
+        index.offsets = np.searchsorted(grams, np.arange(GRAMS + 1))
+        return index
+
+    def needs_rebuild(self):
+        return self.changes > MAX_PENDING
+
+    def _register(self, rows):
+        start = len(self.records)
+        ids = rows["Patient ID"].tolist()
+        self.records += zip(
+            ids, rows["Name"].tolist(), rows["Phone"].tolist(), rows["Email"].tolist()
+        )
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        for code, patient_id in enumerate(ids, start):
+            previous = self.codes.get(patient_id)
+            if previous is not None:
+                self.alive[previous] = False
+            self.codes[patient_id] = code
+        return np.arange(start, len(self.records))
+
+    def add(self, rows):
+        """Index the patients in `rows`."""
+        fields = _fields(rows)
+        codes = self._register(rows)
+        # Added names rank between the built ones they sort between, after
+        # those they equal
+        names = fields[0].to_numpy(zero_copy_only=False)
+        ranks = np.searchsorted(self.names, names, side="right") - 0.5
+        self.ranks = np.concatenate([self.ranks, ranks])
+        self.added_names.update(zip(codes.tolist(), names.tolist()))
+        tokens, token_codes = _tokens(fields, codes)
+        for pair in zip(tokens.tolist(), token_codes.tolist()):
+            insort(self.added_tokens, pair)
+        grams, gram_codes = _grams(_text(fields), codes)
+        for gram, code in zip(grams.tolist(), gram_codes.tolist()):
+            self.added_grams.setdefault(gram, []).append(code)
+        self.changes += len(rows)
+
+    def remove(self, rows):
+        """Stop returning the patients in `rows`."""
+        for patient_id in rows["Patient ID"].tolist():
+            code = self.codes.pop(patient_id, None)
+            if code is not None:
+                self.alive[code] = False
+                self.changes += 1
+
+    def _tokens_between(self, low, high):
+        # Codes of the tokens in [low, high), built and added
+        start, stop = np.searchsorted(self.tokens, [low, high])
+        first = bisect_left(self.added_tokens, (low,))
+        last = bisect_left(self.added_tokens, (high,))
+        added = [code for _, code in self.added_tokens[first:last]]
+        return np.union1d(self.token_codes[start:stop], added).astype("int64")
+
+    def _similar(self, text):
+        # Codes sharing at least MIN_SIMILARITY of the trigrams of `text`,
+        # with the share they hold
+        grams, _ = _grams([text], [0])
+        if not len(grams):
+            return np.empty(0, dtype="int64"), np.empty(0)
+        codes = np.concatenate(
+            [
+                self.postings[self.offsets[gram] : self.offsets[gram + 1]]
+                for gram in grams.tolist()
+            ]
+            + [
+                np.asarray(self.added_grams.get(gram, []), dtype="int64")
+                for gram in grams.tolist()
+            ]
+        )
+        codes, counts = np.unique(codes, return_counts=True)
+        keep = counts >= MIN_SIMILARITY * len(grams)
+        return codes[keep], counts[keep] / len(grams)
+
+    def _best(self, codes, scores, limit):
+        # Highest score first, then by name
+        alive = self.alive[codes]
+        codes, scores = codes[alive], scores[alive]
+        # Added patients sharing a rank are ordered by name among themselves
+        ties = np.zeros(len(codes))
+        added = np.flatnonzero(codes >= len(self.names))
+        if len(added):
+            names = [self.added_names[code] for code in codes[added].tolist()]
+            ties[added] = np.argsort(np.argsort(names, kind="stable"), kind="stable")
+        order = np.lexsort((ties, self.ranks[codes], -scores))[:limit]
+        return codes[order].tolist()
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Top `limit` patients matching `query`, best first, as dicts."""
+        terms = normalize(query).split()
+        if not terms:
+            return []
+        if all(term.isdigit() for term in terms):
+            # "(11) 98765-4321" is one phone number, not four terms
+            terms = ["".join(terms)]
+        found = self._tokens_between(terms[0], terms[0] + END)
+        for term in terms[1:]:
+            found = np.intersect1d(found, self._tokens_between(term, term + END))
+        exact = sum(
+            np.isin(found, self._tokens_between(term, term + " ")).astype(int)
+            for term in terms
+        )
+        matches = self._best(found, np.asarray(exact), limit)
+        if len(matches) < limit:
+            similar, shares = self._similar(" ".join(terms))
+            fuzzy = ~np.isin(similar, found)
+            matches += self._best(similar[fuzzy], shares[fuzzy], limit - len(matches))
+        return [
+            dict(zip(("Patient ID", "Name", "Phone", "Email"), self.records[code]))
+            for code in matches
+        ]
@@ -0,0 +1,103 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+
+from core.snapshot import Snapshot
+
+# Pointer to the version readers should attach, replaced atomically
+CURRENT_FILE = "current.json"
+LOCK_FILE = "leader.lock"
+
+# Published versions kept on disk; older ones are removed once replaced.
+# Processes still mapping a removed version keep reading it until they move
+# on, as the kernel frees the pages only when the last mapping goes away.
+KEEP_VERSIONS = 2
+
+
+def default_directory():
+    # tmpfs when available, so published tables live in shared memory
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/clinic-data"
+    return ".cache/shared"
+
+
+class SharedTables:
+    """Tables published once and memory-mapped by every server process.
+
+    One process, the leader (whoever holds an exclusive lock on
+    `leader.lock`), downloads the tables and publishes each new version as
+    Arrow IPC files in a directory of its own, then points `current.json`
+    at it with an atomic rename. The other processes never download: they
+    attach the current version through `Snapshot.load`, which maps the files
+    read-only, so every process shares the same pages and RAM grows with the
+    number of versions kept rather than with processes or sessions. If the
+    leader exits, its lock is released and the next process to ask leads.
+    """
+
+    def __init__(self, directory, compact=False, keep=KEEP_VERSIONS):
+        self.directory = directory
+        self.compact = compact
+        self.keep = keep
+        self._lock_file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def leads(self):
+        """True if this process publishes; takes the lead when it is free."""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self._path(LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held (and the lock with it) for the life of the process
+        self._lock_file = lock_file
+        return True
+
+    def current(self):
+        """Name of the published version, or None if there is none yet."""
+        try:
+            with open(self._path(CURRENT_FILE)) as file:
+                return json.load(file)["name"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def wait(self, timeout, poll=0.25):
+        """Wait up to `timeout` seconds for a version to be published."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            name = self.current()
+            if name is not None:
+                return name
+            time.sleep(poll)
+        return None
+
+    def attach(self, name):
+        """Map version `name`; returns `({table: DataFrame}, watermarks)`."""
+        return Snapshot(self._path(name), self.compact).load()
+
+    def publish(self, frames, watermarks):
+        """Write a new version and make it the current one."""
+        name = f"v{time.time_ns()}"
+        Snapshot(self._path(name), self.compact).save(frames, watermarks)
+        pointer = self._path(CURRENT_FILE)
+        with open(pointer + ".tmp", "w") as file:
+            json.dump({"name": name, "published_at": time.time()}, file)
+        os.replace(pointer + ".tmp", pointer)
+        self._prune(name)
+        return name
+
+    def _prune(self, current):
+        versions = sorted(
+            entry
+            for entry in os.listdir(self.directory)
+            if entry.startswith("v") and entry != current
+        )
+        for name in versions[: max(0, len(versions) - (self.keep - 1))]:
+            shutil.rmtree(self._path(name), ignore_errors=True)
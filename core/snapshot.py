@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from core.schema import APPOINTMENTS, PATIENTS
+
+# Bump when the on-disk layout changes; older snapshots are then ignored
+FORMAT_VERSION = 1
+
+META_FILE = "meta.json"
+
+
+def fingerprint(compact=False):
+    """Identify the schema/storage mode a snapshot was written with."""
+    spec = json.dumps(
+        [FORMAT_VERSION, PATIENTS, APPOINTMENTS, bool(compact)], sort_keys=True
+    )
+    return hashlib.sha1(spec.encode()).hexdigest()
+
+
+class Snapshot:
+    """Normalized tables saved as Arrow IPC files for warm starts.
+
+    `save` writes one `<table>.arrow` file per table plus `meta.json` with the
+    sync watermarks; each file is written to a temporary name and renamed, so
+    a crash never leaves a half-written snapshot. `load` memory-maps the
+    files and converts them one column per block, so Arrow-backed string
+    columns (compact mode) and numeric columns without missing values are
+    read-only views of the page cache rather than copies; `AppendableTable`
+    copies a column the first time it is written.
+    """
+
+    def __init__(self, directory, compact=False):
+        self.directory = directory
+        self.compact = compact
+        self.fingerprint = fingerprint(compact)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        """Return `({table: DataFrame}, watermarks)`, or None if unusable."""
+        try:
+            with open(self._path(META_FILE)) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if meta.get("fingerprint") != self.fingerprint:
+            return None
+        strings = pd.StringDtype("pyarrow") if self.compact else None
+        mapping = {pa.string(): strings, pa.large_string(): strings}
+        frames = {}
+        try:
+            for table in meta["tables"]:
+                source = pa.memory_map(self._path(f"{table}.arrow"))
+                frames[table] = (
+                    pa.ipc.open_file(source)
+                    .read_all()
+                    .to_pandas(types_mapper=mapping.get, split_blocks=True)
+                )
+        except (OSError, pa.ArrowException):
+            return None
+        return frames, meta["watermarks"]
+
+    def save(self, frames, watermarks):
+        """Write `frames` ({table: DataFrame}) and `watermarks` to disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        for table, df in frames.items():
+            arrow = pa.Table.from_pandas(df, preserve_index=False)
+            path = self._path(f"{table}.arrow")
+            with pa.OSFile(path + ".tmp", "wb") as sink:
+                with pa.ipc.new_file(sink, arrow.schema) as writer:
+                    writer.write_table(arrow)
+            os.replace(path + ".tmp", path)
+        meta = {
+            "fingerprint": self.fingerprint,
+            "saved_at": time.time(),
+            "tables": list(frames),
+            "watermarks": watermarks,
+        }
+        with open(self._path(META_FILE + ".tmp"), "w") as file:
+            json.dump(meta, file)
+        os.replace(self._path(META_FILE + ".tmp"), self._path(META_FILE))
@@ -0,0 +1,348 @@
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+
+from core.cohorts import CohortIndex
+from core.kpis import (
+    KPI_COLUMNS,
+    PERIOD_KEYS,
+    calculate_range_kpis,
+    kpis_from_totals,
+)
+from core.repository import Repository, RepositoryError
+from core.schema import APPOINTMENTS, DATE_FORMAT, PATIENTS, normalize_records
+from core.sync import MODIFIED_COLUMN
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    row_number INTEGER PRIMARY KEY,
+    "Patient ID" TEXT NOT NULL UNIQUE,
+    "Name" TEXT,
+    "Phone" TEXT,
+    "Email" TEXT,
+    "Referral Source" TEXT,
+    "Modified At" TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS appointments (
+    row_number INTEGER PRIMARY KEY,
+    "Appointment ID" INTEGER NOT NULL UNIQUE,
+    "Patient ID" TEXT NOT NULL,
+    "Date" TEXT NOT NULL,
+    "Time" TEXT,
+    "Payment Status" REAL NOT NULL DEFAULT 0,
+    "Attended" INTEGER NOT NULL DEFAULT 0,
+    "First Appointment" INTEGER NOT NULL DEFAULT 0,
+    "Insurance" TEXT,
+    "Canceled" INTEGER NOT NULL DEFAULT 0,
+    "Modified At" TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS appointments_patient ON appointments ("Patient ID");
+CREATE INDEX IF NOT EXISTS patients_modified ON patients ("Modified At");
+CREATE INDEX IF NOT EXISTS appointments_modified ON appointments ("Modified At");
+-- Covers the KPI aggregates and the date range queries
+CREATE INDEX IF NOT EXISTS appointments_kpis ON appointments (
+    "Date", "Insurance", "Attended", "Payment Status", "Patient ID"
+);
+"""
+
+# SQL expression for each period key; dates are stored as YYYY-MM-DD text
+PERIOD_COLUMNS = {
+    "Year": """CAST(strftime('%Y', "Date") AS INTEGER)""",
+    "Month": """CAST(strftime('%m', "Date") AS INTEGER)""",
+}
+
+# Dated appointments with their month code, and each patient's cohort: the
+# month of the flagged first appointment (else the earliest one), with the
+# Insurance of that appointment and the patient's Referral Source
+COHORT_MEMBERS = """
+WITH dated AS (
+    SELECT "Patient ID" AS patient,
+        CAST(strftime('%Y', "Date") AS INTEGER) * 12
+            + CAST(strftime('%m', "Date") AS INTEGER) - 1 AS month,
+        "First Appointment" AS flagged,
+        COALESCE("Insurance", 'nan') AS insurance,
+        "Payment Status" AS payment
+    FROM appointments
+),
+ranked AS (
+    SELECT patient, month, insurance, ROW_NUMBER() OVER (
+        PARTITION BY patient ORDER BY flagged DESC, month
+    ) AS position
+    FROM dated
+),
+members AS (
+    SELECT ranked.patient, ranked.month AS cohort, ranked.insurance,
+        COALESCE(patients."Referral Source", 'Other') AS referral
+    FROM ranked LEFT JOIN patients ON patients."Patient ID" = ranked.patient
+    WHERE position = 1
+)
+"""
+
+# Columns the status and payment actions may change
+UPDATABLE = ("Attended", "Canceled", "Payment Status")
+
+
+def _now():
+    # Fixed-width UTC timestamps compare correctly as text
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return int(value.lower() in ("true", "1", "yes"))
+    return int(bool(value))
+
+
+class SqliteRepository(Repository):
+    """A local SQLite database, for tests and small installs.
+
+    Only the last `history_days` of appointments (and every future one) are
+    loaded into memory; KPIs, lifetime value, retention, date ranges and
+    appointment counts are answered by indexed SQL queries over the whole
+    history. Every write stamps "Modified At", so delta syncs also pick up
+    edits made by other processes.
+    """
+
+    supports_delta = True
+    batches = True
+
+    def __init__(self, store, path, history_days=None, compact=False):
+        super().__init__(store, compact)
+        self.history_days = history_days
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self._lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def _appointments_frame(self, rows):
+        return normalize_records(rows, APPOINTMENTS, self.compact)
+
+    def load(self, changed_only=False):
+        patients = self._query("SELECT * FROM patients ORDER BY row_number")
+        sql, params = "SELECT * FROM appointments", ()
+        if self.history_days is not None:
+            start = date.today() - timedelta(days=self.history_days)
+            sql, params = sql + ' WHERE "Date" >= ?', (start.strftime(DATE_FORMAT),)
+        appointments = self._query(sql + " ORDER BY row_number", params)
+        return (
+            normalize_records(patients, PATIENTS, self.compact),
+            self._appointments_frame(appointments),
+        )
+
+    def load_day(self, day):
+        day = day.strftime(DATE_FORMAT)
+        appointments = self._query(
+            'SELECT * FROM appointments WHERE "Date" = ? ORDER BY row_number', (day,)
+        )
+        patients = self._query(
+            'SELECT * FROM patients WHERE "Patient ID" IN '
+            '(SELECT "Patient ID" FROM appointments WHERE "Date" = ?) '
+            "ORDER BY row_number",
+            (day,),
+        )
+        return (
+            normalize_records(patients, PATIENTS, self.compact),
+            self._appointments_frame(appointments),
+        )
+
+    def load_delta(self, watermarks):
+        frames = []
+        for table, schema in (("patients", PATIENTS), ("appointments", APPOINTMENTS)):
+            mark = watermarks[table]
+            sql = f"SELECT * FROM {table} WHERE row_number > ?"
+            params = [mark["row_number"]]
+            if mark.get("modified_at"):
+                sql += f' OR "{MODIFIED_COLUMN}" > ?'
+                params.append(mark["modified_at"])
+            rows = self._query(sql + " ORDER BY row_number", params)
+            frames.append(
+                normalize_records(rows, schema, self.compact) if rows else None
+            )
+        return tuple(frames)
+
+    def call(self, action, payload):
+        return self.call_batch([(action, payload)])[0]
+
+    def call_batch(self, calls):
+        # All calls of a batch are committed (or rolled back) together
+        try:
+            with self._lock, self.connection:
+                return [self._apply(action, payload) for action, payload in calls]
+        except (sqlite3.Error, KeyError, TypeError, ValueError) as error:
+            raise RepositoryError(str(error)) from error
+
+    def _apply(self, action, payload):
+        if action == "post_patient_url":
+            return self._insert_patient(payload)
+        if action == "post_appointment_url":
+            return self._insert_appointment(payload)
+        return self._update_appointment(payload)
+
+    def _insert(self, table, values):
+        columns = ", ".join(f'"{column}"' for column in values)
+        marks = ", ".join("?" for _ in values)
+        cursor = self.connection.execute(
+            f"INSERT INTO {table} ({columns}) VALUES ({marks})", list(values.values())
+        )
+        return self._row(table, "row_number", cursor.lastrowid)
+
+    def _row(self, table, column, value):
+        row = self.connection.execute(
+            f'SELECT * FROM {table} WHERE "{column}" = ?', (value,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _next(self, table, column):
+        (value,) = self.connection.execute(
+            f'SELECT COALESCE(MAX("{column}"), 0) + 1 FROM {table}'
+        ).fetchone()
+        return value
+
+    def _insert_patient(self, payload):
+        return self._insert(
+            "patients",
+            {
+                "Patient ID": str(self._next("patients", "row_number")),
+                "Name": payload["patient_name"],
+                "Phone": payload.get("patient_phone"),
+                "Email": payload.get("patient_email"),
+                "Referral Source": payload.get("referral_source"),
+                MODIFIED_COLUMN: _now(),
+            },
+        )
+
+    def _insert_appointment(self, payload):
+        # IDs are allocated here, inside the transaction, so two sessions
+        # registering at once can never get the same one
+        return self._insert(
+            "appointments",
+            {
+                "Appointment ID": self._next("appointments", "Appointment ID"),
+                "Patient ID": str(payload["patient_id"]),
+                "Date": str(payload["date"]),
+                "Time": str(payload["time"]),
+                "Payment Status": float(payload.get("payment_status") or 0.0),
+                "Attended": _flag(payload.get("attended", False)),
+                "First Appointment": _flag(payload.get("first_appointment", False)),
+                "Insurance": payload.get("insurance"),
+                "Canceled": _flag(payload.get("canceled", False)),
+                MODIFIED_COLUMN: _now(),
+            },
+        )
+
+    def _update_appointment(self, payload):
+        values = {
+            column: (
+                float(payload[column])
+                if column == "Payment Status"
+                else _flag(payload[column])
+            )
+            for column in UPDATABLE
+            if column in payload
+        }
+        values[MODIFIED_COLUMN] = _now()
+        assignments = ", ".join(f'"{column}" = ?' for column in values)
+        appointment_id = payload["Appointment ID"]
+        self.connection.execute(
+            f'UPDATE appointments SET {assignments} WHERE "Appointment ID" = ?',
+            [*values.values(), appointment_id],
+        )
+        return self._row("appointments", "Appointment ID", appointment_id)
+
+    def period_kpis(self, period):
+        keys = PERIOD_KEYS[period]
+        selected = ", ".join(f'{PERIOD_COLUMNS[key]} AS "{key}"' for key in keys)
+        rows = self._query(f"""
+            SELECT {selected},
+                COUNT(*) AS count,
+                SUM("Attended") AS attended,
+                SUM(COALESCE("Insurance", '') != 'Private') AS insured,
+                SUM("Payment Status") AS payment
+            FROM appointments
+            GROUP BY {", ".join(f'"{key}"' for key in keys)}
+            ORDER BY {", ".join(f'"{key}"' for key in keys)}
+            """)
+        if not rows:
+            return pd.DataFrame(columns=KPI_COLUMNS)
+        return kpis_from_totals(pd.DataFrame(rows).set_index(keys))
+
+    def range_kpis(self, start, stop):
+        (row,) = self._query(
+            """
+            SELECT COUNT(*) AS count,
+                COALESCE(SUM("Attended"), 0) AS attended,
+                COALESCE(SUM(COALESCE("Insurance", '') != 'Private'), 0) AS insured,
+                COALESCE(SUM("Payment Status"), 0) AS payment
+            FROM appointments WHERE "Date" BETWEEN ? AND ?
+            """,
+            (start.strftime(DATE_FORMAT), stop.strftime(DATE_FORMAT)),
+        )
+        return calculate_range_kpis(row, start, stop)
+
+    def _cohorts(self):
+        cells = self._query(f"""
+            {COHORT_MEMBERS}
+            SELECT members.cohort, members.insurance, members.referral,
+                dated.month - members.cohort AS offset,
+                COUNT(DISTINCT dated.patient) AS patients,
+                SUM(dated.payment) AS payment
+            FROM dated JOIN members USING (patient)
+            WHERE dated.month >= members.cohort
+            GROUP BY 1, 2, 3, 4
+            """)
+        sizes = self._query(f"""
+            {COHORT_MEMBERS}
+            SELECT cohort, insurance, referral, COUNT(*) AS patients
+            FROM members GROUP BY 1, 2, 3
+            """)
+        if not cells:
+            return CohortIndex()
+        return CohortIndex.from_totals(pd.DataFrame(cells), pd.DataFrame(sizes))
+
+    def cohort_retention(self, by=None):
+        return self._cohorts().retention(by)
+
+    def cohort_ltv(self, by=None):
+        return self._cohorts().ltv_curves(by)
+
+    def lifetime_value(self):
+        (row,) = self._query("""
+            SELECT AVG(total) AS ltv FROM (
+                SELECT SUM("Payment Status") AS total
+                FROM appointments GROUP BY "Patient ID"
+            )
+            """)
+        return round(row["ltv"], 2) if row["ltv"] is not None else 0
+
+    def retention_rate(self):
+        (row,) = self._query("""
+            SELECT COUNT(*) AS patients, SUM(visits > 1) AS retained FROM (
+                SELECT COUNT(*) AS visits FROM appointments GROUP BY "Patient ID"
+            )
+            """)
+        if not row["patients"]:
+            return 0
+        return round(row["retained"] / row["patients"] * 100, 2)
+
+    def appointments_between(self, start, stop):
+        rows = self._query(
+            'SELECT * FROM appointments WHERE "Date" BETWEEN ? AND ? '
+            'ORDER BY "Date", "Time"',
+            (start.strftime(DATE_FORMAT), stop.strftime(DATE_FORMAT)),
+        )
+        return self._appointments_frame(rows)
+
+    def appointment_count(self, patient_id):
+        (row,) = self._query(
+            'SELECT COUNT(*) AS count FROM appointments WHERE "Patient ID" = ?',
+            (str(patient_id),),
+        )
+        return row["count"]
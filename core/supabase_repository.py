@@ -0,0 +1,181 @@
+import json
+from datetime import date, timedelta
+
+import pandas as pd
+from supabase import create_client
+
+from core.cohorts import CohortIndex
+from core.kpis import (
+    KPI_COLUMNS,
+    PERIOD_KEYS,
+    calculate_range_kpis,
+    kpis_from_totals,
+)
+from core.repository import Repository, RepositoryError
+from core.schema import APPOINTMENTS, DATE_FORMAT, PATIENTS, normalize_records
+from core.table import AppendableTable
+
+# Rows asked for per page: PostgREST's default `max_rows`, which caps every
+# RPC result whatever `page_limit` asks for
+PAGE_SIZE = 1000
+
+
+def _jsonable(payload):
+    # Dates and times from the forms are sent as their ISO text
+    return json.loads(json.dumps(payload, default=str))
+
+
+class SupabaseRepository(Repository):
+    """Postgres through Supabase, using the functions in `sql/supabase.sql`.
+
+    Like the SQLite backend, only the last `history_days` of appointments
+    are loaded into memory and the KPI, range and count queries run in the
+    database. Every read and write is one RPC call, so the database does the
+    filtering and aggregation and PostgREST never has to expose the tables.
+    """
+
+    supports_delta = True
+    batches = True
+
+    def __init__(
+        self, store, url, key, history_days=None, compact=False, page_size=None
+    ):
+        super().__init__(store, compact)
+        self.client = create_client(url, key)
+        self.history_days = history_days
+        self.page_size = page_size or PAGE_SIZE
+
+    def _rpc(self, function, params=None):
+        try:
+            return self.client.rpc(function, params or {}).execute().data
+        except Exception as error:
+            raise RepositoryError(str(error)) from error
+
+    def _pages(self, function, params):
+        # A page may come back shorter than asked when the server caps it
+        # lower, so only an empty page ends the table
+        offset = 0
+        while True:
+            rows = self._rpc(
+                function,
+                {**params, "page_offset": offset, "page_limit": self.page_size},
+            )
+            if not rows:
+                return
+            yield rows
+            offset += len(rows)
+
+    def _load(self, function, schema, params):
+        table = AppendableTable(normalize_records([], schema, self.compact))
+        for rows in self._pages(function, params):
+            table.append(normalize_records(rows, schema, self.compact))
+        return table
+
+    def load(self, changed_only=False):
+        params = {}
+        if self.history_days is not None:
+            start = date.today() - timedelta(days=self.history_days)
+            params["from_date"] = start.strftime(DATE_FORMAT)
+        return (
+            self._load("clinic_patients", PATIENTS, {}),
+            self._load("clinic_appointments", APPOINTMENTS, params),
+        )
+
+    def load_day(self, day):
+        day = day.strftime(DATE_FORMAT)
+        patients = self._rpc("clinic_day_patients", {"day": day})
+        appointments = self._rpc(
+            "clinic_appointments_between", {"start_date": day, "stop_date": day}
+        )
+        return (
+            normalize_records(patients or [], PATIENTS, self.compact),
+            normalize_records(appointments or [], APPOINTMENTS, self.compact),
+        )
+
+    def load_delta(self, watermarks):
+        tables = []
+        for function, table, schema in (
+            ("clinic_patients", "patients", PATIENTS),
+            ("clinic_appointments", "appointments", APPOINTMENTS),
+        ):
+            mark = watermarks[table]
+            loaded = self._load(
+                function,
+                schema,
+                {
+                    "since_row": mark["row_number"],
+                    "since_modified": mark.get("modified_at"),
+                },
+            )
+            tables.append(loaded.frame if len(loaded) else None)
+        return tuple(tables)
+
+    def call(self, action, payload):
+        return self._rpc(
+            "clinic_call", {"action": action, "payload": _jsonable(payload)}
+        )
+
+    def call_batch(self, calls):
+        # One RPC, one transaction
+        return self._rpc(
+            "clinic_call_batch",
+            {
+                "calls": [
+                    {"action": action, "payload": _jsonable(payload)}
+                    for action, payload in calls
+                ]
+            },
+        )
+
+    def period_kpis(self, period):
+        keys = PERIOD_KEYS[period]
+        rows = self._rpc("clinic_period_totals", {"period": period})
+        if not rows:
+            return pd.DataFrame(columns=KPI_COLUMNS)
+        return kpis_from_totals(pd.DataFrame(rows).set_index(keys))
+
+    def range_kpis(self, start, stop):
+        (row,) = self._rpc(
+            "clinic_range_totals",
+            {
+                "start_date": start.strftime(DATE_FORMAT),
+                "stop_date": stop.strftime(DATE_FORMAT),
+            },
+        )
+        return calculate_range_kpis(row, start, stop)
+
+    def _cohorts(self):
+        cells = self._rpc("clinic_cohort_cells")
+        if not cells:
+            return CohortIndex()
+        sizes = self._rpc("clinic_cohort_sizes")
+        return CohortIndex.from_totals(pd.DataFrame(cells), pd.DataFrame(sizes))
+
+    def cohort_retention(self, by=None):
+        return self._cohorts().retention(by)
+
+    def cohort_ltv(self, by=None):
+        return self._cohorts().ltv_curves(by)
+
+    def lifetime_value(self):
+        (row,) = self._rpc("clinic_patient_totals")
+        return round(row["ltv"], 2) if row["ltv"] is not None else 0
+
+    def retention_rate(self):
+        (row,) = self._rpc("clinic_patient_totals")
+        if not row["patients"]:
+            return 0
+        return round(row["retained"] / row["patients"] * 100, 2)
+
+    def appointments_between(self, start, stop):
+        rows = self._rpc(
+            "clinic_appointments_between",
+            {
+                "start_date": start.strftime(DATE_FORMAT),
+                "stop_date": stop.strftime(DATE_FORMAT),
+            },
+        )
+        return normalize_records(rows, APPOINTMENTS, self.compact)
+
+    def appointment_count(self, patient_id):
+        return self._rpc("clinic_appointment_count", {"patient": str(patient_id)})
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# Columns used to find rows that changed since the last sync
+ROW_COLUMN = "row_number"
+MODIFIED_COLUMN = "Modified At"
+
+
+def watermark(df, previous=None):
+    """Return the highest row_number and modified-at seen in `df`.
+
+    When `previous` is given the result never moves backwards, so a delta
+    containing only updated rows keeps the row_number mark of the full table.
+    """
+    mark = dict(previous or {"row_number": 0, "modified_at": None})
+    if df is None or df.empty:
+        return mark
+    if ROW_COLUMN in df.columns:
+        mark["row_number"] = max(mark["row_number"], int(df[ROW_COLUMN].max()))
+    if MODIFIED_COLUMN in df.columns:
+        latest = df[MODIFIED_COLUMN].dropna().astype(str).max()
+        if isinstance(latest, str) and (
+            mark["modified_at"] is None or latest > mark["modified_at"]
+        ):
+            mark["modified_at"] = latest
+    return mark
+
+
+def delta_params(mark):
+    """Query parameters asking the n8n webhook for rows after `mark`."""
+    params = {"since_row_number": mark["row_number"]}
+    if mark["modified_at"] is not None:
+        params["modified_since"] = mark["modified_at"]
+    return params
+
+
+def _unchanged(current, rows):
+    """Mask of the `rows` whose values all equal those of `current`, in order."""
+    same = np.ones(len(rows), dtype=bool)
+    for column in rows.columns.intersection(current.columns):
+        old = current[column].reset_index(drop=True)
+        new = rows[column].reset_index(drop=True)
+        # Missing on both sides counts as equal
+        equal = old.eq(new).fillna(False).to_numpy(dtype=bool)
+        same &= equal | (old.isna() & new.isna()).to_numpy()
+    return same
+
+
+def merge_delta(table, delta):
+    """Merge `delta` into `table` (an `AppendableTable`) by row_number.
+
+    Rows that already exist are overwritten in place; new rows are appended.
+    Rows identical to the stored ones are skipped, so a delta that repeats
+    the table changes nothing. Returns `(replaced, written)`: a copy of the
+    overwritten rows as they were before the merge, and the rows of `table`
+    that now hold the delta (both empty when nothing changed).
+    """
+    delta = table.conform(delta)
+    frame = table.frame
+    positions = pd.Index(frame[ROW_COLUMN]).get_indexer(delta[ROW_COLUMN])
+    existing = positions >= 0
+    if existing.any():
+        changed = ~existing
+        changed[existing] = ~_unchanged(
+            frame.iloc[positions[existing]], delta[existing]
+        )
+        delta, positions, existing = (
+            delta[changed],
+            positions[changed],
+            existing[changed],
+        )
+    targets = positions[existing]
+    replaced = frame.iloc[targets].copy()
+    if existing.any():
+        table.write(targets, delta[existing])
+    appended = table.append(delta[~existing])
+    return replaced, pd.concat([table.frame.iloc[targets], appended])
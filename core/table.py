@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from core.schema import conform
+
+# Spare rows are added geometrically so appends cost amortized O(1)
+GROWTH_FACTOR = 1.25
+MIN_SPARE_ROWS = 256
+# Appended Arrow chunks are merged once a column has more than this many
+MAX_CHUNKS = 64
+
+
+class AppendableTable:
+    """A DataFrame with spare capacity at the end for cheap appends.
+
+    Rows live in a preallocated buffer; `frame` is a row-slice view over the
+    filled part, so reading it never copies the table. Appends write into the
+    spare rows in place and only reallocate (with geometric growth) when the
+    buffer is full; Arrow-backed columns then grow by one more chunk instead
+    of being copied. Row labels are positions and never change.
+    """
+
+    def __init__(self, df):
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            df = df.reset_index(drop=True)
+        self._buffer = df
+        self._size = len(self._buffer)
+        self._view = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._buffer)
+
+    @property
+    def frame(self):
+        """Read-only view of the filled rows (no copy)."""
+        if self._view is None:
+            self._view = self._buffer.iloc[: self._size]
+        return self._view
+
+    def conform(self, rows):
+        """Cast `rows` to the table's dtypes (see `core.schema.conform`)."""
+        rows = conform(self._buffer, rows)
+        # New categories are added to the buffer, so the view is rebuilt
+        self._view = None
+        return rows
+
+    def append(self, rows):
+        """Append the `rows` DataFrame and return the appended rows."""
+        if rows.empty:
+            return rows
+        start = self._size
+        if self._size == 0:
+            # An empty table has no dtypes yet; adopt those of the first rows
+            self._buffer = rows.reset_index(drop=True)
+        else:
+            rows = conform(self._buffer, rows)
+            if start + len(rows) > self.capacity:
+                self._grow(start + len(rows))
+            self._write_tail(start, rows)
+        self._size = start + len(rows)
+        self._view = None
+        return self.frame.iloc[start:]
+
+    def write(self, positions, rows):
+        """Overwrite the rows at `positions` with the values of `rows`."""
+        rows = conform(self._buffer, rows)
+        self._write(np.asarray(positions), rows)
+        self._view = None
+
+    def set(self, label, values):
+        """Set `values` (column -> value) on row `label`."""
+        for column, value in values.items():
+            try:
+                self._buffer.at[label, column] = value
+            except ValueError:
+                self._own(column)
+                self._buffer.at[label, column] = value
+        self._view = None
+
+    def _write(self, positions, rows):
+        for column in rows.columns:
+            if column not in self._buffer.columns:
+                continue
+            # Column-wise positional writes keep each column's dtype
+            loc = self._buffer.columns.get_loc(column)
+            try:
+                self._buffer.iloc[positions, loc] = rows[column].to_numpy()
+            except ValueError:
+                self._own(column)
+                self._buffer.iloc[positions, loc] = rows[column].to_numpy()
+
+    def _own(self, column):
+        # Columns memory-mapped from a shared snapshot are read-only; the first
+        # write to one copies just that column into this process
+        loc = self._buffer.columns.get_loc(column)
+        self._buffer.isetitem(loc, self._buffer[column].copy())
+
+    def _write_tail(self, start, rows):
+        stop = start + len(rows)
+        for column in rows.columns:
+            if column not in self._buffer.columns:
+                continue
+            loc = self._buffer.columns.get_loc(column)
+            current = self._buffer[column].array
+            if isinstance(current, pd.arrays.ArrowExtensionArray):
+                # Arrow arrays are immutable and pandas rewrites the whole
+                # column on setitem; splice chunks instead (zero-copy)
+                self._buffer.isetitem(
+                    loc, _splice_arrow(current, start, stop, rows[column].array)
+                )
+            else:
+                self._buffer.iloc[start:stop, loc] = rows[column].to_numpy()
+
+    def _grow(self, needed):
+        capacity = max(
+            needed, int(self.capacity * GROWTH_FACTOR), needed + MIN_SPARE_ROWS
+        )
+        spare = capacity - self._size
+        columns = {}
+        for column in self._buffer.columns:
+            filled = self._buffer[column].iloc[: self._size]
+            if isinstance(filled.array, pd.arrays.ArrowExtensionArray):
+                # One more chunk; the filled chunks (possibly memory-mapped
+                # from a shared snapshot) are kept, not copied
+                columns[column] = pd.Series(_pad_arrow(filled.array, spare))
+            else:
+                # Pad with copies of an existing value so the column keeps its
+                # dtype; the padding is never visible through `frame`
+                padding = filled.iloc[np.zeros(spare, dtype=int)]
+                columns[column] = pd.concat([filled, padding], ignore_index=True)
+        self._buffer = pd.DataFrame(columns)
+
+
+def _pad_arrow(array, rows):
+    """Return `array` followed by `rows` null rows, sharing its chunks."""
+    chunked = array.__arrow_array__()
+    padding = pa.nulls(rows, type=chunked.type)
+    return type(array)(pa.chunked_array(chunked.chunks + [padding], type=chunked.type))
+
+
+def _splice_arrow(array, start, stop, values):
+    """Return `array` with rows [start, stop) replaced by `values`."""
+    chunked = array.__arrow_array__()
+    new = pa.chunked_array(
+        [
+            pa.array(
+                np.asarray(values, dtype=object), type=chunked.type, from_pandas=True
+            )
+        ]
+    )
+    head = chunked.slice(0, start).chunks
+    if len(head) > MAX_CHUNKS:
+        # Keep the large first chunk and merge only the small appended ones
+        head = [head[0], pa.concat_arrays(head[1:])]
+    chunks = head + new.chunks + chunked.slice(stop).chunks
+    return type(array)(pa.chunked_array(chunks, type=chunked.type))
@@ -0,0 +1,236 @@
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import streamlit as st
+
+from core.cache import get_store
+from core.repository import get_repository
+from core.schema import APPOINTMENTS, PATIENTS, normalize_record
+
+# Failures kept for display; older ones are dropped
+MAX_FAILURES = 50
+
+# Queued calls sent per batch, or concurrently when the backend has no batches
+MAX_BATCH = 100
+MAX_CONCURRENCY = 4
+
+SCHEMAS = {"patients": PATIENTS, "appointments": APPOINTMENTS}
+
+
+def _plain(value):
+    # numpy scalars from DataFrame rows are not JSON serializable
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class Mutation:
+    """One pending webhook call and the local edit it stands for."""
+
+    def __init__(self, endpoint, table, key, payload, values, previous):
+        self.endpoint = endpoint
+        self.table = table
+        self.key = key
+        self.payload = {field: _plain(value) for field, value in payload.items()}
+        self.values = dict(values)
+        # Values before the first optimistic edit, restored on failure
+        self.previous = dict(previous)
+
+
+class WriteBehindQueue:
+    """Apply edits locally at once and store them from a worker thread.
+
+    `submit` writes the new values into the shared store (so the click
+    returns immediately) and queues the webhook call. Pending calls are keyed
+    by `(endpoint, key)`: a new edit to a row that is still queued is merged
+    into it, so e.g. several payment edits are sent as one. The worker sends
+    whatever is queued oldest first, as one batch when the repository
+    supports it (e.g. n8n's batch webhook) or a few at a time otherwise. It
+    applies the server's values when no newer edit of the row is pending, and
+    on failure restores the previous values and records the error in
+    `failures`. Until then the store reapplies the edit over any rows a
+    refresh installs, which the server may have sent before it got the call.
+    """
+
+    def __init__(self, repository, store):
+        self.repository = repository
+        self.store = store
+        self.pending = OrderedDict()
+        # (sequence, key, endpoint, message) of failed calls, newest last
+        self.failures = deque(maxlen=MAX_FAILURES)
+        # Calls sent by the worker and not answered yet
+        self.in_flight = 0
+        self._sent = []
+        self._sequence = itertools.count(1)
+        self._cond = threading.Condition()
+        self._worker = None
+        store.overlays.append(self.unconfirmed)
+
+    def submit(self, endpoint, table, key, payload, values):
+        """Apply `values` to row `key` of `table` and queue `payload`."""
+        label = self.store.locate(table, key)
+        if label is None:
+            raise KeyError(key)
+        previous = self.store.update(table, label, values)
+        with self._cond:
+            mutation = self.pending.pop((endpoint, key), None)
+            if mutation is None:
+                mutation = Mutation(endpoint, table, key, payload, values, previous)
+            else:
+                mutation.payload.update(
+                    {field: _plain(value) for field, value in payload.items()}
+                )
+                mutation.values.update(values)
+                for column, value in previous.items():
+                    mutation.previous.setdefault(column, value)
+            # Re-queued at the end so calls go out in the order of the edits
+            self.pending[(endpoint, key)] = mutation
+            self._start()
+            self._cond.notify()
+
+    def is_pending(self, key):
+        with self._cond:
+            return any(queued == key for _, queued in self.pending)
+
+    def unconfirmed(self):
+        """`(table, key, values)` of the edits the server has not confirmed.
+
+        Oldest first, so a later edit of a row wins when they are applied in
+        order; the store reapplies them over every load (`DataStore.overlays`).
+        """
+        with self._cond:
+            return [
+                (mutation.table, mutation.key, dict(mutation.values))
+                for mutation in self._sent + list(self.pending.values())
+            ]
+
+    def backlog(self):
+        """Number of edits not yet confirmed by the server."""
+        with self._cond:
+            return len(self.pending) + self.in_flight
+
+    def _start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="write-behind", daemon=True
+            )
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.pending:
+                    self._cond.wait()
+                batch = self._take()
+                self.in_flight = len(batch)
+                self._sent = batch
+            try:
+                if self.repository.batches and len(batch) > 1:
+                    self._send_batch(batch)
+                elif len(batch) == 1:
+                    self._send(batch[0])
+                else:
+                    with ThreadPoolExecutor(MAX_CONCURRENCY) as pool:
+                        list(pool.map(self._send, batch))
+            finally:
+                with self._cond:
+                    self.in_flight = 0
+                    self._sent = []
+
+    def _take(self):
+        """Pop up to `MAX_BATCH` queued calls, oldest first, one per row.
+
+        Later calls for a row already in the batch stay queued, so calls for
+        the same row are never sent concurrently or out of order.
+        """
+        batch, keys = [], set()
+        for endpoint, key in list(self.pending):
+            if len(batch) == MAX_BATCH:
+                break
+            if key in keys:
+                continue
+            keys.add(key)
+            batch.append(self.pending.pop((endpoint, key)))
+        return batch
+
+    def _send(self, mutation):
+        try:
+            record = self.repository.call(mutation.endpoint, mutation.payload)
+        except Exception as error:
+            # Anything that stops the call (network, HTTP status, a payload
+            # that cannot be encoded) fails the edit; the worker keeps going
+            self._fail(mutation, error)
+        else:
+            self._reconcile(mutation, record)
+        self._answered(mutation)
+
+    def _send_batch(self, batch):
+        """Send `batch` in one round trip and reconcile each returned row."""
+        try:
+            records = self.repository.call_batch(
+                [(mutation.endpoint, mutation.payload) for mutation in batch]
+            )
+        except Exception as error:
+            for mutation in batch:
+                self._fail(mutation, error)
+                self._answered(mutation)
+            return
+        for mutation, record in zip(batch, records):
+            self._reconcile(mutation, record)
+            self._answered(mutation)
+
+    def _answered(self, mutation):
+        # Reconciled or rolled back: loads no longer need the local edit
+        with self._cond:
+            if mutation in self._sent:
+                self._sent.remove(mutation)
+
+    def _reconcile(self, mutation, body):
+        if not isinstance(body, dict):
+            # Nothing to reconcile against; keep the optimistic values
+            return
+        record = normalize_record(body, SCHEMAS[mutation.table])
+        confirmed = {
+            column: record[column] for column in mutation.values if column in record
+        }
+        if not confirmed or self.is_pending(mutation.key):
+            # A newer edit of this row is queued and will be reconciled itself
+            return
+        label = self.store.locate(mutation.table, mutation.key)
+        if label is not None:
+            self.store.update(
+                mutation.table, label, confirmed, expected=mutation.values
+            )
+
+    def _fail(self, mutation, error):
+        label = self.store.locate(mutation.table, mutation.key)
+        if label is not None and not self.is_pending(mutation.key):
+            # Only undo the edit if nothing has overwritten it since
+            self.store.update(
+                mutation.table, label, mutation.previous, expected=mutation.values
+            )
+        with self._cond:
+            self.failures.append(
+                (next(self._sequence), mutation.key, mutation.endpoint, str(error))
+            )
+
+
+def diff_edits(original, edited, columns):
+    """Changed `columns` of `edited` against `original` (same index).
+
+    Returns `{label: {column: new value}}` with plain Python values, for the
+    rows where at least one of `columns` differs.
+    """
+    changes = {}
+    for column in columns:
+        before, after = original[column], edited[column]
+        same = (before == after).fillna(False) | (before.isna() & after.isna())
+        for label, value in after[~same.astype(bool)].items():
+            changes.setdefault(label, {})[column] = _plain(value)
+    return changes
+
+
+@st.cache_resource
+def get_writeback():
+    return WriteBehindQueue(get_repository(), get_store())
@@ -0,0 +1,42 @@
+import streamlit as st
+
+from core.cache import get_store, wait_for_history
+from core.metrics import get_metrics
+from core.repository import get_repository
+
+# Segment labels shown to the user -> column the cohorts are split by
+SEGMENTS = {
+    "Mês da primeira consulta": None,
+    "Convênio": "Insurance",
+    "Origem do paciente": "Referral Source",
+}
+
+st.title("Coortes de Pacientes")
+
+wait_for_history()
+
+if st.session_state.appointments.empty:
+    st.warning("Nenhum dado de consulta disponível para calcular as coortes.")
+else:
+    segment = st.selectbox("Agrupar por", list(SEGMENTS))
+    by = SEGMENTS[segment]
+
+    # The cohort index is kept up to date on every write (or aggregated in
+    # SQL on the database backends); the matrices are memoized on the data
+    # version, so widget-only reruns are free
+    store = get_store()
+    repository = get_repository()
+    with get_metrics().section("cohorts/matrices"):
+        retention = store.cached(
+            ("cohort_retention", by), lambda: repository.cohort_retention(by)
+        )
+        ltv = store.cached(("cohort_ltv", by), lambda: repository.cohort_ltv(by))
+
+    st.subheader("Retenção (%)")
+    st.caption("Percentual de pacientes com consulta N meses após a primeira consulta.")
+    st.dataframe(retention, use_container_width=True)
+
+    st.subheader("LTV acumulado por paciente (R$)")
+    if by is not None:
+        st.line_chart(ltv.T)
+    st.dataframe(ltv, use_container_width=True)
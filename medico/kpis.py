@@ -1,123 +1,84 @@
+from datetime import date, timedelta
+
 import streamlit as st
-import pandas as pd
+
+from core.cache import get_store, wait_for_history
+from core.metrics import get_metrics
+from core.repository import get_repository
 
 # Title of the page
 st.title("KPIs da Clínica")
 
-# Ensure the DataFrame 'Date' column is in datetime format
-if not st.session_state.appointments.empty:
-    st.session_state.appointments["Date"] = pd.to_datetime(
-        st.session_state.appointments["Date"]
-    )
-    # Extract year and month for grouping
-    st.session_state.appointments["Year"] = st.session_state.appointments[
-        "Date"
-    ].dt.year
-    st.session_state.appointments["Month"] = st.session_state.appointments[
-        "Date"
-    ].dt.month
-
-    # Assume 'Insurance' column indicates whether it's insurance (not 'Private')
-    st.session_state.appointments["Is Insurance"] = (
-        st.session_state.appointments["Insurance"] != "Private"
-    )
-
-    # Ensure payments status is a float for calculations
-    st.session_state.appointments["Payment Status"] = st.session_state.appointments[
-        "Payment Status"
-    ].astype(float)
-
-# Function definitions for KPI calculations
-
-
-def calculate_average_ticket(df, period="annual"):
-    """Calculate the average ticket (mean payment per appointment)."""
-    if df.empty:
-        return pd.Series()
-    if period == "annual":
-        return df.groupby("Year")["Payment Status"].mean().round(2)
-    elif period == "monthly":
-        return df.groupby(["Year", "Month"])["Payment Status"].mean().round(2)
-
-
-def calculate_ltv(df):
-    """Calculate the Lifetime Value (average total payment per patient)."""
-    if df.empty:
-        return 0
-    total_per_patient = df.groupby("Patient ID")["Payment Status"].sum()
-    return total_per_patient.mean().round(2)
-
+wait_for_history()
 
-def calculate_conversion_rate(df, period="annual"):
-    """Calculate the conversion rate (percentage of appointments attended)."""
-    if df.empty:
-        return pd.Series()
-    if period == "annual":
-        return (df.groupby("Year")["Attended"].mean() * 100).round(2)
-    elif period == "monthly":
-        return (df.groupby(["Year", "Month"])["Attended"].mean() * 100).round(2)
-
-
-def calculate_insurance_percentage(df, period="annual"):
-    """Calculate the percentage of appointments via insurance vs private."""
-    if df.empty:
-        return pd.Series()
-    if period == "annual":
-        return (df.groupby("Year")["Is Insurance"].mean() * 100).round(2)
-    elif period == "monthly":
-        return (df.groupby(["Year", "Month"])["Is Insurance"].mean() * 100).round(2)
-
-
-def calculate_no_show_rate(df, period="annual"):
-    """Calculate the no-show rate (percentage of appointments not attended)."""
-    if df.empty:
-        return pd.Series()
-    if period == "annual":
-        return ((1 - df.groupby("Year")["Attended"].mean()) * 100).round(2)
-    elif period == "monthly":
-        return ((1 - df.groupby(["Year", "Month"])["Attended"].mean()) * 100).round(2)
-
-
-def calculate_retention_rate(df):
-    """Calculate the retention rate (percentage of patients with more than one appointment)."""
-    if df.empty:
-        return 0
-    appointments_per_patient = df.groupby("Patient ID").size()
-    retained_patients = (appointments_per_patient > 1).sum()
-    total_patients = len(appointments_per_patient)
-    return (
-        (retained_patients / total_patients * 100).round(2) if total_patients > 0 else 0
-    )
-
-
-# Get the appointments DataFrame from session state
+# Shared, read-only frame: this page never adds or converts its columns
 df_appointments = st.session_state.appointments
 
+# Rolling windows end today and include it
+ROLLING_DAYS = {
+    "Hoje": 1,
+    "Últimos 7 dias": 7,
+    "Últimos 30 dias": 30,
+    "Últimos 90 dias": 90,
+}
+
 # User interface to select the period
-period = st.selectbox("Selecione o período", ["Anual", "Mensal"])
+period = st.selectbox(
+    "Selecione o período",
+    ["Anual", "Mensal", *ROLLING_DAYS, "Período personalizado"],
+)
+date_range = None
+if period in ROLLING_DAYS:
+    today = date.today()
+    date_range = (today - timedelta(days=ROLLING_DAYS[period] - 1), today)
+elif period == "Período personalizado":
+    today = date.today()
+    selected = st.date_input(
+        "Intervalo de datas",
+        value=(today - timedelta(days=29), today),
+        format="DD/MM/YYYY",
+    )
+    # The widget returns a single date while the range is being picked
+    if isinstance(selected, tuple) and len(selected) == 2:
+        date_range = selected
+    else:
+        date_range = (selected[0], selected[0]) if selected else (today, today)
 
 # Check if there is data to process
 if df_appointments.empty:
     st.warning("Nenhum dado de consulta disponível para calcular os KPIs.")
 else:
-    # Calculate KPIs based on selected period
-    if period == "Anual":
-        average_ticket = calculate_average_ticket(df_appointments, "annual")
-        conversion_rate = calculate_conversion_rate(df_appointments, "annual")
-        insurance_percentage = calculate_insurance_percentage(df_appointments, "annual")
-        no_show_rate = calculate_no_show_rate(df_appointments, "annual")
-        ltv = calculate_ltv(df_appointments)
-        retention_rate = calculate_retention_rate(df_appointments)
-
-    elif period == "Mensal":
-        average_ticket = calculate_average_ticket(df_appointments, "monthly")
-        conversion_rate = calculate_conversion_rate(df_appointments, "monthly")
-        insurance_percentage = calculate_insurance_percentage(
-            df_appointments, "monthly"
+    # Period KPIs come from the monthly rollup the store keeps up to date on
+    # every write, date ranges from the sorted date index (or a SQL aggregate
+    # on the database backends), memoized on the session's data version so
+    # widget-only reruns are free and every figure comes from the same data
+    store = get_store()
+    repository = get_repository()
+    version = st.session_state.data_version
+    with get_metrics().section("kpis/period"):
+        if date_range is not None:
+            start, stop = date_range
+            kpis = store.cached(
+                ("range_kpis", start, stop),
+                lambda: repository.range_kpis(start, stop),
+                version,
+            )
+        else:
+            period_key = "annual" if period == "Anual" else "monthly"
+            kpis = store.cached(
+                ("period_kpis", period_key),
+                lambda: repository.period_kpis(period_key),
+                version,
+            )
+    average_ticket = kpis["Ticket Médio"]
+    conversion_rate = kpis["Taxa de Conversão"]
+    insurance_percentage = kpis["Percentual de Convênios"]
+    no_show_rate = kpis["Taxa de Faltas"]
+    with get_metrics().section("kpis/patients"):
+        ltv = store.cached("ltv", repository.lifetime_value, version)
+        retention_rate = store.cached(
+            "retention_rate", repository.retention_rate, version
         )
-        no_show_rate = calculate_no_show_rate(df_appointments, "monthly")
-        ltv = calculate_ltv(df_appointments)
-        retention_rate = calculate_retention_rate(df_appointments)
 
     # Display KPIs in a professional layout
     st.subheader("KPIs da Clínica")
@@ -0,0 +1,76 @@
+import json
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from core.cache import get_store
+from core.client import WebhookClient
+from core.metrics import get_metrics
+from core.repository import get_repository
+from core.schema import memory_report
+
+
+def performance_page():
+    st.title("Performance")
+    metrics = get_metrics()
+
+    # Switches recording for the whole process, not just this session
+    metrics.enabled = st.toggle(
+        "Record page and section timings", value=metrics.enabled
+    )
+    if st.button("Reset timings"):
+        metrics.reset()
+
+    client = getattr(get_repository(), "client", None)
+    http = client.histograms() if isinstance(client, WebhookClient) else {}
+
+    st.header("Timings")
+    report = metrics.report(http)
+    if report.empty:
+        st.info("Nothing recorded yet.")
+    else:
+        for kind, title in (
+            ("page", "Script runs per page"),
+            ("section", "Page sections"),
+            ("http", "Webhook latency"),
+        ):
+            rows = report[report["Kind"] == kind].drop(columns="Kind")
+            if not rows.empty:
+                st.subheader(title)
+                st.dataframe(rows, hide_index=True)
+
+        series = {**metrics.histograms(), **http}
+        selected = st.selectbox(
+            "Latency histogram",
+            sorted(series),
+            format_func=lambda key: f"{key[0]}: {key[1]}",
+        )
+        buckets = series[selected].buckets()
+        frame = pd.DataFrame({"Bucket": list(buckets), "Calls": list(buckets.values())})
+        # Keep the buckets in latency order rather than alphabetical
+        st.altair_chart(
+            alt.Chart(frame).mark_bar().encode(x=alt.X("Bucket", sort=None), y="Calls"),
+            use_container_width=True,
+        )
+
+    st.header("Memory")
+    store = get_store()
+    footprint = memory_report(
+        {"patients": store.patients, "appointments": store.appointments}
+    )
+    st.write(footprint.groupby("Table")["Bytes"].sum().div(1024**2).round(2))
+    st.dataframe(footprint, hide_index=True)
+
+    export = metrics.export(http)
+    export["memory"] = footprint.to_dict("records")
+    st.download_button(
+        "Export JSON",
+        json.dumps(export, indent=2),
+        file_name="performance.json",
+        mime="application/json",
+    )
+
+
+if __name__ == "__main__":
+    performance_page()
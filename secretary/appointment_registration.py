@@ -1,47 +1,90 @@
 import streamlit as st
 import pandas as pd
+from datetime import date as Date
 from datetime import datetime
-import requests
 
+from core.cache import get_store, sync_session, wait_for_history
+from core.metrics import get_metrics
+from core.repository import RepositoryError, get_repository
+from core.schedule import schedule_options
+from core.schema import APPOINTMENTS, normalize_records
 
 ### Section 2: Appointment Registration
 st.header("Marcar Consulta")
 
+# Searches, first-appointment checks and new IDs need every patient
+wait_for_history()
+
 # Check if there are registered patients
 if not st.session_state.patients.empty:
-    # Create a list of patients for selection
-    patients_list = st.session_state.patients["Name"].tolist()
-    selected_patient = st.selectbox("Selecione o Paciente", patients_list)
+    # Only the best matches of the search index are sent to the browser,
+    # keyed by Patient ID so homonyms stay apart
+    query = st.text_input("Buscar Paciente", placeholder="Nome, telefone ou e-mail")
+    matches = get_store().search_patients(query) if query else []
+    labels = {
+        match["Patient ID"]: " · ".join(
+            [
+                *(
+                    str(value)
+                    for value in (match["Name"], match["Phone"], match["Email"])
+                    if not pd.isna(value) and str(value)
+                ),
+                f"ID {match['Patient ID']}",
+            ]
+        )
+        for match in matches
+    }
+    patient_id = st.selectbox(
+        "Selecione o Paciente",
+        list(labels),
+        format_func=labels.get,
+        placeholder="Nenhum paciente encontrado" if query else "Digite para buscar",
+    )
+
+    # The date is outside the form so the free times follow it at once. Only
+    # upcoming days are booked (and indexed for conflicts)
+    date = st.date_input(
+        "Data da Consulta", min_value=Date.today(), format="DD/MM/YYYY"
+    )
+    date = pd.to_datetime(date).date()
+    opening, closing, duration = schedule_options()
+    # Times off the slot grid or outside opening hours are typed in instead;
+    # they are still checked against the bookings when submitted
+    other_time = st.toggle("Outro horário")
 
     with st.form("appointment_registration"):
-        date = st.date_input("Data da Consulta")
-        date = pd.to_datetime(date).date()
-        time = st.time_input("Hora da Consulta")
+        if other_time:
+            time = st.time_input("Hora da Consulta", value=None, step=300)
+        else:
+            time = st.selectbox(
+                "Hora da Consulta",
+                get_store().free_slots(date, opening, closing, duration),
+                format_func=lambda slot: slot.strftime("%H:%M"),
+                placeholder="Nenhum horário livre nesta data",
+            )
 
         insurance = st.selectbox(
             "Convênio", ["Unimed", "Bradesco Saúde", "Amil", "Private", "Other"]
         )
         submit_appointment = st.form_submit_button("Marcar Consulta")
 
-    if submit_appointment:
-        # Find the ID of the selected patient
-        patient_id = st.session_state.patients[
-            st.session_state.patients["Name"] == selected_patient
-        ]["Patient ID"].values[0]
+    if submit_appointment and patient_id is None:
+        st.error("Selecione um paciente.")
+    elif submit_appointment and time is None:
+        st.error("Informe o horário." if other_time else "Selecione um horário livre.")
+    elif submit_appointment and not get_store().hold_slot(date, time, duration):
+        # Overlaps a booking, or booked by another session since the page
+        # was drawn
+        st.error("Este horário está ocupado. Escolha outro.")
+    elif submit_appointment:
+        repository = get_repository()
+        store = get_store()
 
-        # Generate a unique ID for the appointment
-        appointment_id = len(st.session_state.appointments) + 1
+        # Never reused, even across sessions or after deletions
+        appointment_id = store.ids.next()
 
         # Check if it is the first appointment
-        if st.session_state.appointments.empty:
-            first_appointment = True
-        else:
-            first_appointment = (
-                st.session_state.appointments[
-                    st.session_state.appointments["Patient ID"] == patient_id
-                ].shape[0]
-                == 0
-            )
+        first_appointment = repository.appointment_count(patient_id) == 0
 
         data = {
             "appointment_id": appointment_id,
@@ -55,38 +98,23 @@ if not st.session_state.patients.empty:
             "canceled": False,
         }
 
-        response = requests.post(
-            st.secrets["n8n"]["post_appointment_url"],
-            data=data,
-        )
+        response_data = None
+        try:
+            with get_metrics().section("registration/appointment"):
+                response_data = repository.call("post_appointment_url", data)
+            if response_data:
+                # Ensure correct data types
+                new_appointment = normalize_records([response_data], APPOINTMENTS)
+                store.append("appointments", new_appointment)
+        except RepositoryError:
+            response_data = None
+        finally:
+            # Booked slots stay held until the other processes load them
+            store.release_slot(date, time, booked=bool(response_data))
         # Load response return data and update session state
-        if response.status_code == 200:
-            response_data = response.json()
+        if response_data:
             st.write(response_data)
-            # Ensure correct data types
-            response_data["Date"] = pd.to_datetime(
-                response_data["Date"], format="%Y-%m-%d"
-            ).date()
-            response_data["Time"] = pd.to_datetime(
-                response_data["Time"], format="%H:%M:%S"
-            ).time()
-            response_data["Payment Status"] = float(response_data["Payment Status"])
-            response_data["Attended"] = (
-                False if response_data["Attended"] == "false" else True
-            )
-            response_data["First Appointment"] = (
-                False if response_data["First Appointment"] == "false" else True
-            )
-
-            response_data["Canceled"] = (
-                False if response_data["Canceled"] == "false" else True
-            )
-            response_data["Insurance"] = str(response_data["Insurance"])
-            response_data["row_number"] = int(response_data["row_number"])
-            new_appointment = pd.DataFrame([response_data])
-            st.session_state.appointments = pd.concat(
-                [st.session_state.appointments, new_appointment], ignore_index=True
-            )
+            sync_session()
             st.success(
                 f"Appointment successfully scheduled! Appointment ID: {response_data['Appointment ID']}"
             )
@@ -1,140 +1,251 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-import requests
 
+from core.cache import get_store, sync_session
+from core.metrics import get_metrics
+from core.repository import get_repository
+from core.schema import as_time
+from core.writeback import diff_edits, get_writeback
+
+
+# Pending webhook calls and failed writes, refreshed without a full rerun
+@st.fragment(run_every="2s")
+def sync_status():
+    queue = get_writeback()
+    failures = list(queue.failures)
+    latest = failures[-1][0] if failures else 0
+    # Only failures that happen while this session is open are reported
+    seen = st.session_state.setdefault("writeback_seen", latest)
+    backlog = queue.backlog()
+    if backlog:
+        st.caption(f"Sincronizando {backlog} alteração(ões) com o servidor...")
+    new = [failure for failure in failures if failure[0] > seen]
+    if not new:
+        return
+    if st.session_state.get("data_version") != get_store().version:
+        # Failed edits were rolled back; redraw the page with current values
+        st.rerun()
+    for _, key, endpoint, message in new:
+        st.error(f"Falha ao salvar a consulta {key} ({endpoint}): {message}")
+    if st.button("OK", key="writeback_dismiss"):
+        st.session_state.writeback_seen = latest
+        st.rerun(scope="fragment")
+
+
+# Columns the secretary can change in bulk mode
+BULK_COLUMNS = ["Attended", "Canceled", "Payment Status"]
+
+
+def bulk_calls(row, changed):
+    """Webhook calls (endpoint, values) for the `changed` columns of `row`."""
+    calls = []
+    if "Attended" in changed or "Canceled" in changed:
+        if row["Canceled"]:
+            calls.append(("post_canceled_url", {"Canceled": True, "Attended": False}))
+        else:
+            calls.append(
+                (
+                    "post_attended_url",
+                    {"Attended": bool(row["Attended"]), "Canceled": False},
+                )
+            )
+    if "Payment Status" in changed:
+        calls.append(
+            ("post_payment_url", {"Payment Status": changed["Payment Status"]})
+        )
+    return calls
+
+
+# Editable grid of today's appointments; only the edited cells are submitted
+def bulk_edit(todays_appointments, patient_rows, patient_names):
+    grid = todays_appointments.set_index("Appointment ID")[
+        ["Time", "Patient ID", "Insurance"] + BULK_COLUMNS
+    ]
+    grid.insert(
+        2,
+        "Name",
+        [
+            patient_names.get(patient_rows.get(patient_id), "Unknown Patient")
+            for patient_id in grid["Patient ID"]
+        ],
+    )
+    # A form so ticking boxes does not rerun the page for every cell
+    with st.form("bulk_edit"):
+        edited = st.data_editor(
+            grid,
+            disabled=["Time", "Patient ID", "Name", "Insurance"],
+            column_config={
+                "Time": st.column_config.TimeColumn("Hora"),
+                "Name": "Nome",
+                "Insurance": "Convênio",
+                "Attended": st.column_config.CheckboxColumn("Realizada"),
+                "Canceled": st.column_config.CheckboxColumn("Cancelada"),
+                "Payment Status": st.column_config.NumberColumn(
+                    "Pagamento (R$)", min_value=0.0, format="%.2f"
+                ),
+            },
+            use_container_width=True,
+        )
+        submitted = st.form_submit_button("Salvar alterações")
+    if not submitted:
+        return
+    changes = diff_edits(grid, edited, BULK_COLUMNS)
+    if not changes:
+        st.info("Nenhuma alteração para salvar.")
+        return
+    # Every edit is applied locally now; the queue sends them together
+    queue = get_writeback()
+    for appointment_id, changed in changes.items():
+        for endpoint, values in bulk_calls(edited.loc[appointment_id], changed):
+            queue.submit(
+                endpoint,
+                "appointments",
+                appointment_id,
+                {"Appointment ID": appointment_id, **values},
+                values,
+            )
+    sync_session()
+    st.success(f"{len(changes)} consulta(s) atualizada(s).")
 
-### Section 3: Monitoring Today's Appointments
-st.header("Todas as Consultas de Hoje")
 
-# Ensure 'Date' is in datetime64[ns] format (don't convert to .dt.date permanently)
-if not st.session_state.appointments.empty:
-    # Convert 'Date' to datetime64[ns] if it isn't already
-    st.session_state.appointments["Date"] = pd.to_datetime(
-        st.session_state.appointments["Date"]
+# Cards rendered per page of the day's list
+PAGE_SIZE = 10
+
+
+def submit_edit(appointment_id, endpoint, values, message):
+    # Button callback: runs before the card's fragment reruns, so the card
+    # already shows the new values
+    get_writeback().submit(
+        endpoint,
+        "appointments",
+        appointment_id,
+        {"Appointment ID": appointment_id, **values},
+        values,
     )
+    sync_session()
+    st.session_state[f"message_{appointment_id}"] = message
 
-today = datetime.now().date()
-# Use .dt.date only for comparison, not for modifying the column
-todays_appointments = st.session_state.appointments[
-    st.session_state.appointments["Date"].dt.date == today
-]
 
-if not todays_appointments.empty:
-    # Convert 'Time' to datetime.time for sorting/display
-    todays_appointments["Time"] = pd.to_datetime(
-        todays_appointments["Time"], format="%H:%M:%S"
-    ).dt.time
-    todays_appointments = todays_appointments.sort_values(by="Time")
-    st.write(f"Consultas de hoje ({today}):")
-    for index, appointment in todays_appointments.iterrows():
-        # Retrieve the patient's name by their ID, with a fallback
-        patient_match = st.session_state.patients[
-            st.session_state.patients["Patient ID"] == appointment["Patient ID"]
-        ]
-        st.write(
-            f"Appointment ID: {appointment['Appointment ID']}, Patient ID: {appointment['Patient ID']}"
+def save_payment(appointment_id):
+    payment = st.session_state[f"payment_{appointment_id}"]
+    # Repeated edits before the call goes out are sent as one
+    submit_edit(
+        appointment_id,
+        "post_payment_url",
+        {"Payment Status": payment},
+        f"Payment for Appointment ID {appointment_id} updated to R${payment:.2f}!",
+    )
+
+
+# One appointment; a click reruns only this card, not the whole page
+@st.fragment
+def appointment_card(appointment_id, patient_id, patient_name, time):
+    store = get_store()
+    label = store.locate("appointments", appointment_id)
+    if label is None:
+        return
+    appointment = store.appointments.loc[label]
+    st.write(f"Appointment ID: {appointment_id}, Patient ID: {patient_id}")
+    st.subheader(f"Hora: {time}")
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.write(f"Nome: {patient_name}")
+        # Applied locally at once; the webhook call runs in the background
+        st.button(
+            "Consulta Realizada",
+            key=f"attended_{appointment_id}",
+            on_click=submit_edit,
+            args=(
+                appointment_id,
+                "post_attended_url",
+                {"Attended": True, "Canceled": False},
+                f"Appointment ID {appointment_id} marked as attended successfully!",
+            ),
         )
-        if not patient_match.empty:
-            patient_name = patient_match["Name"].values[0]
-        else:
-            patient_name = "Unknown Patient"
 
-        st.subheader(f"Hora: {appointment['Time']}")
-        col1, col2, col3, col4 = st.columns(4)
+    with col2:
+        st.button(
+            "Cancelar Consulta",
+            key=f"cancel_{appointment_id}",
+            on_click=submit_edit,
+            args=(
+                appointment_id,
+                "post_canceled_url",
+                {"Canceled": True, "Attended": False},
+                f"Appointment ID {appointment_id} canceled successfully!",
+            ),
+        )
 
-        with col1:
-            st.write(f"Nome: {patient_name}")
-            if st.button(
-                "Consulta Realizada", key=f"attended_{appointment['Appointment ID']}"
-            ):
-                st.session_state.appointments.at[index, "Attended"] = True
-                st.session_state.appointments.at[index, "Canceled"] = False
-                data = {
-                    "Appointment ID": appointment["Appointment ID"],
-                    "Attended": True,
-                    "Canceled": False,
-                }
-                url = st.secrets["n8n"]["post_attended_url"]
-                response = requests.post(url, json=data)
-                response_data = response.json()
-                # Ensure correct data types
-                response_data["Attended"] = (
-                    False if response_data["Attended"] == "false" else True
-                )
-                response_data["Canceled"] = (
-                    False if response_data["Canceled"] == "false" else True
-                )
-                # Update the appointment status in session state
-                st.session_state.appointments.at[index, "Attended"] = response_data[
-                    "Attended"
-                ]
-                st.session_state.appointments.at[index, "Canceled"] = response_data[
-                    "Canceled"
-                ]
-                st.success(
-                    f"Appointment ID {appointment['Appointment ID']} marked as attended successfully!"
-                )
+    with col3:
+        st.write(f"Convênio: {appointment['Insurance']}")
 
-        with col2:
-            if st.button(
-                "Cancelar Consulta", key=f"cancel_{appointment['Appointment ID']}"
-            ):
-                data = {
-                    "Appointment ID": appointment["Appointment ID"],
-                    "Canceled": True,
-                    "Attended": False,
-                }
-                url = st.secrets["n8n"]["post_canceled_url"]
-                response = requests.post(url, json=data)
-                response_data = response.json()
-                # Ensure correct data types
-                response_data["Canceled"] = (
-                    False if response_data["Canceled"] == "false" else True
-                )
-                response_data["Attended"] = (
-                    False if response_data["Attended"] == "false" else True
-                )
-                # Update the appointment status in session state
-                st.session_state.appointments.at[index, "Canceled"] = response_data[
-                    "Canceled"
-                ]
-                st.session_state.appointments.at[index, "Attended"] = response_data[
-                    "Attended"
-                ]
-                st.session_state.appointments.at[index, "Canceled"] = True
-                st.success(
-                    f"Appointment ID {appointment['Appointment ID']} canceled successfully!"
-                )
+    with col4:
+        st.number_input(
+            "Pagamento (R$)",
+            min_value=0.0,
+            value=float(appointment["Payment Status"]),
+            key=f"payment_{appointment_id}",
+        )
+        st.button(
+            "Salvar Pagamento",
+            key=f"save_payment_{appointment_id}",
+            on_click=save_payment,
+            args=(appointment_id,),
+        )
 
-        with col3:
-            st.write(f"Convênio: {appointment['Insurance']}")
+    message = st.session_state.pop(f"message_{appointment_id}", None)
+    if message:
+        st.success(message)
 
-        with col4:
-            payment = st.number_input(
-                "Pagamento (R$)",
-                min_value=0.0,
-                value=float(appointment["Payment Status"]),
-                key=f"payment_{appointment['Appointment ID']}",
-            )
-            if st.button(
-                "Salvar Pagamento", key=f"save_payment_{appointment['Appointment ID']}"
-            ):
-                # st.session_state.appointments.at[index, "Payment Status"] = payment
-                data = {
-                    "Appointment ID": appointment["Appointment ID"],
-                    "Payment Status": payment,
-                }
-                url = st.secrets["n8n"]["post_payment_url"]
-                response = requests.post(url, json=data)
-                response_data = response.json()
-                # Assuming the API returns the updated payment status
-                st.session_state.appointments.at[index, "Payment Status"] = float(
-                    response_data.get("Payment Status", payment)
+
+def select_today(today):
+    # The day's rows come from the repository (an indexed range query on the
+    # database backends); 'Time' is converted for sorting/display on a copy
+    todays_appointments = get_repository().appointments_between(today, today)
+    return todays_appointments.assign(
+        Time=as_time(todays_appointments["Time"])
+    ).sort_values(by="Time")
+
+
+### Section 3: Monitoring Today's Appointments
+st.header("Todas as Consultas de Hoje")
+sync_status()
+
+today = datetime.now().date()
+metrics = get_metrics()
+# Queried once per data version and shared by every session
+with metrics.section("appointments/today"):
+    todays_appointments = get_store().cached(
+        ("today", today), lambda: select_today(today), st.session_state.data_version
+    )
+
+if not todays_appointments.empty:
+    st.write(f"Consultas de hoje ({today}):")
+    # O(1) name lookups through the shared Patient ID index
+    patient_rows = get_store().index.patient_rows
+    patient_names = st.session_state.patients["Name"]
+    if st.toggle("Edição em lote", key="bulk_mode"):
+        with metrics.section("appointments/bulk"):
+            bulk_edit(todays_appointments, patient_rows, patient_names)
+    else:
+        pages = -(-len(todays_appointments) // PAGE_SIZE)
+        page = 1
+        if pages > 1:
+            page = st.number_input("Página", min_value=1, max_value=pages, value=1)
+        start = (page - 1) * PAGE_SIZE
+        with metrics.section("appointments/cards"):
+            for appointment_id, patient_id, time in zip(
+                *(
+                    todays_appointments[column].iloc[start : start + PAGE_SIZE].tolist()
+                    for column in ("Appointment ID", "Patient ID", "Time")
                 )
-                st.success(
-                    f"Payment for Appointment ID {appointment['Appointment ID']} updated to R${payment:.2f}!"
+            ):
+                # Retrieve the patient's name by their ID, with a fallback
+                patient_name = patient_names.get(
+                    patient_rows.get(patient_id), "Unknown Patient"
                 )
-        st.write("---")
+                appointment_card(appointment_id, patient_id, patient_name, time)
+                st.write("---")
 else:
     st.write("No appointments scheduled for today.")
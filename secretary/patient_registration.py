@@ -1,7 +1,10 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-import requests
+
+from core.cache import get_store, sync_session
+from core.metrics import get_metrics
+from core.repository import RepositoryError, get_repository
+from core.schema import PATIENTS, normalize_records
 
 # Translation mappings
 referral_map = {
@@ -38,23 +41,18 @@ if submit_patient:
         "patient_email": patient_email,
         "referral_source": referral_source_en,
     }
-    response = requests.post(
-        st.secrets["n8n"]["post_patient_url"],
-        data=data,
-    )
-    if response.status_code == 200:
-        response_data = response.json()
+    try:
+        with get_metrics().section("registration/patient"):
+            response_data = get_repository().call("post_patient_url", data)
+    except RepositoryError:
+        response_data = None
+    if response_data:
         st.write(response_data)
         # Ensure correct data types
-        response_data["Patient ID"] = str(response_data["Patient ID"])
-        response_data["Name"] = str(response_data["Name"])
-        response_data["Phone"] = str(response_data["Phone"])
-        response_data["Email"] = str(response_data["Email"])
-        response_data["Referral Source"] = str(response_data["Referral Source"])
-        new_patient = pd.DataFrame([response_data])
-        st.session_state.patients = pd.concat(
-            [st.session_state.patients, new_patient], ignore_index=True
-        )
+        new_patient = normalize_records([response_data], PATIENTS)
+        # Publish to the shared table so every session sees the new patient
+        get_store().append("patients", new_patient)
+        sync_session()
         st.success(
             f"Patient successfully registered! Patient ID: {response_data['Patient ID']}"
         )
@@ -1,5 +1,7 @@
 import streamlit as st
 
+from core.refresh import MAX_INTERVAL, get_refresher
+
 
 def settings_page():
     st.title("Settings")
@@ -10,12 +12,29 @@ def settings_page():
 
     st.header("Application Settings")
     notifications = st.checkbox("Enable Notifications", value=True)
-    data_refresh_rate = st.slider(
-        "Data Refresh Rate (seconds)", min_value=1, max_value=60, value=10
-    )
+    refresher = get_refresher()
+    # The refresh rate applies to the whole server, so only an admin sets it
+    data_refresh_rate = None
+    if st.session_state.get("role") == "Admin":
+        # Keyed, so the widget survives its own Save instead of resetting
+        st.session_state.setdefault(
+            "refresh_interval", min(refresher.interval or 0, MAX_INTERVAL)
+        )
+        data_refresh_rate = st.slider(
+            "Data Refresh Rate (seconds)",
+            min_value=0,
+            max_value=MAX_INTERVAL,
+            step=10,
+            key="refresh_interval",
+            help="0 turns background refreshing off.",
+        )
 
     st.header("Save Settings")
     if st.button("Save"):
+        if data_refresh_rate is not None:
+            # One poll serves every session. Other sessions pick the new rate
+            # up on their next rerun.
+            refresher.set_interval(data_refresh_rate)
         st.success("Settings saved successfully!")
         # Here you can add logic to save these settings to a file or database
 
@@ -0,0 +1,242 @@
+-- Schema and RPC functions used by the "supabase" storage backend
+-- (core/supabase_repository.py). Run once in the Supabase SQL editor.
+
+create table if not exists patients (
+    row_number bigint generated always as identity primary key,
+    "Patient ID" text not null unique,
+    "Name" text,
+    "Phone" text,
+    "Email" text,
+    "Referral Source" text,
+    "Modified At" timestamptz not null default now()
+);
+
+create table if not exists appointments (
+    row_number bigint generated always as identity primary key,
+    "Appointment ID" bigint generated by default as identity unique,
+    "Patient ID" text not null,
+    "Date" date not null,
+    "Time" time,
+    "Payment Status" double precision not null default 0,
+    "Attended" boolean not null default false,
+    "First Appointment" boolean not null default false,
+    "Insurance" text,
+    "Canceled" boolean not null default false,
+    "Modified At" timestamptz not null default now()
+);
+
+create index if not exists appointments_patient on appointments ("Patient ID");
+create index if not exists patients_modified on patients ("Modified At");
+create index if not exists appointments_modified on appointments ("Modified At");
+-- Covers the KPI aggregates and the date range queries
+create index if not exists appointments_kpis on appointments (
+    "Date", "Insurance", "Attended", "Payment Status", "Patient ID"
+);
+
+-- Every update bumps "Modified At" so delta syncs see it
+create or replace function clinic_touch() returns trigger language plpgsql as $$
+begin
+    new."Modified At" := now();
+    return new;
+end $$;
+
+drop trigger if exists patients_touch on patients;
+create trigger patients_touch before update on patients
+    for each row execute function clinic_touch();
+drop trigger if exists appointments_touch on appointments;
+create trigger appointments_touch before update on appointments
+    for each row execute function clinic_touch();
+
+-- Rows to load: those after a row_number / modified-at watermark, optionally
+-- only appointments dated from from_date on, one page at a time
+create or replace function clinic_patients(
+    since_row bigint default 0,
+    since_modified timestamptz default null,
+    page_offset int default 0,
+    page_limit int default 1000
+) returns setof patients language sql stable as $$
+    select * from patients
+    where row_number > since_row or "Modified At" > since_modified
+    order by row_number offset page_offset limit page_limit
+$$;
+
+create or replace function clinic_appointments(
+    since_row bigint default 0,
+    since_modified timestamptz default null,
+    from_date date default null,
+    page_offset int default 0,
+    page_limit int default 1000
+) returns setof appointments language sql stable as $$
+    select * from appointments
+    where (row_number > since_row or "Modified At" > since_modified)
+      and (from_date is null or "Date" >= from_date)
+    order by row_number offset page_offset limit page_limit
+$$;
+
+-- One write, named after the n8n webhook it replaces; returns the stored row
+create or replace function clinic_call(action text, payload jsonb)
+returns jsonb language plpgsql as $$
+declare
+    result jsonb;
+begin
+    if action = 'post_patient_url' then
+        -- The Patient ID is the row's own identity value, drawn from its
+        -- sequence, so concurrent registrations never get the same one
+        insert into patients (
+            row_number, "Patient ID", "Name", "Phone", "Email", "Referral Source"
+        ) overriding system value
+        select
+            id, id::text,
+            payload->>'patient_name',
+            payload->>'patient_phone',
+            payload->>'patient_email',
+            payload->>'referral_source'
+        from nextval(pg_get_serial_sequence('patients', 'row_number')) as id
+        returning to_jsonb(patients.*) into result;
+    elsif action = 'post_appointment_url' then
+        insert into appointments (
+            "Patient ID", "Date", "Time", "Payment Status", "Attended",
+            "First Appointment", "Insurance", "Canceled"
+        )
+        values (
+            payload->>'patient_id',
+            (payload->>'date')::date,
+            (payload->>'time')::time,
+            coalesce((payload->>'payment_status')::double precision, 0),
+            coalesce((payload->>'attended')::boolean, false),
+            coalesce((payload->>'first_appointment')::boolean, false),
+            payload->>'insurance',
+            coalesce((payload->>'canceled')::boolean, false)
+        )
+        returning to_jsonb(appointments.*) into result;
+    else
+        update appointments set
+            "Attended" = coalesce((payload->>'Attended')::boolean, "Attended"),
+            "Canceled" = coalesce((payload->>'Canceled')::boolean, "Canceled"),
+            "Payment Status" = coalesce(
+                (payload->>'Payment Status')::double precision, "Payment Status"
+            )
+        where "Appointment ID" = (payload->>'Appointment ID')::bigint
+        returning to_jsonb(appointments.*) into result;
+    end if;
+    return result;
+end $$;
+
+-- Several writes in one transaction; calls is a list of {action, payload}
+create or replace function clinic_call_batch(calls jsonb)
+returns jsonb language sql as $$
+    select coalesce(
+        jsonb_agg(clinic_call(item->>'action', item->'payload') order by position),
+        '[]'::jsonb
+    )
+    from jsonb_array_elements(calls) with ordinality as entry(item, position)
+$$;
+
+-- Totals per period for the KPIs; period is 'annual' or 'monthly'
+create or replace function clinic_period_totals(period text)
+returns table (
+    "Year" int, "Month" int, count bigint, attended bigint, insured bigint,
+    payment double precision
+) language sql stable as $$
+    select
+        extract(year from "Date")::int,
+        case when period = 'monthly' then extract(month from "Date")::int end,
+        count(*),
+        count(*) filter (where "Attended"),
+        count(*) filter (where coalesce("Insurance", '') <> 'Private'),
+        sum("Payment Status")
+    from appointments
+    group by 1, 2
+    order by 1, 2
+$$;
+
+-- Period KPI inputs of one date range (both ends included)
+create or replace function clinic_range_totals(start_date date, stop_date date)
+returns table (
+    count bigint, attended bigint, insured bigint, payment double precision
+) language sql stable as $$
+    select
+        count(*),
+        count(*) filter (where "Attended"),
+        count(*) filter (where coalesce("Insurance", '') <> 'Private'),
+        coalesce(sum("Payment Status"), 0)
+    from appointments
+    where "Date" between start_date and stop_date
+$$;
+
+-- Each patient's cohort: the month of the flagged first appointment (else
+-- the earliest one), with its Insurance and the patient's Referral Source.
+-- Months are counted from year 0 (year * 12 + month - 1).
+create or replace view clinic_cohort_members as
+    select distinct on (appointments."Patient ID")
+        appointments."Patient ID" as patient,
+        (extract(year from "Date") * 12 + extract(month from "Date") - 1)::int
+            as cohort,
+        coalesce("Insurance", 'nan') as insurance,
+        coalesce(patients."Referral Source", 'Other') as referral
+    from appointments
+    left join patients on patients."Patient ID" = appointments."Patient ID"
+    order by appointments."Patient ID", "First Appointment" desc, "Date";
+
+-- Patients seen and payments received per cohort and months since the first
+-- appointment
+create or replace function clinic_cohort_cells()
+returns table (
+    cohort int, insurance text, referral text, "offset" int, patients bigint,
+    payment double precision
+) language sql stable as $$
+    select
+        members.cohort, members.insurance, members.referral,
+        dated.month - members.cohort,
+        count(distinct dated.patient),
+        sum(dated.payment)
+    from (
+        select
+            "Patient ID" as patient,
+            (extract(year from "Date") * 12 + extract(month from "Date") - 1)::int
+                as month,
+            "Payment Status" as payment
+        from appointments
+    ) dated
+    join clinic_cohort_members members using (patient)
+    where dated.month >= members.cohort
+    group by 1, 2, 3, 4
+$$;
+
+create or replace function clinic_cohort_sizes()
+returns table (cohort int, insurance text, referral text, patients bigint)
+language sql stable as $$
+    select cohort, insurance, referral, count(*)
+    from clinic_cohort_members group by 1, 2, 3
+$$;
+
+-- Lifetime value and retention inputs, aggregated per patient
+create or replace function clinic_patient_totals()
+returns table (ltv double precision, patients bigint, retained bigint)
+language sql stable as $$
+    select avg(total), count(*), count(*) filter (where visits > 1)
+    from (
+        select sum("Payment Status") as total, count(*) as visits
+        from appointments group by "Patient ID"
+    ) per_patient
+$$;
+
+create or replace function clinic_appointments_between(start_date date, stop_date date)
+returns setof appointments language sql stable as $$
+    select * from appointments
+    where "Date" between start_date and stop_date
+    order by "Date", "Time"
+$$;
+
+-- Patients with an appointment on `day`: the first stage of a staged load
+create or replace function clinic_day_patients(day date)
+returns setof patients language sql stable as $$
+    select * from patients
+    where "Patient ID" in (select "Patient ID" from appointments where "Date" = day)
+    order by row_number
+$$;
+
+create or replace function clinic_appointment_count(patient text)
+returns bigint language sql stable as $$
+    select count(*) from appointments where "Patient ID" = patient
+$$;
@@ -0,0 +1,214 @@
+"""Random writes to a store and checks of its indexes against fresh builds."""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import INSURANCE_MIX, REFERRAL_MIX, SLOTS
+from core.cohorts import CohortIndex
+from core.date_index import DateIndex
+from core.index import DataIndex
+from core.rollups import MonthlyRollup
+from core.schedule import ScheduleIndex
+from core.schema import APPOINTMENTS, DATE_FORMAT, PATIENTS, normalize_records
+from core.search import PatientSearch
+
+WRITES = 60
+TODAY = date.today()
+FLAGS = ["FALSE", "TRUE"]
+
+
+class Clinic:
+    """Random writes to a store, the way the pages and the syncs make them.
+
+    `sheet` holds the webhook records by row_number, as the backend would,
+    so delta syncs send back rows as they are upstream.
+    """
+
+    def __init__(self, store, sheet, seed):
+        self.store = store
+        self.rng = np.random.default_rng(seed)
+        self.sheet = {
+            table: {record["row_number"]: dict(record) for record in records}
+            for table, records in zip(("patients", "appointments"), sheet)
+        }
+
+    def _pick(self, values):
+        values = list(values)
+        return values[self.rng.integers(len(values))]
+
+    def _patient_ids(self):
+        return [record["Patient ID"] for record in self.sheet["patients"].values()]
+
+    def _appointment(self, patient_id):
+        day = TODAY + timedelta(days=int(self.rng.integers(-900, 60)))
+        attended = day <= TODAY and self.rng.random() < 0.8
+        return {
+            "Patient ID": patient_id,
+            "Date": day.strftime(DATE_FORMAT),
+            "Time": self._pick(SLOTS),
+            "Payment Status": int(self.rng.integers(90, 450)) if attended else 0,
+            "Attended": FLAGS[attended],
+            "First Appointment": FLAGS[self.rng.random() < 0.1],
+            "Insurance": self._pick(INSURANCE_MIX),
+            "Canceled": FLAGS[self.rng.random() < 0.1],
+        }
+
+    def _new_row(self, table, record):
+        row_number = max(self.sheet[table]) + 1
+        record = {"row_number": row_number, **record}
+        self.sheet[table][row_number] = record
+        return record
+
+    def register_patient(self):
+        patient_id = str(max(map(int, self._patient_ids())) + 1)
+        record = self._new_row(
+            "patients",
+            {
+                "Patient ID": patient_id,
+                "Name": f"Paciente Teste {patient_id}",
+                "Phone": f"119{int(patient_id):08d}",
+                "Email": f"teste{patient_id}@example.com",
+                "Referral Source": self._pick(REFERRAL_MIX),
+            },
+        )
+        self.store.append("patients", normalize_records([record], PATIENTS))
+
+    def register_appointment(self):
+        appointment = self._appointment(self._pick(self._patient_ids()))
+        record = self._new_row(
+            "appointments",
+            {"Appointment ID": str(self.store.ids.next()), **appointment},
+        )
+        self.store.append("appointments", normalize_records([record], APPOINTMENTS))
+
+    def edit_appointment(self):
+        label = self._pick(self.store.appointments.index)
+        column = self._pick(["Attended", "Canceled", "Payment Status"])
+        if column == "Payment Status":
+            value = float(self.rng.integers(0, 450))
+        else:
+            value = bool(self.rng.random() < 0.5)
+        self.store.update("appointments", label, {column: value})
+
+    def sync_delta(self):
+        # Rows rewritten upstream (any column but the IDs) and new ones
+        appointments = []
+        for row_number in self.rng.choice(list(self.sheet["appointments"]), 5):
+            record = self.sheet["appointments"][row_number]
+            record.update(self._appointment(record["Patient ID"]))
+            appointments.append(dict(record))
+        appointments.append(
+            self._new_row(
+                "appointments",
+                {
+                    "Appointment ID": str(self.store.ids.next()),
+                    **self._appointment(self._pick(self._patient_ids())),
+                },
+            )
+        )
+        patients = []
+        for row_number in self.rng.choice(list(self.sheet["patients"]), 2):
+            record = self.sheet["patients"][row_number]
+            record["Referral Source"] = self._pick(REFERRAL_MIX)
+            patients.append(dict(record))
+        delta = (
+            normalize_records(patients, PATIENTS),
+            normalize_records(appointments, APPOINTMENTS),
+        )
+        self.store.ensure_loaded(
+            lambda changed_only=False: None, lambda watermarks: delta, force=True
+        )
+
+    def write(self):
+        self._pick(
+            [
+                self.register_patient,
+                self.register_appointment,
+                self.register_appointment,
+                self.edit_appointment,
+                self.edit_appointment,
+                self.sync_delta,
+            ]
+        )()
+
+
+def _cells(cells):
+    # Cells emptied by removals are kept with zeros; a build never has them
+    rounded = {key: [round(value, 6) for value in cell] for key, cell in cells.items()}
+    return {key: cell for key, cell in rounded.items() if any(cell)}
+
+
+def assert_data_index(store):
+    fresh = DataIndex.build(store.patients, store.appointments)
+    assert store.index.patient_rows == fresh.patient_rows
+    assert store.index.appointment_rows == fresh.appointment_rows
+    counts = {key: n for key, n in store.index.appointment_counts.items() if n}
+    assert counts == fresh.appointment_counts
+
+
+def assert_rollup(store):
+    fresh = MonthlyRollup.build(store.appointments)
+    assert _cells(store.rollup.cells) == _cells(fresh.cells)
+
+
+def assert_date_index(store, rng):
+    fresh = DateIndex.build(store.appointments)
+    days = [
+        TODAY + timedelta(days=int(offset)) for offset in rng.integers(-1000, 90, 20)
+    ]
+    ranges = [(TODAY - timedelta(days=4000), TODAY + timedelta(days=400))]
+    ranges += [tuple(sorted(pair)) for pair in zip(days[::2], days[1::2])]
+    for start, stop in ranges:
+        assert store.dates.totals(start, stop) == pytest.approx(
+            fresh.totals(start, stop)
+        )
+        labels = store.dates.labels(start, stop)
+        assert sorted(labels) == sorted(fresh.labels(start, stop))
+        dates = store.appointments.loc[labels, "Date"]
+        assert dates.is_monotonic_increasing
+
+
+def assert_cohorts(store):
+    fresh = CohortIndex.build(store.patients, store.appointments)
+    assert _cells(store.cohorts.cells) == _cells(fresh.cells)
+    assert store.cohorts.sizes == fresh.sizes
+    for by in (None, "Insurance", "Referral Source"):
+        pd.testing.assert_frame_equal(
+            store.cohorts.retention(by, TODAY), fresh.retention(by, TODAY)
+        )
+        pd.testing.assert_frame_equal(
+            store.cohorts.ltv_curves(by, TODAY), fresh.ltv_curves(by, TODAY)
+        )
+
+
+def assert_schedule(store):
+    fresh = ScheduleIndex.build(store.appointments)
+    assert store.schedule.days == fresh.days
+    assert store.schedule.booked == fresh.booked
+
+
+def assert_search(store):
+    fresh = PatientSearch.build(store.patients)
+    queries = [
+        "zq",
+        "ana",
+        "silva",
+        "paciente teste",
+        "11900000",
+        "teste1",
+        "jose sant",
+    ]
+    for query in queries:
+        found = [match["Patient ID"] for match in store.search_patients(query)]
+        assert found == [match["Patient ID"] for match in fresh.search(query)]
+
+
+def run(store, sheet, seed, writes=WRITES):
+    """Make `writes` random writes to `store`; return the `Clinic`."""
+    clinic = Clinic(store, sheet, seed)
+    for _ in range(writes):
+        clinic.write()
+    return clinic
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from benchmarks.synthetic import generate_tables, records
+from core.cache import INDEXES, DataStore
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+
+# Small enough to build every index from scratch in each test
+APPOINTMENTS_ROWS = 600
+PATIENTS_ROWS = 80
+
+
+@pytest.fixture(scope="session")
+def sheet():
+    """Webhook records of a synthetic clinic, as `(patients, appointments)`."""
+    patients, appointments = generate_tables(APPOINTMENTS_ROWS, PATIENTS_ROWS)
+    return records(patients), records(appointments)
+
+
+@pytest.fixture(params=[False, True], ids=["default", "compact"])
+def compact(request):
+    return request.param
+
+
+@pytest.fixture
+def tables(sheet, compact):
+    """Normalized `(patients, appointments)` frames of `sheet`."""
+    return (
+        normalize_records(sheet[0], PATIENTS, compact),
+        normalize_records(sheet[1], APPOINTMENTS, compact),
+    )
+
+
+@pytest.fixture
+def store(tables):
+    """A `DataStore` holding `tables`, with every index built."""
+    store = DataStore(ttl=None)
+    store.ensure_loaded(lambda changed_only=False: tables)
+    # Indexes are built on first use; build them now so writes go through
+    # their incremental updates
+    for name in INDEXES:
+        getattr(store, name)
+    return store
+
+
+def wait_until(condition, timeout=5):
+    """Poll `condition` until it holds; fail after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
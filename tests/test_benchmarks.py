@@ -0,0 +1,77 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from benchmarks.fake_n8n import FakeN8n, urls
+from benchmarks.synthetic import generate_tables, records
+from core.cache import DataStore
+from core.client import WebhookClient
+from core.repository import N8nRepository
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from core.sync import watermark
+
+
+def test_generated_tables_are_consistent():
+    patients, appointments = generate_tables(2000, 250, seed=3)
+    again = generate_tables(2000, 250, seed=3)
+    pd.testing.assert_frame_equal(appointments, again[1])
+    assert set(appointments["Patient ID"]) <= set(patients["Patient ID"])
+    assert appointments["Appointment ID"].is_unique
+    # One first appointment per patient, their earliest
+    first = appointments[appointments["First Appointment"] == "TRUE"]
+    assert first["Patient ID"].is_unique
+    assert len(first) == appointments["Patient ID"].nunique()
+    future = pd.to_datetime(appointments["Date"].astype(str)).dt.date > date.today()
+    assert future.any()
+    assert (appointments.loc[future, "Attended"] == "FALSE").all()
+    assert (appointments.loc[future, "Payment Status"] == 0).all()
+
+
+@pytest.fixture
+def n8n():
+    server = FakeN8n(*generate_tables(900, 100), port=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _repository(n8n, **options):
+    client = WebhookClient(urls(n8n.server_port))
+    return N8nRepository(DataStore(ttl=None), client, options)
+
+
+def _expected(n8n):
+    return (
+        normalize_records(records(n8n.patients.frame), PATIENTS),
+        normalize_records(records(n8n.appointments.frame), APPOINTMENTS),
+    )
+
+
+@pytest.mark.parametrize("page_size", [None, 128])
+def test_loads_from_the_fake_server(n8n, page_size):
+    repository = _repository(n8n, page_size=page_size)
+    patients, appointments = repository.load()
+    expected = _expected(n8n)
+    pd.testing.assert_frame_equal(getattr(patients, "frame", patients), expected[0])
+    pd.testing.assert_frame_equal(
+        getattr(appointments, "frame", appointments), expected[1]
+    )
+    # Nothing changed since: the ETag (or the page hash) says so
+    assert repository.load(changed_only=True) == (None, None)
+
+
+def test_registrations_come_back_in_the_delta(n8n):
+    repository = _repository(n8n, delta_sync=True)
+    patients, appointments = repository.load()
+    watermarks = {
+        "patients": watermark(patients),
+        "appointments": watermark(appointments),
+    }
+    stored = repository.call(
+        "post_appointment_url",
+        {"appointment_id": 901, "patient_id": "1", "date": "2024-03-01"},
+    )
+    new_patients, new_appointments = repository.load_delta(watermarks)
+    assert new_patients is None
+    assert new_appointments["Appointment ID"].tolist() == [stored["Appointment ID"]]
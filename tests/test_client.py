@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from core.client import WebhookClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _answer(self):
+        server = self.server
+        server.requests.append((self.command, self.path, dict(self.headers)))
+        if server.failures:
+            server.failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(server.delay)
+        if server.etag is not None and self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = json.dumps(server.body).encode()
+        self.send_response(200)
+        if server.etag is not None:
+            self.send_header("ETag", server.etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _answer
+
+
+class Webhook(ThreadingHTTPServer):
+    """Answers with `body`, after failing the next `failures` requests."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.requests = []
+        self.failures = 0
+        self.delay = 0.0
+        self.etag = None
+        self.body = [{"row_number": 2}]
+
+
+@pytest.fixture
+def webhook():
+    server = Webhook()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(webhook, **kwargs):
+    url = f"http://127.0.0.1:{webhook.server_port}/feed"
+    return WebhookClient({"feed": url}, backoff_factor=0, **kwargs)
+
+
+def test_gets_are_retried(webhook):
+    client = _client(webhook)
+    webhook.failures = 2
+    assert client.get("feed") == webhook.body
+    assert len(webhook.requests) == 3
+    assert client.latency["feed"].calls == 1
+
+
+def test_posts_are_not_retried(webhook):
+    client = _client(webhook)
+    webhook.failures = 1
+    # A POST that reached the server may have been applied
+    response = client.post("feed", json={"appointment_id": 1})
+    assert response.status_code == 503
+    assert len(webhook.requests) == 1
+    assert client.latency["feed"].errors == 1
+
+
+def test_slow_responses_time_out(webhook):
+    client = _client(webhook, retries=0, timeouts={"feed": (1, 0.05)})
+    webhook.delay = 0.5
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get("feed")
+    assert client.latency["feed"].errors == 1
+
+
+def test_conditional_gets_skip_unchanged_bodies(webhook):
+    client = _client(webhook)
+    assert client.get("feed", conditional=True) == webhook.body
+    # No validators: the body is compared by hash
+    assert client.get("feed", conditional=True) is None
+    # Other parameters are another request
+    assert client.get("feed", {"offset": 1}, conditional=True) == webhook.body
+    webhook.body = [{"row_number": 3}]
+    assert client.get("feed", {"offset": 1}, conditional=True) == webhook.body
+
+
+def test_conditional_gets_send_the_etag(webhook):
+    client = _client(webhook)
+    webhook.etag = '"600"'
+    assert client.get("feed", conditional=True) == webhook.body
+    assert client.get("feed", conditional=True) is None
+    assert webhook.requests[-1][2]["If-None-Match"] == '"600"'
+    # Unconditional GETs always return the body
+    assert client.get("feed") == webhook.body
@@ -0,0 +1,104 @@
+import pandas as pd
+import pytest
+
+from core.cohorts import CohortIndex
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from tests.clinic import assert_cohorts, run
+
+TODAY = "2024-06-30"
+
+
+def _visit(patient_id, date, payment, first=False, insurance="Unimed"):
+    return {
+        "Patient ID": patient_id,
+        "Date": date,
+        "Time": "09:00:00",
+        "Payment Status": payment,
+        "Attended": "TRUE",
+        "First Appointment": "TRUE" if first else "FALSE",
+        "Insurance": insurance,
+        "Canceled": "FALSE",
+    }
+
+
+def _tables(visits):
+    patients = [
+        {"Patient ID": patient_id, "Referral Source": referral}
+        for patient_id, referral in (("1", "Instagram"), ("2", None))
+    ]
+    return (
+        normalize_records(patients, PATIENTS),
+        normalize_records(visits, APPOINTMENTS),
+    )
+
+
+VISITS = [
+    _visit("1", "2024-01-10", 100, first=True),
+    _visit("1", "2024-01-20", 50),
+    _visit("1", "2024-03-05", 200),
+    _visit("2", "2024-01-15", 80, insurance="Private"),
+    # Before the flagged first appointment: not counted
+    _visit("1", "2023-12-01", 999),
+]
+
+
+def test_retention_and_ltv_of_a_cohort():
+    cohorts = CohortIndex.build(*_tables(VISITS))
+    retention = cohorts.retention(today=TODAY)
+    assert retention.loc["2024-01"].tolist()[:3] == [100, 0, 50]
+    ltv = cohorts.ltv_curves(today=TODAY)
+    assert ltv.loc["2024-01"].tolist()[:3] == [115, 115, 215]
+    # Months after today are left empty
+    early = cohorts.retention(today="2024-02-15").loc["2024-01"]
+    assert early.notna().tolist() == [True, True, False]
+
+
+def test_segments():
+    cohorts = CohortIndex.build(*_tables(VISITS))
+    by_insurance = cohorts.retention("Insurance", TODAY)
+    assert by_insurance.loc["Unimed"].tolist()[:3] == [100, 0, 100]
+    assert by_insurance.loc["Private"].tolist()[:3] == [100, 0, 0]
+    # Unknown referrals are pooled as "Other"
+    by_referral = cohorts.ltv_curves("Referral Source", TODAY)
+    assert sorted(by_referral.index) == ["Instagram", "Other"]
+
+
+def test_a_backdated_first_appointment_marks_the_index_stale():
+    patients, appointments = _tables(VISITS[:4])
+    cohorts = CohortIndex.build(patients, appointments)
+    assert not cohorts.stale
+    cohorts.add(_tables([_visit("2", "2023-11-02", 60)])[1])
+    assert cohorts.stale
+
+
+def test_an_empty_index_has_no_curves():
+    cohorts = CohortIndex.build(*_tables([]))
+    assert cohorts.retention(today=TODAY).empty
+    assert cohorts.ltv_curves(today=TODAY).empty
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_cohorts_match_a_fresh_build(store, sheet, seed):
+    run(store, sheet, seed)
+    assert_cohorts(store)
+
+
+def test_store_rebuilds_stale_cohorts(store):
+    cohorts = store.cohorts
+    patient_id = store.patients["Patient ID"].iloc[0]
+    backdated = normalize_records(
+        [
+            {
+                "Appointment ID": str(store.ids.next()),
+                **_visit(patient_id, "1990-01-01", 10, first=True),
+            }
+        ],
+        APPOINTMENTS,
+    )
+    store.append("appointments", backdated)
+    assert store.cohorts is not cohorts
+    assert not store.cohorts.stale
+    pd.testing.assert_frame_equal(
+        store.cohort_retention(),
+        CohortIndex.build(store.patients, store.appointments).retention(),
+    )
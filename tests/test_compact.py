@@ -0,0 +1,66 @@
+import pandas as pd
+
+from core.schema import (
+    APPOINTMENTS,
+    PATIENTS,
+    as_time,
+    conform,
+    memory_report,
+    normalize_records,
+)
+
+
+def _compact(sheet):
+    return (
+        normalize_records(sheet[0], PATIENTS, compact=True),
+        normalize_records(sheet[1], APPOINTMENTS, compact=True),
+    )
+
+
+def test_compact_dtypes(sheet):
+    patients, appointments = _compact(sheet)
+    assert patients["Name"].dtype == "string[pyarrow]"
+    assert isinstance(patients["Referral Source"].dtype, pd.CategoricalDtype)
+    assert isinstance(appointments["Insurance"].dtype, pd.CategoricalDtype)
+    # Known categories come first, in a fixed order
+    assert list(appointments["Insurance"].cat.categories[:2]) == [
+        "Unimed",
+        "Bradesco Saúde",
+    ]
+    for column in ("row_number", "Appointment ID", "Patient ID"):
+        assert appointments[column].dtype == "int32"
+    assert pd.api.types.is_timedelta64_dtype(appointments["Time"])
+
+
+def test_compact_holds_the_same_values(sheet):
+    default = normalize_records(sheet[1], APPOINTMENTS)
+    compact = _compact(sheet)[1]
+    assert compact["Patient ID"].astype(str).tolist() == default["Patient ID"].tolist()
+    assert as_time(compact["Time"]).tolist() == default["Time"].tolist()
+    assert compact["Insurance"].astype(str).tolist() == default["Insurance"].tolist()
+    for column in ("Date", "Payment Status", "Attended", "Canceled"):
+        assert compact[column].tolist() == default[column].tolist()
+
+
+def test_ids_that_are_not_numbers_stay_text(sheet):
+    records = [dict(record, **{"Patient ID": "P-1"}) for record in sheet[1][:5]]
+    appointments = normalize_records(records, APPOINTMENTS, compact=True)
+    assert appointments["Patient ID"].dtype == "string[pyarrow]"
+
+
+def test_appended_rows_keep_the_compact_layout(sheet):
+    appointments = _compact(sheet)[1]
+    record = dict(sheet[1][0], Insurance="Nova")
+    rows = conform(appointments, normalize_records([record], APPOINTMENTS))
+    # The new insurance is added to the table's categories
+    assert (rows.dtypes == appointments.dtypes).all()
+    assert "Nova" in appointments["Insurance"].cat.categories
+
+
+def test_compact_tables_are_smaller(sheet):
+    default = {"appointments": normalize_records(sheet[1], APPOINTMENTS)}
+    compact = {"appointments": _compact(sheet)[1]}
+    assert (
+        memory_report(compact)["Bytes"].sum() * 3
+        < memory_report(default)["Bytes"].sum()
+    )
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from core import date_index
+from tests.clinic import TODAY, assert_date_index, run
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_date_index_matches_a_fresh_build(store, sheet, seed):
+    clinic = run(store, sheet, seed)
+    assert_date_index(store, clinic.rng)
+
+
+def test_range_kpis_match_a_scan(store):
+    start, stop = TODAY - timedelta(days=180), TODAY
+    appointments = store.appointments
+    days = appointments["Date"].dt.date
+    rows = appointments[(days >= start) & (days <= stop)]
+    kpis = store.range_kpis(start, stop).iloc[0]
+    assert kpis["Ticket Médio"] == round(rows["Payment Status"].mean(), 2)
+    assert kpis["Taxa de Conversão"] == round(rows["Attended"].mean() * 100, 2)
+    assert (
+        store.appointments_between(start, stop)
+        .index.sort_values()
+        .equals(rows.index.sort_values())
+    )
+
+
+def test_an_empty_range_has_no_kpis(store):
+    future = TODAY + timedelta(days=4000)
+    assert store.range_kpis(future, future).empty
+    assert store.appointments_between(future, future).empty
+
+
+def test_the_index_is_rebuilt_after_many_writes(store, monkeypatch):
+    monkeypatch.setattr(date_index, "MAX_PENDING", 3)
+    dates = store.dates
+    for label in store.appointments.index[:4]:
+        store.update("appointments", label, {"Payment Status": 1.0})
+    # Dropped once the pending writes pile up, and built again on next use
+    assert "dates" not in store._indexes
+    assert store.dates is not dates and not store.dates.pending
+    assert_date_index(store, np.random.default_rng(0))
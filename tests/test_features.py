@@ -0,0 +1,15 @@
+import pandas as pd
+
+from core.features import appointment_features
+
+
+def test_features_are_derived_once_per_version(store):
+    columns = list(store.appointments.columns)
+    features = store.features("appointments")
+    assert store.features("appointments") is features
+    assert list(store.appointments.columns) == columns
+    pd.testing.assert_frame_equal(features, appointment_features(store.appointments))
+
+    label = store.appointments.index[0]
+    store.update("appointments", label, {"Payment Status": 1.0})
+    assert store.features("appointments") is not features
@@ -0,0 +1,20 @@
+import pytest
+
+from tests.clinic import assert_data_index, run
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_data_index_matches_a_fresh_build(store, sheet, seed):
+    run(store, sheet, seed)
+    assert_data_index(store)
+
+
+def test_lookups(store):
+    patients, appointments = store.patients, store.appointments
+    patient_id = patients["Patient ID"].iloc[-1]
+    assert store.locate("patients", patient_id) == patients.index[-1]
+    key = appointments["Appointment ID"].iloc[-1]
+    assert store.locate("appointments", key) == appointments.index[-1]
+    assert store.locate("appointments", -1) is None
+    count = (appointments["Patient ID"] == patient_id).sum()
+    assert store.index.appointment_count(patient_id) == count
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+from core.ingest import fetch_pages, load_table
+from core.schema import APPOINTMENTS, normalize_records
+
+PAGE_SIZE = 50
+
+
+class Response:
+    def __init__(self, records):
+        self.content = json.dumps(records).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class Feed:
+    """A client for one feed; `paging=False` mimics a webhook ignoring it."""
+
+    def __init__(self, records, paging=True):
+        self.records = records
+        self.paging = paging
+        self.offsets = []
+        self._lock = threading.Lock()
+
+    def request(self, method, endpoint, params):
+        with self._lock:
+            self.offsets.append(params["offset"])
+        if not self.paging:
+            return Response(self.records)
+        offset = params["offset"]
+        return Response(self.records[offset : offset + params["limit"]])
+
+
+@pytest.mark.parametrize("rows", [0, 30, PAGE_SIZE, 4 * PAGE_SIZE, 523])
+def test_pages_come_in_order(sheet, rows):
+    feed = Feed(sheet[1][:rows])
+    pages = list(fetch_pages(feed, "appointments_url", PAGE_SIZE, concurrency=3))
+    assert [record for page in pages for record in page] == feed.records
+    assert all(pages)
+    # Never more than the window past the end of the feed
+    assert max(feed.offsets) <= rows + 3 * PAGE_SIZE
+
+
+@pytest.mark.parametrize("rows", [30, PAGE_SIZE, 523])
+def test_a_feed_that_ignores_paging_is_read_once(sheet, rows):
+    feed = Feed(sheet[1][:rows], paging=False)
+    pages = list(fetch_pages(feed, "appointments_url", PAGE_SIZE, concurrency=3))
+    assert pages == [feed.records]
+    if rows == PAGE_SIZE:
+        # Only a repeated first page tells it apart from a longer feed
+        assert len(feed.offsets) == 4
+    else:
+        assert feed.offsets == [0]
+
+
+def test_the_digest_covers_every_page_in_order(sheet):
+    records = sheet[1][:523]
+
+    def digest(records):
+        digest = hashlib.sha1()
+        list(fetch_pages(Feed(records), "appointments_url", PAGE_SIZE, digest=digest))
+        return digest.digest()
+
+    pages = [records[start : start + PAGE_SIZE] for start in range(0, 523, PAGE_SIZE)]
+    bodies = b"".join(Response(page).content for page in pages)
+    assert digest(records) == hashlib.sha1(bodies).digest()
+    changed = [dict(records[0], Insurance="Nova")] + records[1:]
+    assert digest(changed) != digest(records)
+
+
+def test_load_table_matches_a_whole_download(sheet, compact):
+    records = sheet[1]
+    pages = fetch_pages(Feed(records), "appointments_url", PAGE_SIZE)
+    table = load_table(pages, APPOINTMENTS, compact)
+    pd.testing.assert_frame_equal(
+        table.frame, normalize_records(records, APPOINTMENTS, compact)
+    )
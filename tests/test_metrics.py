@@ -0,0 +1,58 @@
+import json
+
+from core.metrics import BUCKETS_MS, REPORT_COLUMNS, Histogram, Metrics
+
+
+def test_histogram_summary():
+    histogram = Histogram()
+    for ms in (1, 3, 3, 40, 800):
+        histogram.add(ms / 1000)
+    histogram.add(0.004, failed=True)
+    summary = histogram.summary()
+    assert summary["Calls"] == 6 and summary["Errors"] == 1
+    assert summary["Max (ms)"] == 800
+    # Quantiles are the upper bound of their bucket, capped at the slowest
+    assert summary["p50 (ms)"] == 5
+    assert summary["p95 (ms)"] == 800
+    assert sum(histogram.buckets().values()) == 6
+    assert len(histogram.buckets()) == len(BUCKETS_MS) + 1
+
+
+def test_copies_are_independent():
+    histogram = Histogram()
+    histogram.add(0.01)
+    copy = histogram.copy()
+    histogram.add(0.02)
+    assert copy.calls == 1 and copy.counts != histogram.counts
+
+
+def test_timers_record_only_while_enabled():
+    metrics = Metrics()
+    with metrics.section("kpis"):
+        pass
+    assert metrics.series == {}
+    metrics.enabled = True
+    with metrics.section("kpis"):
+        pass
+    with metrics.timer("page", "Dashboard"):
+        pass
+    assert metrics.series[("section", "kpis")].calls == 1
+    report = metrics.report()
+    assert report.columns.tolist() == REPORT_COLUMNS
+    assert report[["Kind", "Name"]].values.tolist() == [
+        ["page", "Dashboard"],
+        ["section", "kpis"],
+    ]
+    metrics.reset()
+    assert metrics.report().empty
+
+
+def test_export_includes_the_extra_histograms():
+    metrics = Metrics(enabled=True)
+    metrics.record("page", "Dashboard", 0.2)
+    latency = Histogram()
+    latency.add(0.05, failed=True)
+    exported = json.loads(json.dumps(metrics.export({("http", "feed"): latency})))
+    series = {entry["name"]: entry for entry in exported["series"]}
+    assert series["feed"]["Errors"] == 1
+    assert series["Dashboard"]["buckets"]["≤200 ms"] == 1
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from core.refresh import Refresher
+from tests.conftest import wait_until
+
+
+class Loader:
+    """Serves `tables`; while `gate` is closed each call waits for it."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.error = None
+
+    def __call__(self, changed_only=False):
+        self.calls += 1
+        self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return tuple(frame.copy() for frame in self.tables)
+
+
+def test_reads_are_not_blocked_while_a_reload_downloads(store, tables):
+    loader = Loader(tables)
+    loader.gate.clear()
+    version = store.version
+    reload = threading.Thread(
+        target=store.ensure_loaded, args=(loader,), kwargs={"force": True}
+    )
+    reload.start()
+    wait_until(lambda: loader.calls == 1)
+
+    started = time.monotonic()
+    assert store.snapshot()[0] == version
+    assert store.period_kpis("monthly") is not None
+    # Written while the reload downloads, so the download does not have it
+    label = store.locate("appointments", store.appointments["Appointment ID"].iloc[0])
+    store.update("appointments", label, {"Payment Status": 777.0})
+    # Sessions serve the current tables instead of starting a second reload
+    store.ensure_loaded(loader, force=True)
+    assert time.monotonic() - started < 1
+    assert loader.calls == 1
+
+    loader.gate.set()
+    reload.join(5)
+    assert not store.reloading
+    assert store.version > version + 1
+    assert store.appointments.at[label, "Payment Status"] == 777.0
+
+
+def test_refresher_reloads_every_interval(store, tables):
+    loader = Loader(tables)
+    refresher = Refresher(store, loader, interval=0.01).start()
+    try:
+        wait_until(lambda: loader.calls >= 2)
+    finally:
+        refresher.set_interval(0)
+
+
+def test_refresher_keeps_the_tables_when_a_reload_fails(store, tables):
+    loader = Loader(tables)
+    loader.error = OSError("offline")
+    version, patients, appointments = store.snapshot()
+    refresher = Refresher(store, loader, interval=0.01).start()
+    try:
+        wait_until(lambda: refresher.last_error is loader.error)
+    finally:
+        refresher.set_interval(0)
+    current = store.snapshot()
+    assert current[0] == version
+    assert current[1] is patients and current[2] is appointments
+    assert not store.reloading
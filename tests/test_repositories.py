@@ -0,0 +1,144 @@
+"""The database backends answer in SQL what the in-memory path computes."""
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from benchmarks.run import sqlite_repository
+from benchmarks.synthetic import generate_tables
+from core import supabase_repository
+from core.cache import DataStore
+from core.repository import Repository
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from core.supabase_repository import SupabaseRepository
+from tests.conftest import APPOINTMENTS_ROWS, PATIENTS_ROWS
+
+TODAY = date.today()
+RANGES = [
+    (TODAY, TODAY),
+    (TODAY - timedelta(days=29), TODAY),
+    (TODAY - timedelta(days=800), TODAY - timedelta(days=400)),
+    (TODAY - timedelta(days=4000), TODAY + timedelta(days=60)),
+]
+
+
+@pytest.fixture
+def backends(tmp_path, compact):
+    """`(sqlite, in_memory)` repositories over the same data."""
+    patients, appointments = generate_tables(APPOINTMENTS_ROWS, PATIENTS_ROWS)
+    store = DataStore(ttl=None)
+    sqlite = sqlite_repository(
+        str(tmp_path / "clinic.db"), store, patients, appointments, compact
+    )
+    store.ensure_loaded(sqlite.load)
+    return sqlite, Repository(store, compact)
+
+
+def assert_same_answers(sqlite, memory):
+    for period in ("annual", "monthly"):
+        pd.testing.assert_frame_equal(
+            sqlite.period_kpis(period),
+            memory.period_kpis(period),
+            check_dtype=False,
+            check_index_type=False,
+        )
+    for start, stop in RANGES:
+        pd.testing.assert_frame_equal(
+            sqlite.range_kpis(start, stop),
+            memory.range_kpis(start, stop),
+            check_dtype=False,
+        )
+        ids = sqlite.appointments_between(start, stop)["Appointment ID"]
+        expected = memory.appointments_between(start, stop)["Appointment ID"]
+        assert sorted(ids.tolist()) == sorted(expected.tolist())
+    for by in (None, "Insurance", "Referral Source"):
+        pd.testing.assert_frame_equal(
+            sqlite.cohort_retention(by), memory.cohort_retention(by), check_dtype=False
+        )
+        pd.testing.assert_frame_equal(
+            sqlite.cohort_ltv(by), memory.cohort_ltv(by), check_dtype=False
+        )
+    assert sqlite.lifetime_value() == pytest.approx(memory.lifetime_value())
+    assert sqlite.retention_rate() == pytest.approx(memory.retention_rate())
+    for patient_id in memory.store.patients["Patient ID"].head(10).tolist():
+        assert sqlite.appointment_count(patient_id) == memory.appointment_count(
+            patient_id
+        )
+
+
+def test_sqlite_pushdown_matches_memory(backends):
+    assert_same_answers(*backends)
+
+
+def test_sqlite_pushdown_matches_memory_after_writes(backends):
+    sqlite, memory = backends
+    store = memory.store
+    patient = sqlite.call("post_patient_url", {"patient_name": "Ana Teste"})
+    store.append("patients", normalize_records([patient], PATIENTS))
+    appointment = sqlite.call(
+        "post_appointment_url",
+        {
+            "patient_id": patient["Patient ID"],
+            "date": TODAY,
+            "time": "09:00:00",
+            "first_appointment": True,
+            "insurance": "Private",
+        },
+    )
+    store.append("appointments", normalize_records([appointment], APPOINTMENTS))
+    edited = store.appointments["Appointment ID"].tolist()[3]
+    (record,) = sqlite.call_batch(
+        [
+            (
+                "post_payment_url",
+                {"Appointment ID": edited, "Payment Status": 321.0},
+            )
+        ]
+    )
+    store.update(
+        "appointments",
+        store.locate("appointments", edited),
+        {"Payment Status": record["Payment Status"]},
+    )
+    assert_same_answers(sqlite, memory)
+
+
+class Rpc:
+    """Serves RPC pages like PostgREST, capped at `max_rows` rows."""
+
+    def __init__(self, tables, max_rows):
+        self.tables = tables
+        self.max_rows = max_rows
+
+    def rpc(self, function, params):
+        offset = params["page_offset"]
+        stop = offset + min(params["page_limit"], self.max_rows)
+        return Response(self.tables[function][offset:stop])
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return self
+
+
+@pytest.mark.parametrize("page_size", [None, 400, 5000])
+def test_supabase_reads_every_page_of_a_capped_server(monkeypatch, sheet, page_size):
+    patients, appointments = sheet
+    server = Rpc(
+        {"clinic_patients": patients, "clinic_appointments": appointments},
+        max_rows=250,
+    )
+    monkeypatch.setattr(supabase_repository, "create_client", lambda url, key: server)
+    repository = SupabaseRepository(
+        DataStore(ttl=None), "url", "key", page_size=page_size
+    )
+    loaded_patients, loaded_appointments = repository.load()
+    assert len(loaded_patients) == len(patients)
+    assert len(loaded_appointments) == len(appointments)
+    assert loaded_appointments.frame["row_number"].tolist() == [
+        record["row_number"] for record in appointments
+    ]
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from core.kpis import KPI_COLUMNS, calculate_period_kpis
+from core.rollups import MonthlyRollup
+from tests.clinic import assert_rollup, run
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_rollup_matches_a_fresh_build(store, sheet, seed):
+    run(store, sheet, seed)
+    assert_rollup(store)
+
+
+@pytest.mark.parametrize("period", ["annual", "monthly"])
+def test_period_kpis_match_the_full_table(store, sheet, period):
+    run(store, sheet, 0)
+    appointments = store.appointments
+    features = pd.concat([appointments, store.features("appointments")], axis=1)
+    pd.testing.assert_frame_equal(
+        store.period_kpis(period),
+        calculate_period_kpis(features, period),
+        # Years from `.dt.year` are int32
+        check_index_type=False,
+    )
+
+
+def test_period_kpis_match_a_fresh_rollup(store, sheet):
+    run(store, sheet, 0)
+    fresh = MonthlyRollup.build(store.appointments)
+    for period in ("annual", "monthly"):
+        pd.testing.assert_frame_equal(
+            store.period_kpis(period), fresh.period_kpis(period)
+        )
+
+
+def test_an_empty_rollup_has_the_kpi_columns():
+    kpis = MonthlyRollup().period_kpis("monthly")
+    assert kpis.empty and kpis.columns.tolist() == KPI_COLUMNS
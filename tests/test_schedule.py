@@ -0,0 +1,79 @@
+from datetime import date, time, timedelta
+
+import pandas as pd
+import pytest
+
+from core import schedule
+from core.cache import DataStore
+from core.schedule import IdAllocator, ScheduleIndex, SlotHolds, day_numbers
+from tests.clinic import assert_schedule, run
+
+TODAY = date.today()
+OPENING, CLOSING = time(8), time(18)
+
+
+def test_only_upcoming_days_are_indexed(store):
+    appointments = store.appointments
+    index = ScheduleIndex.build(appointments)
+    days = appointments["Date"].dt.date
+    upcoming = (days >= TODAY) & ~appointments["Canceled"]
+    assert upcoming.any() and (days < TODAY).any()
+    assert set(index.booked) == set(appointments.index[upcoming])
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_schedule_matches_a_fresh_build(store, sheet, seed):
+    run(store, sheet, seed)
+    assert_schedule(store)
+
+
+def test_holds_are_seen_by_every_process(tmp_path):
+    path = str(tmp_path / "holds.json")
+    first, second = SlotHolds(path), SlotHolds(path)
+    day = day_numbers(TODAY)
+    assert first.hold(day, 9 * 60, 30)
+    # Overlapping holds are refused, adjacent ones are not
+    assert not second.hold(day, 9 * 60 + 15, 30)
+    assert second.hold(day, 9 * 60 + 30, 30)
+    assert sorted(second.on(day)) == [(540, 30), (570, 30)]
+    first.release(day, 9 * 60)
+    assert second.on(day) == [(570, 30)]
+
+
+def test_holds_expire(tmp_path, monkeypatch):
+    holds = SlotHolds(str(tmp_path / "holds.json"))
+    day = day_numbers(TODAY)
+    monkeypatch.setattr(schedule, "HOLD_SECONDS", 0)
+    assert holds.hold(day, 600, 30)
+    assert holds.on(day) == []
+    assert holds.hold(day, 600, 30)
+    # Booked slots are kept past the hold
+    holds.release(day, 600, keep=60)
+    assert holds.on(day) == [(600, 30)]
+
+
+def test_any_free_time_can_be_booked(tmp_path):
+    store = DataStore(ttl=None, locks=str(tmp_path))
+    day = TODAY + timedelta(days=1)
+    # Off the grid and after hours
+    assert store.hold_slot(day, time(9, 10), 30)
+    assert store.hold_slot(day, time(19, 45), 30)
+    assert not store.hold_slot(day, time(9, 0), 30)
+    free = store.free_slots(day, OPENING, CLOSING, 30)
+    assert time(9) not in free and time(9, 30) not in free
+    assert time(10) in free
+    store.release_slot(day, time(9, 10))
+    assert time(9) in store.free_slots(day, OPENING, CLOSING, 30)
+
+
+@pytest.mark.parametrize("shared", [False, True], ids=["local", "file"])
+def test_appointment_ids_are_never_handed_out_twice(tmp_path, shared):
+    path = str(tmp_path / "appointment_id") if shared else None
+    first = IdAllocator(path)
+    first.observe(pd.Series([5, 3]))
+    ids = [first.next(), first.next()]
+    if shared:
+        # Another process allocates from the same sequence
+        second = IdAllocator(path)
+        ids += [second.next(), first.next()]
+    assert ids == list(range(6, 6 + len(ids)))
@@ -0,0 +1,74 @@
+from datetime import time
+
+import numpy as np
+import pandas as pd
+
+from core.schema import (
+    APPOINTMENTS,
+    PATIENTS,
+    conform,
+    normalize_frame,
+    normalize_record,
+    normalize_records,
+)
+
+
+def _column(kind, values, compact=False):
+    frame = pd.DataFrame({"column": values})
+    return normalize_frame(frame, {"column": kind}, compact)["column"]
+
+
+def test_booleans():
+    values = ["TRUE", "true", "1", "yes", True, "FALSE", "0", "", None, "null"]
+    converted = _column("bool", values)
+    assert converted.dtype == bool
+    assert converted.tolist() == [True] * 5 + [False] * 5
+
+
+def test_dates_and_times():
+    dates = _column("date", ["2024-01-31", "2024-13-01", None, "2024-01-31"])
+    assert pd.api.types.is_datetime64_dtype(dates)
+    assert dates[0] == pd.Timestamp("2024-01-31") == dates[3]
+    assert dates[1:3].isna().all()
+    times = _column("time", ["09:30:00", "25:00:00", None])
+    assert times[0] == time(9, 30)
+    assert times[1:].isna().all()
+
+
+def test_numbers():
+    assert _column("float", ["12.5", None, "x", 3]).tolist() == [12.5, 0, 0, 3]
+    assert _column("int", ["3", None, 4]).tolist() == [3, 0, 4]
+
+
+def test_text_keeps_missing_values_as_nan():
+    assert _column("str", ["Ana", None, 7]).tolist() == ["Ana", "nan", "7"]
+    assert _column("key", [1, "2"]).tolist() == ["1", "2"]
+    # IDs are kept exactly as the webhook sent them
+    assert _column("id", [1, "2"]).tolist() == [1, "2"]
+
+
+def test_records_are_normalized_like_frames(sheet):
+    patients, appointments = sheet
+    frame = normalize_records(appointments[:50], APPOINTMENTS)
+    pd.testing.assert_frame_equal(
+        frame, normalize_frame(pd.DataFrame(appointments[:50]), APPOINTMENTS)
+    )
+    assert normalize_records([], PATIENTS).columns.tolist() == list(PATIENTS)
+
+
+def test_a_single_record_gives_plain_values(sheet):
+    record = normalize_record(sheet[1][0], APPOINTMENTS)
+    assert isinstance(record["Attended"], bool)
+    assert isinstance(record["Payment Status"], float)
+    assert not any(isinstance(value, np.generic) for value in record.values())
+
+
+def test_conform_casts_rows_to_the_table(tables):
+    appointments = tables[1]
+    rows = pd.DataFrame(
+        {"Payment Status": ["10"], "Date": ["2024-02-01"], "Insurance": ["Nova"]}
+    )
+    conformed = conform(appointments, rows)
+    assert conformed["Payment Status"].dtype == appointments["Payment Status"].dtype
+    assert conformed["Date"].dtype == appointments["Date"].dtype
+    assert conformed.at[0, "Insurance"] == "Nova"
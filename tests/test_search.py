@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from core.schema import PATIENTS, normalize_records
+from core.search import PatientSearch, normalize
+from tests.clinic import assert_search, run
+
+
+def _patients(*rows):
+    return normalize_records(
+        [
+            {"Patient ID": patient_id, "Name": name, "Phone": phone, "Email": email}
+            for patient_id, name, phone, email in rows
+        ],
+        PATIENTS,
+    )
+
+
+PATIENT_ROWS = [
+    ("1", "José Santos", "(11) 98765-4321", "jose.santos@example.com"),
+    ("2", "Ana Silva", "11 91234-0000", "ana@example.com"),
+    ("3", "Mariana Costa", "", "mcosta@example.com"),
+    ("4", "Anabela Souza", "21 3333-4444", None),
+]
+
+
+def _found(index, query):
+    return [match["Patient ID"] for match in index.search(query)]
+
+
+@pytest.fixture
+def search():
+    return PatientSearch.build(_patients(*PATIENT_ROWS))
+
+
+def test_normalize():
+    assert normalize("  JOSÉ   d'Ávila ") == "jose d avila"
+    assert normalize(None) == "" and normalize(float("nan")) == ""
+
+
+def test_prefixes_of_every_term(search):
+    assert _found(search, "jose sant") == ["1"]
+    assert _found(search, "Jose") == ["1"]
+    # An exact word ranks before a longer one it prefixes
+    assert _found(search, "ana")[:2] == ["2", "4"]
+    assert _found(search, "mcosta") == ["3"]
+
+
+def test_phone_numbers(search):
+    assert _found(search, "(11) 98765-4321") == ["1"]
+    assert _found(search, "98765") == ["1"]
+    assert _found(search, "3333-4444") == ["4"]
+
+
+def test_misspellings_and_short_queries(search):
+    assert _found(search, "jsoe santos")[:1] == ["1"]
+    assert _found(search, "") == []
+    assert _found(search, "zq") == []
+    assert _found(search, "a")[:2] == ["2", "4"]
+
+
+def test_added_and_removed_patients(search):
+    search.add(_patients(("5", "Anastácia Lima", "", "")))
+    assert _found(search, "anast") == ["5"]
+    # A rewritten patient replaces their old record
+    search.add(_patients(("2", "Ana Silveira", "11 91234-0000", "ana@example.com")))
+    assert [match["Name"] for match in search.search("silv")] == ["Ana Silveira"]
+    search.remove(pd.DataFrame({"Patient ID": ["1"]}))
+    assert _found(search, "jose") == []
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_search_matches_a_fresh_build(store, sheet, seed):
+    run(store, sheet, seed)
+    assert_search(store)
@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+from core.cache import DataStore
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from core.shared import SharedTables
+from tests.conftest import wait_until
+
+# Appointments served by a follower's staged load
+TODAY_ROWS = 20
+
+
+@pytest.fixture
+def processes(tmp_path, compact):
+    """Make stores that share tables like server processes; the first leads."""
+    made = []
+
+    def make():
+        shared = SharedTables(str(tmp_path), compact)
+        made.append(shared)
+        return DataStore(ttl=None, shared=shared)
+
+    yield make
+    for shared in made:
+        if shared._lock_file is not None:
+            shared._lock_file.close()
+
+
+@pytest.fixture
+def loader(sheet, compact):
+    def loader(changed_only=False):
+        return (
+            normalize_records(sheet[0], PATIENTS, compact),
+            normalize_records(sheet[1], APPOINTMENTS, compact),
+        )
+
+    return loader
+
+
+def offline(changed_only=False):
+    raise AssertionError("only the leader downloads")
+
+
+def test_followers_attach_what_the_leader_publishes(processes, loader):
+    leader, follower = processes(), processes()
+    assert leader.shared.leads()
+    leader.ensure_loaded(loader)
+    follower.ensure_loaded(offline)
+    assert not follower.shared.leads()
+    pd.testing.assert_frame_equal(follower.appointments, leader.appointments)
+    # Attaching builds no index; each is built on first use
+    assert not follower._indexes
+    pd.testing.assert_frame_equal(
+        follower.period_kpis("monthly"), leader.period_kpis("monthly")
+    )
+    assert list(follower._indexes) == ["rollup"]
+
+
+def test_the_leader_publishes_its_writes(processes, loader):
+    leader, follower = processes(), processes()
+    assert leader.shared.leads()
+    leader.ensure_loaded(loader)
+    follower.ensure_loaded(offline)
+    published = follower.attached
+
+    key = leader.appointments["Appointment ID"].iloc[0]
+    leader.update(
+        "appointments", leader.locate("appointments", key), {"Payment Status": 777.0}
+    )
+    wait_until(lambda: leader.shared.current() != published)
+    follower.ensure_loaded(offline, force=True)
+    label = follower.locate("appointments", key)
+    assert follower.appointments.at[label, "Payment Status"] == 777.0
+
+
+def test_a_follower_stages_its_load_while_the_leader_loads(
+    processes, loader, sheet, compact
+):
+    leader, follower = processes(), processes()
+    assert leader.shared.leads()
+    today = sheet[1][-TODAY_ROWS:]
+
+    def day_loader(day):
+        return (
+            normalize_records(sheet[0], PATIENTS, compact),
+            normalize_records(today, APPOINTMENTS, compact),
+        )
+
+    # Returns at once with today's rows instead of waiting for the leader
+    follower.ensure_loaded(offline, day_loader=day_loader)
+    assert follower.partial
+    assert len(follower.appointments) == TODAY_ROWS
+
+    leader.ensure_loaded(loader)
+    wait_until(lambda: not follower.partial)
+    assert follower.attached == leader.shared.current()
+    assert len(follower.appointments) == len(sheet[1])
+
+
+def test_a_follower_takes_the_lead_when_the_leader_exits(processes):
+    leader, follower = processes(), processes()
+    assert leader.shared.leads()
+    assert not follower.shared.leads()
+    leader.shared._lock_file.close()
+    assert follower.shared.leads()
@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+
+from core.cache import DataStore
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from core.snapshot import META_FILE, Snapshot
+from tests.conftest import wait_until
+
+
+def offline(changed_only=False):
+    raise AssertionError("the snapshot is restored instead")
+
+
+def _saved(directory, tables, compact):
+    snapshot = Snapshot(str(directory), compact)
+    frames = dict(zip(("patients", "appointments"), tables))
+    snapshot.save(frames, {"patients": 80, "appointments": 600})
+    return snapshot, frames
+
+
+def test_tables_round_trip(tmp_path, tables, compact):
+    snapshot, frames = _saved(tmp_path, tables, compact)
+    restored, watermarks = snapshot.load()
+    assert watermarks == {"patients": 80, "appointments": 600}
+    for table, frame in frames.items():
+        pd.testing.assert_frame_equal(restored[table], frame)
+
+
+def test_unusable_snapshots_are_ignored(tmp_path, tables, compact):
+    assert Snapshot(str(tmp_path), compact).load() is None
+    _saved(tmp_path, tables, compact)
+    # Written with the other storage mode
+    assert Snapshot(str(tmp_path), not compact).load() is None
+    with open(tmp_path / "appointments.arrow", "wb") as file:
+        file.write(b"truncated")
+    assert Snapshot(str(tmp_path), compact).load() is None
+
+
+def test_a_warm_start_fetches_only_the_delta(tmp_path, sheet, tables, compact):
+    first = DataStore(ttl=None, disk=Snapshot(str(tmp_path), compact))
+    first.ensure_loaded(lambda changed_only=False: tables)
+    wait_until(lambda: os.path.exists(tmp_path / META_FILE))
+
+    asked = []
+    registered = dict(
+        sheet[1][-1],
+        row_number=sheet[1][-1]["row_number"] + 1,
+        **{"Appointment ID": sheet[1][-1]["Appointment ID"] + 1},
+    )
+
+    def delta_loader(watermarks):
+        asked.append(dict(watermarks))
+        return None, normalize_records([registered], APPOINTMENTS, compact)
+
+    second = DataStore(ttl=None, disk=Snapshot(str(tmp_path), compact))
+    second.ensure_loaded(offline, delta_loader)
+    assert asked == [first.watermarks]
+    assert len(second.appointments) == len(first.appointments) + 1
+    pd.testing.assert_frame_equal(second.patients, first.patients)
+    # Columns mapped from the snapshot can be written
+    label = second.locate("appointments", registered["Appointment ID"])
+    second.update("appointments", label, {"Payment Status": 777.0})
+    assert second.appointments.at[label, "Payment Status"] == 777.0
+
+
+def test_without_a_delta_loader_the_snapshot_is_served(tmp_path, tables, compact):
+    _saved(tmp_path, tables, compact)
+    store = DataStore(ttl=None, disk=Snapshot(str(tmp_path), compact))
+    store.ensure_loaded(offline)
+    assert len(store.appointments) == len(tables[1])
+    assert store.watermarks == {"patients": 80, "appointments": 600}
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from core.cache import INDEXES, DataStore
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from tests.clinic import (
+    assert_cohorts,
+    assert_data_index,
+    assert_rollup,
+    assert_schedule,
+)
+from tests.conftest import wait_until
+
+# Appointments served by the first stage of the load
+TODAY_ROWS = 20
+
+
+@pytest.mark.parametrize("downloaded_after", [False, True])
+def test_writes_during_a_staged_load_are_replayed(sheet, compact, downloaded_after):
+    patients, appointments = sheet
+    registered = dict(
+        appointments[0],
+        row_number=appointments[-1]["row_number"] + 1,
+        **{"Appointment ID": appointments[-1]["Appointment ID"] + 1},
+    )
+    # The history may or may not have been read after the registration
+    history = appointments + [registered] if downloaded_after else appointments
+    gate = threading.Event()
+
+    def loader(changed_only=False):
+        gate.wait(5)
+        return (
+            normalize_records(patients, PATIENTS, compact),
+            normalize_records(history, APPOINTMENTS, compact),
+        )
+
+    today = appointments[-TODAY_ROWS:]
+    ids = {record["Patient ID"] for record in today}
+
+    def day_loader(day):
+        return (
+            normalize_records(
+                [record for record in patients if record["Patient ID"] in ids],
+                PATIENTS,
+                compact,
+            ),
+            normalize_records(today, APPOINTMENTS, compact),
+        )
+
+    store = DataStore(ttl=None)
+    store.ensure_loaded(loader, day_loader=day_loader)
+    assert store.partial
+    assert len(store.appointments) == TODAY_ROWS
+    # Indexes in use are rebuilt with the history, and the journal replayed
+    for name in INDEXES:
+        getattr(store, name)
+
+    edited = store.appointments["Appointment ID"].iloc[0]
+    store.update(
+        "appointments", store.locate("appointments", edited), {"Payment Status": 777.0}
+    )
+    store.append("appointments", normalize_records([registered], APPOINTMENTS))
+    gate.set()
+    wait_until(lambda: not store.partial)
+
+    frame = store.appointments
+    assert len(frame) == len(appointments) + 1
+    assert frame.at[store.locate("appointments", edited), "Payment Status"] == 777.0
+    assert (frame["Appointment ID"] == registered["Appointment ID"]).sum() == 1
+    assert_data_index(store)
+    assert_rollup(store)
+    assert_cohorts(store)
+    assert_schedule(store)
+
+
+def _loader(sheet):
+    return lambda changed_only=False: (
+        normalize_records(sheet[0], PATIENTS),
+        normalize_records(sheet[1], APPOINTMENTS),
+    )
+
+
+def _day_loader(sheet):
+    patients, appointments = sheet
+    return lambda day: (
+        normalize_records(patients, PATIENTS),
+        normalize_records(appointments[-TODAY_ROWS:], APPOINTMENTS),
+    )
+
+
+def test_a_failed_history_download_is_retried(sheet):
+    def failing(changed_only=False):
+        raise OSError("offline")
+
+    store = DataStore(ttl=None)
+    store.ensure_loaded(failing, day_loader=_day_loader(sheet))
+    wait_until(lambda: not store.partial)
+    # Today's tables are kept and the next session downloads the history
+    assert len(store.appointments) == TODAY_ROWS
+    assert store.is_stale()
+    store.ensure_loaded(_loader(sheet))
+    assert len(store.appointments) == len(sheet[1])
+
+
+def test_without_a_day_the_load_is_not_staged(sheet):
+    store = DataStore(ttl=None)
+    store.ensure_loaded(_loader(sheet), day_loader=lambda day: None)
+    assert not store.partial
+    assert len(store.appointments) == len(sheet[1])
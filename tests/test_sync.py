@@ -0,0 +1,79 @@
+import pandas as pd
+
+from core.schema import APPOINTMENTS, normalize_records
+from core.sync import delta_params, merge_delta, watermark
+from core.table import AppendableTable
+
+
+def _merged(tables, compact, changes):
+    """A copy of the appointments table with `changes` merged in."""
+    table = AppendableTable(tables[1].copy())
+    delta = normalize_records(changes, APPOINTMENTS, compact)
+    return table, merge_delta(table, delta)
+
+
+def test_repeated_rows_change_nothing(sheet, tables, compact):
+    table, (replaced, written) = _merged(tables, compact, sheet[1])
+    assert replaced.empty and written.empty
+    pd.testing.assert_frame_equal(table.frame, tables[1])
+
+
+def test_missing_values_repeat_as_unchanged(sheet, tables, compact):
+    changes = [
+        dict(record, **{"Payment Status": None, "Insurance": None})
+        for record in sheet[1][:20]
+    ]
+    table, _ = _merged(tables, compact, changes)
+    before = table.frame.copy()
+    replaced, written = merge_delta(
+        table, normalize_records(changes, APPOINTMENTS, compact)
+    )
+    assert replaced.empty and written.empty
+    pd.testing.assert_frame_equal(table.frame, before)
+
+
+def test_changed_and_new_rows(sheet, tables, compact):
+    changed = [dict(record, **{"Payment Status": 999}) for record in sheet[1][10:15]]
+    new = [
+        dict(record, row_number=record["row_number"] + len(sheet[1]))
+        for record in sheet[1][:3]
+    ]
+    # Unchanged rows sent along with the changes are skipped
+    table, (replaced, written) = _merged(tables, compact, sheet[1][:10] + changed + new)
+    frame = table.frame
+    assert len(frame) == len(tables[1]) + len(new)
+    pd.testing.assert_frame_equal(replaced, tables[1].iloc[10:15])
+    assert written["row_number"].tolist() == [
+        record["row_number"] for record in changed + new
+    ]
+    assert (frame.iloc[10:15]["Payment Status"] == 999).all()
+    pd.testing.assert_frame_equal(frame.iloc[:10], tables[1].iloc[:10])
+    pd.testing.assert_frame_equal(frame.iloc[15 : len(tables[1])], tables[1].iloc[15:])
+    pd.testing.assert_frame_equal(
+        frame.loc[written.index], written, check_categorical=False
+    )
+
+    # Merging the same delta again is a no-op
+    replaced, written = merge_delta(
+        table, normalize_records(changed + new, APPOINTMENTS, compact)
+    )
+    assert replaced.empty and written.empty
+    assert len(table) == len(frame)
+
+
+def test_watermark_only_moves_forward(tables):
+    mark = watermark(tables[1])
+    assert mark["row_number"] == int(tables[1]["row_number"].max())
+    older = tables[1].iloc[:5]
+    assert watermark(older, mark) == mark
+    assert watermark(None, mark) == mark
+
+
+def test_delta_params_ask_for_rows_after_the_watermark():
+    mark = {"row_number": 12, "modified_at": None}
+    assert delta_params(mark) == {"since_row_number": 12}
+    mark["modified_at"] = "2026-01-02 03:04:05"
+    assert delta_params(mark) == {
+        "since_row_number": 12,
+        "modified_since": "2026-01-02 03:04:05",
+    }
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from core.schema import PATIENTS, normalize_records
+from core.table import MIN_SPARE_ROWS, AppendableTable
+
+
+def _chunks(table, column):
+    return table.frame[column].array.__arrow_array__().chunks
+
+
+def test_appends_fill_the_spare_rows(tables):
+    appointments = tables[1]
+    half = len(appointments) - MIN_SPARE_ROWS
+    table = AppendableTable(appointments.iloc[:half])
+    assert table.capacity == half
+    appended = table.append(appointments.iloc[half : half + 1])
+    # The first append grows the buffer; the next ones write in place
+    capacity = table.capacity
+    assert capacity >= half + 1 + MIN_SPARE_ROWS
+    table.append(appointments.iloc[half + 1 :])
+    assert table.capacity == capacity
+    assert len(table) == len(appointments)
+    assert appended.index.tolist() == [half]
+    expected = appointments.reset_index(drop=True)
+    pd.testing.assert_frame_equal(table.frame, expected, check_categorical=False)
+
+
+def test_an_empty_table_takes_the_dtypes_of_its_first_rows(tables):
+    appointments = tables[1]
+    table = AppendableTable(appointments.iloc[:0])
+    table.append(appointments.iloc[:3])
+    assert (table.frame.dtypes == appointments.dtypes).all()
+    assert len(table) == 3
+
+
+def test_write_and_set(tables):
+    appointments = tables[1]
+    table = AppendableTable(appointments)
+    rows = appointments.iloc[[1, 4]].copy()
+    rows["Payment Status"] = [10.0, 20.0]
+    rows["Canceled"] = True
+    table.write([1, 4], rows)
+    table.set(2, {"Attended": True, "Payment Status": 30.0})
+    frame = table.frame
+    assert frame["Payment Status"].iloc[[1, 2, 4]].tolist() == [10.0, 30.0, 20.0]
+    assert frame["Canceled"].iloc[[1, 4]].all() and frame.at[2, "Attended"]
+    assert (frame.dtypes == appointments.dtypes).all()
+
+
+def test_growing_keeps_the_arrow_chunks(sheet):
+    patients = normalize_records(sheet[0], PATIENTS, compact=True)
+    table = AppendableTable(patients.iloc[:-1])
+    first = _chunks(table, "Name")[0]
+    table.append(patients.iloc[-1:])
+    chunks = _chunks(table, "Name")
+    # The filled rows are not copied: the first chunk is the same buffer
+    assert chunks[0].buffers()[1].address == first.buffers()[1].address
+    assert table.frame["Name"].tolist() == patients["Name"].tolist()
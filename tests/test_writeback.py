@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+
+from core.repository import RepositoryError
+from core.schema import APPOINTMENTS, PATIENTS, normalize_records
+from core.writeback import WriteBehindQueue
+from tests.conftest import wait_until
+
+PAYMENT = "post_payment_url"
+ATTENDED = "post_attended_url"
+
+
+class Backend:
+    """Records the calls it gets; each one waits for `gate` to open."""
+
+    batches = False
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.error = None
+        self.reply = None
+
+    def call(self, action, payload):
+        self.gate.wait(5)
+        self.calls.append((action, dict(payload)))
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+    def call_batch(self, calls):
+        return [self.call(action, payload) for action, payload in calls]
+
+
+@pytest.fixture
+def backend():
+    return Backend()
+
+
+@pytest.fixture
+def queue(backend, store):
+    return WriteBehindQueue(backend, store)
+
+
+@pytest.fixture
+def key(store):
+    return store.appointments["Appointment ID"].iloc[0]
+
+
+def _payment(store, key):
+    return store.appointments.at[store.locate("appointments", key), "Payment Status"]
+
+
+def _submit(queue, endpoint, key, values):
+    queue.submit(
+        endpoint, "appointments", key, {"Appointment ID": key, **values}, values
+    )
+
+
+def test_queued_edits_of_a_row_are_sent_as_one(queue, backend, store, key):
+    _submit(queue, PAYMENT, key, {"Payment Status": 10.0})
+    wait_until(lambda: queue.in_flight == 1)
+    # Queued while the first call is in flight
+    _submit(queue, PAYMENT, key, {"Payment Status": 20.0})
+    _submit(queue, ATTENDED, key, {"Attended": True})
+    _submit(queue, PAYMENT, key, {"Payment Status": 30.0})
+    assert _payment(store, key) == 30.0
+    assert queue.backlog() == 3
+    backend.gate.set()
+    wait_until(lambda: queue.backlog() == 0)
+    payments = [
+        payload["Payment Status"]
+        for action, payload in backend.calls
+        if action == PAYMENT
+    ]
+    assert payments == [10.0, 30.0]
+    assert len(backend.calls) == 3
+    assert _payment(store, key) == 30.0
+    assert not queue.failures
+
+
+def test_failed_edit_is_rolled_back(queue, backend, store, key):
+    before = _payment(store, key)
+    backend.error = RepositoryError("offline")
+    # Keeps the worker busy, so the two edits below are merged
+    _submit(queue, ATTENDED, store.appointments["Appointment ID"].iloc[1], {})
+    wait_until(lambda: queue.in_flight == 1)
+    _submit(queue, PAYMENT, key, {"Payment Status": before + 10})
+    _submit(queue, PAYMENT, key, {"Payment Status": before + 20})
+    backend.gate.set()
+    wait_until(lambda: queue.backlog() == 0 and len(queue.failures) == 2)
+    assert _payment(store, key) == before
+    _, failed, endpoint, message = queue.failures[-1]
+    assert (failed, endpoint, message) == (key, PAYMENT, "offline")
+
+
+def test_rollback_keeps_newer_values(queue, backend, store, key):
+    backend.error = RepositoryError("offline")
+    _submit(queue, PAYMENT, key, {"Payment Status": 10.0})
+    wait_until(lambda: queue.in_flight == 1)
+    # Written meanwhile by something else, e.g. a sync
+    store.update(
+        "appointments", store.locate("appointments", key), {"Payment Status": 55.0}
+    )
+    backend.gate.set()
+    wait_until(lambda: queue.backlog() == 0 and queue.failures)
+    assert _payment(store, key) == 55.0
+
+
+def test_server_values_are_applied(queue, backend, store, key):
+    backend.reply = {"Appointment ID": key, "Payment Status": "12.5"}
+    backend.gate.set()
+    _submit(queue, PAYMENT, key, {"Payment Status": 12.0})
+    wait_until(lambda: queue.backlog() == 0)
+    assert _payment(store, key) == 12.5
+
+
+@pytest.mark.parametrize("delta", [False, True], ids=["reload", "delta"])
+def test_unconfirmed_edits_survive_a_refresh(
+    queue, backend, store, sheet, compact, delta
+):
+    first, second = store.appointments["Appointment ID"].iloc[:2].tolist()
+    # The rows as the server still has them
+    server = store.appointments.iloc[:2].copy()
+    _submit(queue, PAYMENT, first, {"Payment Status": 10.0})
+    wait_until(lambda: queue.in_flight == 1)
+    _submit(queue, PAYMENT, second, {"Payment Status": 20.0})
+
+    if delta:
+        store.ensure_loaded(None, lambda watermarks: (None, server), force=True)
+    else:
+        store.ensure_loaded(
+            lambda changed_only=False: (
+                normalize_records(sheet[0], PATIENTS, compact),
+                normalize_records(sheet[1], APPOINTMENTS, compact),
+            ),
+            force=True,
+        )
+    # One edit is in flight and the other queued; neither is undone
+    assert _payment(store, first) == 10.0
+    assert _payment(store, second) == 20.0
+
+    backend.gate.set()
+    wait_until(lambda: queue.backlog() == 0)
+    assert _payment(store, first) == 10.0
+    assert _payment(store, second) == 20.0
+    assert not queue.failures
+    assert not queue.unconfirmed()